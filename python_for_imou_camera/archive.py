@@ -0,0 +1,292 @@
+# archive.py
+# Enregistrement continu en copie de flux (aucun réencodage) avec un index SQLite pour retrouver
+# une caméra à un instant donné, et une rétention par âge ou par quota disque.
+import os
+import sys
+import json
+import time
+import queue
+import sqlite3
+import threading
+from recorder import StreamSegmenter, SEGMENT_EXTENSIONS
+
+TS_PACKET = 188
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    camera TEXT NOT NULL,
+    path TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    bytes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_camera_time ON segments (camera, start, end);
+CREATE INDEX IF NOT EXISTS segments_end ON segments (end);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    camera TEXT NOT NULL,
+    time REAL NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS events_camera_time ON events (camera, time);
+"""
+
+
+class SegmentArchive:
+    """
+    Une StreamSegmenter par caméra (ffmpeg -c copy, segments de segment_seconds) sous root/<caméra>/,
+    chaque segment terminé indexé dans SQLite (caméra, début, fin, taille).
+    locate(caméra, instant) donne directement le segment et la position à lire ;
+    prune() (lancé toutes les prune_interval secondes) supprime les segments trop anciens
+    ou les plus anciens au-delà de max_bytes.
+    add_event() ne touche jamais au disque : les événements sont écrits par lots dans un thread
+    (une transaction toutes les flush_interval secondes), comme event_store.DetectionStore.
+    """
+    def __init__(self, root="archive", db_path=None, segment_seconds=10, segment_format="mpegts",
+                 max_age=7 * 24 * 3600, max_bytes=None, prune_interval=60.0, flush_interval=1.0,
+                 max_queue=10000):
+        """
+        max_age: âge maximal des segments et événements en secondes (None = illimité)
+        max_bytes: taille totale maximale des segments (None = illimitée)
+        """
+        self.root = root
+        self.segment_seconds = segment_seconds
+        self.segment_format = segment_format
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.prune_interval = prune_interval
+        os.makedirs(root, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path or os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")  # WAL : pas de fsync à chaque commit
+        self.db.executescript(SCHEMA)
+        self.segmenters = {}
+        self.stop_event = threading.Event()
+        self.pruner = None
+        self.pruned = 0
+        self.flush_interval = flush_interval
+        self.event_queue = queue.Queue(max_queue)
+        self.event_writer = None
+        self.dropped_events = 0
+
+    # ---------- Enregistrement ----------
+    def add_camera(self, camera, url=None, url_provider=None, on_segment=None, stream=None):
+        """
+        Démarre l'archivage d'une caméra (camera: nom utilisé dans l'index et le dossier).
+        url: connexion dédiée (StreamSegmenter, un ffmpeg de plus qui tire le flux RTMP)
+        stream: AVStream / ResilientStream pas encore démarré, dont le ffmpeg écrit aussi les segments
+        (aucune connexion de plus à la caméra) ; le flux reste à démarrer et arrêter par l'appelant
+        on_segment: callback(segment) après l'indexation de chaque segment (ex: ClipRecorder().add_segment)
+        """
+        camera_dir = os.path.join(self.root, camera)
+        # préfixe horodaté : une nouvelle exécution n'écrase jamais les segments déjà archivés
+        prefix = time.strftime("%Y%m%d_%H%M%S")
+        if stream is not None:
+            pattern = os.path.join(camera_dir, f"{prefix}_%06d.{SEGMENT_EXTENSIONS[self.segment_format]}")
+            stream.add_segment_output(pattern, self.segment_seconds, self.segment_format,
+                                      on_segment=lambda s: self._on_segment(camera, s, on_segment))
+            return stream
+        segmenter = StreamSegmenter(url, camera_dir, self.segment_seconds, self.segment_format,
+                                    on_segment=lambda s: self._on_segment(camera, s, on_segment),
+                                    url_provider=url_provider, prefix=prefix)
+        self.segmenters[camera] = segmenter
+        segmenter.start()
+        return segmenter
+
+    def start(self):
+        self.pruner = threading.Thread(target=self._prune_loop, daemon=True)
+        self.pruner.start()
+        self.event_writer = threading.Thread(target=self._event_loop, daemon=True)
+        self.event_writer.start()
+        return self
+
+    def _on_segment(self, camera, segment, listener=None):
+        try:
+            size = os.path.getsize(segment["path"])
+        except OSError:
+            return
+        with self.lock:
+            self.db.execute("INSERT INTO segments (camera, path, start, end, bytes) VALUES (?, ?, ?, ?, ?)",
+                            (camera, segment["path"], segment["start_wall"], segment["end_wall"], size))
+            self.db.commit()
+        if listener:
+            listener(segment)
+
+    def add_event(self, camera, kind, when=None, **data):
+        """
+        Indexe un événement (détection, audio...) sur la même ligne de temps que les segments.
+        Ne bloque jamais (appelé depuis le worker de détection) : file pleine = événement abandonné et compté.
+        """
+        try:
+            self.event_queue.put_nowait((camera, when or time.time(), kind, json.dumps(data) if data else None))
+        except queue.Full:
+            self.dropped_events += 1
+
+    def _event_loop(self):
+        while not (self.stop_event.is_set() and self.event_queue.empty()):
+            try:
+                batch = [self.event_queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            # regroupe ce qui arrive pendant flush_interval : une transaction par lot
+            deadline = time.monotonic() + self.flush_interval
+            while time.monotonic() < deadline and not self.stop_event.is_set():
+                try:
+                    batch.append(self.event_queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            while not self.event_queue.empty():
+                batch.append(self.event_queue.get_nowait())
+            try:
+                with self.lock, self.db:
+                    self.db.executemany("INSERT INTO events (camera, time, type, data) VALUES (?, ?, ?, ?)", batch)
+            except sqlite3.Error as e:
+                self.dropped_events += len(batch)
+                print(f"[ARCHIVE] ❌ écriture de {len(batch)} événements : {e}")
+
+    # ---------- Recherche ----------
+    def locate(self, camera, when):
+        """
+        Segment qui contient l'instant when (timestamp) pour camera, ou None.
+        Retourne {"path", "start", "end", "offset", "byte_offset"} : offset en secondes dans le segment,
+        byte_offset estimé au prorata de la durée (aligné sur un paquet pour mpegts, lisible directement).
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT path, start, end, bytes FROM segments WHERE camera = ? AND start <= ? AND end > ? "
+                "ORDER BY start DESC LIMIT 1", (camera, when, when)).fetchone()
+        if row is None:
+            return None
+        path, start, end, size = row
+        offset = when - start
+        byte_offset = int(size * offset / max(end - start, 1e-6))
+        if self.segment_format == "mpegts":
+            byte_offset -= byte_offset % TS_PACKET
+        return {"path": path, "start": start, "end": end, "offset": offset, "byte_offset": byte_offset}
+
+    def segments(self, camera, start, end):
+        """Segments de camera qui recouvrent [start, end], dans l'ordre chronologique."""
+        with self.lock:
+            return self.db.execute(
+                "SELECT path, start, end, bytes FROM segments WHERE camera = ? AND end > ? AND start < ? "
+                "ORDER BY start", (camera, start, end)).fetchall()
+
+    def events(self, camera=None, start=0.0, end=None, kind=None):
+        """Événements [(caméra, instant, type, data)] entre start et end (hors ceux encore en file d'écriture)."""
+        query = "SELECT camera, time, type, data FROM events WHERE time >= ? AND time <= ?"
+        params = [start, end if end is not None else time.time()]
+        if camera is not None:
+            query += " AND camera = ?"
+            params.append(camera)
+        if kind is not None:
+            query += " AND type = ?"
+            params.append(kind)
+        with self.lock:
+            rows = self.db.execute(query + " ORDER BY time", params).fetchall()
+        return [(c, t, k, json.loads(d) if d else {}) for c, t, k, d in rows]
+
+    # ---------- Rétention ----------
+    def prune(self, now=None):
+        """Supprime les segments hors rétention (âge puis quota), retourne le nombre supprimé."""
+        now = now or time.time()
+        doomed = []
+        with self.lock:
+            if self.max_age is not None:
+                cutoff = now - self.max_age
+                doomed += self.db.execute("SELECT id, path FROM segments WHERE end < ?", (cutoff,)).fetchall()
+                self.db.execute("DELETE FROM segments WHERE end < ?", (cutoff,))
+                self.db.execute("DELETE FROM events WHERE time < ?", (cutoff,))
+            if self.max_bytes is not None:
+                total = self.db.execute("SELECT COALESCE(SUM(bytes), 0) FROM segments").fetchone()[0]
+                over = []
+                for seg_id, path, size in self.db.execute(
+                        "SELECT id, path, bytes FROM segments ORDER BY end").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    over.append((seg_id, path))
+                    total -= size
+                self.db.executemany("DELETE FROM segments WHERE id = ?", [(i,) for i, _ in over])
+                doomed += over
+            self.db.commit()
+        for _, path in doomed:
+            if os.path.exists(path):
+                os.remove(path)
+        self.pruned += len(doomed)
+        return len(doomed)
+
+    def _prune_loop(self):
+        while not self.stop_event.wait(self.prune_interval):
+            try:
+                self.prune()
+            except sqlite3.Error as e:
+                print(f"[ARCHIVE] ⚠️ rétention : {e}")
+
+    def stats(self):
+        with self.lock:
+            rows = self.db.execute("SELECT camera, COUNT(*), COALESCE(SUM(bytes), 0), MIN(start), MAX(end) "
+                                   "FROM segments GROUP BY camera").fetchall()
+        return {c: {"segments": n, "bytes": b, "from": t0, "to": t1} for c, n, b, t0, t1 in rows}
+
+    def format(self):
+        parts = [f"{c}: {s['segments']} segments {s['bytes'] / 1e6:.0f} Mo {(s['to'] - s['from']) / 3600:.1f} h"
+                 for c, s in self.stats().items()]
+        dropped = [f"événements perdus={self.dropped_events}"] if self.dropped_events else []
+        return " | ".join(parts + [f"supprimés={self.pruned}"] + dropped)
+
+    def stop(self):
+        self.stop_event.set()
+        for segmenter in self.segmenters.values():
+            segmenter.stop()
+        if self.event_writer:
+            self.event_writer.join()  # écrit les événements encore en file
+        with self.lock:
+            self.db.close()
+
+
+def parse_time(text):
+    """"2026-10-17 14:02:10" (heure locale) ou timestamp -> timestamp"""
+    try:
+        return float(text)
+    except ValueError:
+        return time.mktime(time.strptime(text, "%Y-%m-%d %H:%M:%S"))
+
+
+# ------------------- MAIN -------------------
+if __name__ == "__main__":
+    # python archive.py                          -> archive toutes les caméras du compte
+    # python archive.py <caméra> "<AAAA-MM-JJ HH:MM:SS>"  -> segment à lire pour cet instant
+    if len(sys.argv) == 3:
+        archive = SegmentArchive()
+        found = archive.locate(sys.argv[1], parse_time(sys.argv[2]))
+        if found is None:
+            sys.exit("Aucun segment archivé à cet instant.")
+        print(f"{found['path']} à {found['offset']:.1f}s (octet ~{found['byte_offset']})")
+        print(f"ffplay -ss {found['offset']:.1f} {found['path']}")
+        archive.stop()
+        sys.exit(0)
+
+    from imou_api import get_client
+
+    client = get_client()
+    archive = SegmentArchive().start()
+    for dev in client.get_live_list(query_range="1-50"):
+        device_id, channel_id = dev["deviceId"], str(dev.get("channelId", "0"))
+        try:
+            url = client.device_rtmp(dev)
+        except Exception as e:
+            print(f"[ARCHIVE] ❌ {device_id}: {e}")
+            continue
+        archive.add_camera(f"{device_id}_{channel_id}", url,
+                           url_provider=lambda d=device_id, c=channel_id: client.create_rtmp(d, c))
+    try:
+        while True:
+            time.sleep(60)
+            print(f"[ARCHIVE] {archive.format()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        archive.stop()
@@ -12,14 +12,134 @@ import time
 import os
 from datetime import datetime
 
+# ------------------- Enregistrement en continu -------------------
+class AudioSegmentWriter:
+    """
+    Écrit le PCM sur disque au fil de l'eau, en segments WAV.
+    L'en-tête WAV est mis à jour à chaque écriture (wave le corrige dans writeframes),
+    un segment est donc lisible même si le programme s'arrête brutalement.
+    Après close(), write() n'écrit plus rien (aucun segment rouvert par un lecteur encore actif).
+    Rotation par durée et/ou taille, compression optionnelle (flac / opus) par ffmpeg
+    en arrière-plan une fois le segment fermé. La mémoire reste constante.
+    """
+    CODECS = {
+        "flac": ["-c:a", "flac"],
+        "opus": ["-c:a", "libopus", "-b:a", "32k"],
+    }
+
+    def __init__(self, output_dir="audio_recordings", rate=44100, channels=1, sampwidth=2,
+                 segment_seconds=600, max_bytes=None, compress=None, prefix="audio"):
+        """
+        segment_seconds: durée max d'un segment (None = pas de rotation par durée)
+        max_bytes: taille max des données d'un segment (None = pas de rotation par taille)
+        compress: None, "flac" ou "opus"
+        """
+        if compress is not None and compress not in self.CODECS:
+            raise ValueError(f"Compression inconnue: {compress}")
+        self.output_dir = output_dir
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.rate = rate
+        self.channels = channels
+        self.sampwidth = sampwidth
+        self.compress = compress
+        self.prefix = prefix
+        self.frame_bytes = channels * sampwidth
+        limits = [b for b in (segment_seconds and segment_seconds * rate * self.frame_bytes, max_bytes) if b]
+        # taille d'un segment arrondie à un nombre entier d'échantillons
+        self.segment_bytes = int(min(limits)) // self.frame_bytes * self.frame_bytes if limits else None
+        self.wav = None
+        self.filename = None
+        self.written = 0
+        self.index = 0
+        self.files = []      # segments terminés (après compression éventuelle)
+        self.pending = []    # threads de compression en cours
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def _open_segment(self):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.filename = os.path.join(self.output_dir, f"{self.prefix}_{timestamp}_{self.index:04d}.wav")
+        self.index += 1
+        self.wav = wave.open(self.filename, "wb")
+        self.wav.setnchannels(self.channels)
+        self.wav.setsampwidth(self.sampwidth)
+        self.wav.setframerate(self.rate)
+        self.written = 0
+
+    def write(self, data):
+        with self.lock:
+            if self.closed:
+                return
+            while data:
+                if self.wav is None:
+                    self._open_segment()
+                chunk = data
+                if self.segment_bytes:
+                    chunk = data[:self.segment_bytes - self.written]
+                self.wav.writeframes(chunk)
+                self.written += len(chunk)
+                data = data[len(chunk):]
+                if self.segment_bytes and self.written >= self.segment_bytes:
+                    self._close_segment()
+
+    def _close_segment(self):
+        self.wav.close()
+        self.wav = None
+        filename = self.filename
+        print(f"[AUDIO] 💾 Segment audio : {filename}")
+        if self.compress:
+            t = threading.Thread(target=self._compress, args=(filename,), daemon=True)
+            t.start()
+            self.pending = [p for p in self.pending if p.is_alive()] + [t]
+        else:
+            self.files.append(filename)
+
+    def _compress(self, filename):
+        target = os.path.splitext(filename)[0] + "." + self.compress
+        command = ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", filename] \
+            + self.CODECS[self.compress] + [target]
+        if subprocess.run(command).returncode == 0:
+            os.remove(filename)
+            self.files.append(target)
+        else:
+            print(f"[AUDIO] ⚠️ Compression {self.compress} échouée, WAV conservé : {filename}")
+            self.files.append(filename)
+
+    def close(self, wait=True):
+        with self.lock:
+            self.closed = True
+            if self.wav is not None:
+                self._close_segment()
+        if wait:
+            for t in self.pending:
+                t.join()
+        self.files.sort()  # les compressions finissent dans le désordre
+        return self.files
+
+
 class AudioRTMP:
-    def __init__(self, rtmp_url, listen=True, record=False, output_dir="audio_recordings"):
+    def __init__(self, rtmp_url, listen=True, record=False, output_dir="audio_recordings", source=None,
+                 segment_seconds=600, max_bytes=None, compress=None, analyzer=None):
+        """
+        source: flux PCM s16le mono 44100 Hz déjà ouvert (ex: AVStream.audio).
+        Sans source, un ffmpeg dédié est lancé sur rtmp_url.
+        record: écrit sur disque au fil de l'eau (AudioSegmentWriter), segments de segment_seconds
+        et/ou max_bytes, compress=None/"flac"/"opus"
+        analyzer: AudioEventDetector appliqué à chaque bloc (événements via son callback on_event)
+        """
         self.rtmp_url = rtmp_url
+        self.source = source
+        self.analyzer = analyzer
+        self.rate = 44100
+        self.samples = 0  # échantillons lus depuis le début du flux (horloge audio)
         self.listen = listen
         self.record = record
         self.output_dir = output_dir
         os.makedirs(self.output_dir, exist_ok=True)
-        self.frames = []
+        self.writer = None
+        if record:
+            self.writer = AudioSegmentWriter(output_dir, rate=self.rate, segment_seconds=segment_seconds,
+                                             max_bytes=max_bytes, compress=compress)
         self.is_running = False
         self.thread = None
         self.pa = pyaudio.PyAudio()
@@ -32,32 +152,45 @@ class AudioRTMP:
         self.thread.start()
         print("[AUDIO] 🎙️ Audio RTMP démarré...")
 
+    @property
+    def position(self):
+        """Position dans le flux en secondes, même horloge que AVStream.video_time."""
+        return self.samples / self.rate
+
     def _audio_loop(self):
-        command = [
-            "ffmpeg",
-            "-i", self.rtmp_url,
-            "-f", "s16le",
-            "-acodec", "pcm_s16le",
-            "-ac", "1",
-            "-ar", "44100",
-            "-"
-        ]
-        self.pipe = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=4096)
-
-        self.stream = self.pa.open(format=pyaudio.paInt16,
-                                   channels=1,
-                                   rate=44100,
-                                   output=self.listen)
+        if self.source is not None:
+            reader = self.source
+        else:
+            command = [
+                "ffmpeg",
+                "-i", self.rtmp_url,
+                "-f", "s16le",
+                "-acodec", "pcm_s16le",
+                "-ac", "1",
+                "-ar", "44100",
+                "-"
+            ]
+            self.pipe = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=4096)
+            reader = self.pipe.stdout
+
+        if self.listen:
+            self.stream = self.pa.open(format=pyaudio.paInt16,
+                                       channels=1,
+                                       rate=44100,
+                                       output=True)
 
         try:
             while self.is_running:
-                data = self.pipe.stdout.read(1024)
+                data = reader.read(1024)
                 if not data:
                     break
+                self.samples += len(data) // 2
                 if self.listen:
                     self.stream.write(data)
-                if self.record:
-                    self.frames.append(data)
+                if self.writer:
+                    self.writer.write(data)
+                if self.analyzer:
+                    self.analyzer.process(data)
         finally:
             if self.stream:
                 self.stream.stop_stream()
@@ -67,22 +200,20 @@ class AudioRTMP:
             self.pa.terminate()
 
     def stop(self):
+        """Avec source=..., arrêter la source d'abord (av.stop()) : la lecture en cours se termine."""
         self.is_running = False
+        if self.pipe and self.pipe.poll() is None:
+            self.pipe.terminate()  # débloque reader.read
         if self.thread:
             self.thread.join(timeout=2)
+            if self.thread.is_alive():
+                print("[AUDIO] ⚠️ lecture audio encore bloquée, plus rien n'est enregistré")
 
+        # dernier segment : retourne le fichier le plus récent, tous les segments sont dans writer.files
         filename = None
-        if self.record and self.frames:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = os.path.join(self.output_dir, f"audio_{timestamp}.wav")
-            import wave
-            wf = wave.open(filename, 'wb')
-            wf.setnchannels(1)
-            wf.setsampwidth(self.pa.get_sample_size(pyaudio.paInt16))
-            wf.setframerate(44100)
-            wf.writeframes(b''.join(self.frames))
-            wf.close()
-            print(f"[AUDIO] 💾 Audio sauvegardé : {filename}")
+        if self.writer:
+            files = self.writer.close()
+            filename = files[-1] if files else None
         return filename
 
 
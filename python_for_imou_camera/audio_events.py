@@ -0,0 +1,153 @@
+# audio_events.py
+import time
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class AudioEventDetector:
+    """
+    Analyse du PCM s16le mono par fenêtres glissantes, entièrement vectorisée avec NumPy :
+    niveaux RMS / crête (dBFS), centroïde spectral et part d'énergie haute fréquence.
+    Événements horodatés (position dans le flux, même horloge que AVStream) :
+      - "loud"      : niveau RMS au-dessus de loud_db
+      - "spike"     : crête brève et brillante (impact, bris de verre...)
+      - "sustained" : son continu au-dessus de sustained_db pendant sustained_seconds
+      - "onset"     : passage du silence à un son
+    """
+    def __init__(self, rate=44100, window=0.05, hop=0.025, loud_db=-20.0, spike_db=-6.0,
+                 crest_db=15.0, hf_cutoff=4000.0, hf_ratio=0.4, sustained_db=-35.0,
+                 sustained_seconds=2.0, silence_db=-50.0, onset_db=20.0, cooldown=1.0, on_event=None):
+        """
+        window / hop: taille et pas des fenêtres d'analyse en secondes
+        loud_db: seuil RMS d'un bruit fort
+        spike_db, crest_db, hf_cutoff, hf_ratio: crête minimale, écart crête/RMS minimal,
+            fréquence de coupure et part d'énergie au-dessus pour un "spike"
+        sustained_db, sustained_seconds: niveau et durée d'un son continu
+        silence_db, onset_db: niveau de silence et saut de niveau pour un "onset"
+        cooldown: délai minimal (secondes de flux) entre deux événements du même type
+        on_event: callback(event) appelé pour chaque événement
+        """
+        self.rate = rate
+        self.win = int(window * rate)
+        self.hop = int(hop * rate)
+        self.loud_db = loud_db
+        self.spike_db = spike_db
+        self.crest_db = crest_db
+        self.hf_ratio = hf_ratio
+        self.sustained_db = sustained_db
+        self.sustained_seconds = sustained_seconds
+        self.silence_db = silence_db
+        self.onset_db = onset_db
+        self.cooldown = cooldown
+        self.on_event = on_event
+
+        # précalculs pour la FFT
+        self.hann = np.hanning(self.win).astype(np.float32)
+        freqs = np.fft.rfftfreq(self.win, 1 / rate)
+        self.freqs = freqs.astype(np.float32)
+        self.hf_mask = freqs >= hf_cutoff
+
+        self.pending = np.empty(0, np.float32)  # échantillons pas encore couverts par une fenêtre
+        self.samples = 0        # position (en échantillons) du début de self.pending dans le flux
+        self.loud_since = None
+        self.background_db = silence_db
+        self.last_event = {}
+
+        self.windows = 0
+        self.proc_time = 0.0
+        self.audio_time = 0.0
+
+    def process(self, data):
+        """Ajoute un bloc PCM (bytes) et retourne la liste des événements détectés."""
+        t0 = time.perf_counter()
+        new = np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+        self.audio_time += len(new) / self.rate
+        x = np.concatenate((self.pending, new)) if self.pending.size else new
+        if len(x) < self.win:
+            self.pending = x
+            self.proc_time += time.perf_counter() - t0
+            return []
+
+        frames = sliding_window_view(x, self.win)[::self.hop]
+        n = len(frames)
+        starts = self.samples + np.arange(n) * self.hop
+
+        eps = 1e-10
+        rms_db = 10 * np.log10(np.mean(frames * frames, axis=1) + eps)
+        peak_db = 20 * np.log10(np.max(np.abs(frames), axis=1) + eps)
+        spectrum = np.abs(np.fft.rfft(frames * self.hann, axis=1))
+        total = spectrum.sum(axis=1) + eps
+        centroid = (spectrum @ self.freqs) / total
+        power = spectrum * spectrum
+        hf = power[:, self.hf_mask].sum(axis=1) / (power.sum(axis=1) + eps)
+
+        events = self._events(starts / self.rate, rms_db, peak_db, centroid, hf)
+
+        consumed = n * self.hop
+        self.pending = x[consumed:].copy()
+        self.samples += consumed
+        self.windows += n
+        self.proc_time += time.perf_counter() - t0
+        return events
+
+    def _events(self, times, rms_db, peak_db, centroid, hf):
+        # critères vectorisés, la boucle ne porte que sur les fenêtres candidates ou l'état "continu"
+        loud = rms_db >= self.loud_db
+        spike = (peak_db >= self.spike_db) & (peak_db - rms_db >= self.crest_db) & (hf >= self.hf_ratio)
+        onset = (rms_db >= self.background_db + self.onset_db) & (self.background_db <= self.silence_db)
+        active = rms_db >= self.sustained_db
+
+        events = []
+        for i in np.flatnonzero(loud | spike | onset | active | (self.loud_since is not None)):
+            t = float(times[i])
+            if spike[i]:
+                self._emit(events, "spike", t, rms_db[i], peak_db[i], centroid[i], hf[i])
+            if loud[i]:
+                self._emit(events, "loud", t, rms_db[i], peak_db[i], centroid[i], hf[i])
+            if onset[i]:
+                self._emit(events, "onset", t, rms_db[i], peak_db[i], centroid[i], hf[i])
+            if active[i]:
+                if self.loud_since is None:
+                    self.loud_since = t
+                elif t - self.loud_since >= self.sustained_seconds:
+                    self._emit(events, "sustained", t, rms_db[i], peak_db[i], centroid[i], hf[i])
+                    self.loud_since = t + self.cooldown  # un événement par épisode (puis rappel)
+            else:
+                self.loud_since = None
+
+        # fond sonore : moyenne lente sur les fenêtres calmes
+        quiet = rms_db[rms_db < self.sustained_db]
+        if quiet.size:
+            self.background_db += 0.1 * (float(quiet.mean()) - self.background_db)
+        return events
+
+    def _emit(self, events, kind, t, rms_db, peak_db, centroid, hf):
+        last = self.last_event.get(kind)
+        if last is not None and t - last < self.cooldown:
+            return
+        self.last_event[kind] = t
+        event = {
+            "type": kind,
+            "time": t,
+            "wall_time": time.time(),
+            "rms_db": float(rms_db),
+            "peak_db": float(peak_db),
+            "centroid_hz": float(centroid),
+            "hf_ratio": float(hf),
+        }
+        events.append(event)
+        if self.on_event:
+            self.on_event(event)
+
+    @property
+    def cost_per_window_us(self):
+        return self.proc_time / self.windows * 1e6 if self.windows else 0.0
+
+    @property
+    def realtime_factor(self):
+        """Temps de calcul / durée d'audio analysée (0.01 = 1 % d'un coeur par caméra)."""
+        return self.proc_time / self.audio_time if self.audio_time else 0.0
+
+    def format(self):
+        return (f"fenêtres={self.windows} coût={self.cost_per_window_us:.0f}µs/fenêtre "
+                f"charge={self.realtime_factor:.2%} d'un coeur")
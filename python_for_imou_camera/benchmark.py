@@ -0,0 +1,519 @@
+# benchmark.py
+# Micro-benchmarks CPU : python benchmark.py <nom> [options]
+import os
+import sys
+import time
+import subprocess
+import tracemalloc
+import argparse
+import threading
+import numpy as np
+
+
+def percentiles(values_s):
+    ms = np.array(values_s) * 1000
+    return np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+# ------------------- Inférence YOLO par lot -------------------
+def bench_batch(args):
+    """Frames/s et latence p50/p99 du MicroBatcher pour plusieurs tailles de lot."""
+    from detection import Yolov8Detector
+    from pipeline import MicroBatcher
+
+    detector = Yolov8Detector(model_path=args.model, device="cpu")
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (args.height, args.width, 3), np.uint8)
+    detector.detect_batch([frame])  # warm-up
+
+    print(f"{'batch':>5} {'frames/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for batch_size in args.sizes:
+        batcher = MicroBatcher(detector.detect_batch, max_batch=batch_size, max_wait=args.max_wait)
+        latencies = []
+        lock = threading.Lock()
+
+        # une source par place dans le lot, chacune soumet sa frame suivante dès le résultat reçu
+        def source(i):
+            for _ in range(args.frames):
+                t0 = time.monotonic()
+                batcher.submit(frame, source=i).result()
+                with lock:
+                    latencies.append(time.monotonic() - t0)
+
+        threads = [threading.Thread(target=source, args=(i,)) for i in range(batch_size)]
+        start = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - start
+        batcher.close()
+        p50, p99 = percentiles(latencies)
+        print(f"{batch_size:>5} {len(latencies) / elapsed:>9.1f} {p50:>8.1f} {p99:>8.1f}")
+
+
+# ------------------- Backends d'inférence YOLO -------------------
+def _map50(predictions, references):
+    """
+    mAP@0.5 des prédictions par rapport aux détections de référence (PyTorch FP32) prises comme vérité :
+    mesure la dérive due à l'export / la quantification, pas la précision absolue du modèle.
+    predictions / references: par image, tableaux (n, 6) x1, y1, x2, y2, score, classe
+    """
+    from tracker import iou_matrix
+
+    classes = {int(c) for ref in references for c in ref[:, 5]}
+    aps = []
+    for cls in classes:
+        scored, total = [], 0
+        for pred, ref in zip(predictions, references):
+            p, r = pred[pred[:, 5] == cls], ref[ref[:, 5] == cls]
+            total += len(r)
+            p = p[np.argsort(-p[:, 4])]
+            used = np.zeros(len(r), bool)
+            iou = iou_matrix(p[:, :4], r[:, :4]) if len(p) and len(r) else np.zeros((len(p), len(r)))
+            for i in range(len(p)):
+                j = int(np.argmax(iou[i])) if len(r) else -1
+                hit = j >= 0 and iou[i, j] >= 0.5 and not used[j]
+                if hit:
+                    used[j] = True
+                scored.append((p[i, 4], hit))
+        scored.sort(key=lambda x: -x[0])
+        hits = np.array([h for _, h in scored], bool)
+        tp = np.cumsum(hits)
+        recall = tp / max(total, 1)
+        precision = tp / np.arange(1, len(hits) + 1)
+        # AP interpolée sur 101 points, comme COCO
+        aps.append(np.mean([precision[recall >= t].max() if (recall >= t).any() else 0.0
+                            for t in np.linspace(0, 1, 101)]))
+    return float(np.mean(aps)) if aps else 1.0
+
+
+def bench_backends(args):
+    """FPS, latence p50/p99 et dérive de mAP@0.5 de PyTorch FP32, ONNX Runtime FP32 et ONNX Runtime INT8."""
+    import cv2
+    from detection import Yolov8Detector
+
+    if args.images:
+        paths = sorted(os.path.join(args.images, f) for f in os.listdir(args.images)
+                       if f.lower().endswith((".jpg", ".jpeg", ".png")))
+    else:
+        from ultralytics.utils import ASSETS  # bus.jpg, zidane.jpg
+        paths = sorted(str(p) for p in ASSETS.glob("*.jpg"))
+    frames = [cv2.imread(p) for p in paths]
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)  # même nombre de threads pour PyTorch et ONNX Runtime
+
+    references = None
+    print(f"{len(frames)} images, {args.threads or 'défaut'} threads")
+    print(f"{'backend':>10} {'chargement':>10} {'FPS':>7} {'p50 ms':>8} {'p99 ms':>8} {'mAP50/fp32':>11}")
+    for backend in args.backends:
+        t0 = time.perf_counter()
+        detector = Yolov8Detector(model_path=args.model, conf=args.conf, device="cpu", backend=backend,
+                                  threads=args.threads, calibration_dir=args.calibration)
+        load = time.perf_counter() - t0
+        detector.detect(frames[0], show=False)  # warm-up
+
+        times, detections = [], []
+        for _ in range(args.repeat):
+            detections = []
+            for frame in frames:
+                t0 = time.perf_counter()
+                r = detector.detect(frame, show=False)
+                times.append(time.perf_counter() - t0)
+                detections.append(r.boxes.data.cpu().numpy().astype(np.float32))
+        if references is None:
+            references = detections  # premier backend (torch par défaut) = référence
+        p50, p99 = percentiles(times)
+        print(f"{backend:>10} {load:>9.1f}s {len(times) / sum(times):>7.1f} {p50:>8.1f} {p99:>8.1f} "
+              f"{_map50(detections, references):>11.3f}")
+
+
+# ------------------- ROI et tuiles -------------------
+def bench_tiles(args):
+    """
+    Rappel des petites personnes et coût CPU : plein cadre, ROI, tuiles, ROI + tuiles.
+    Scène synthétique : copies réduites (scale) d'une image d'exemple collées dans la moitié basse
+    d'une frame width x height ; vérité terrain = personnes détectées sur l'image à taille réelle.
+    """
+    import cv2
+    from detection import yolov8_predict_batch
+    from tiling import RegionDetector
+    from tracker import iou_matrix
+
+    if args.image:
+        image = cv2.imread(args.image)
+    else:
+        from ultralytics.utils import ASSETS
+        image = cv2.imread(str(ASSETS / "bus.jpg"))
+    ref = yolov8_predict_batch([image], conf=args.conf)[0].boxes.data.cpu().numpy()
+    ref = ref[ref[:, 5] == 0, :4] * args.scale
+
+    small = cv2.resize(image, None, fx=args.scale, fy=args.scale, interpolation=cv2.INTER_AREA)
+    sh, sw = small.shape[:2]
+    frame = np.full((args.height, args.width, 3), 90, np.uint8)
+    truth = []
+    top = args.height // 2
+    per_row = max(1, (args.width - sw) // (sw + sw // 2) + 1)
+    for i in range(args.copies):
+        x = (i % per_row) * (sw + sw // 2)
+        y = top + (i // per_row) * sh
+        if y + sh > args.height or x + sw > args.width:
+            break
+        frame[y:y + sh, x:x + sw] = small
+        truth.append(ref + [x, y, x, y])
+    truth = np.concatenate(truth)
+    roi = [[(0, top), (args.width, top), (args.width, args.height), (0, args.height)]]
+    print(f"{args.width}x{args.height}, {len(truth)} personnes de ~{int(np.median(truth[:, 3] - truth[:, 1]))} px de haut")
+
+    modes = {"plein cadre": {}, "ROI": {"rois": roi}, "tuiles": {"tile": args.tile},
+             "ROI + tuiles": {"rois": roi, "tile": args.tile}}
+    print(f"{'mode':>13} {'inférences':>10} {'p50 ms':>8} {'p99 ms':>8} {'rappel':>7} {'faux +':>7}")
+    for label, options in modes.items():
+        region = RegionDetector(yolov8_predict_batch, conf=args.conf, **options)
+        region(frame)  # warm-up et préparation des tuiles
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            r = region(frame)
+            times.append(time.perf_counter() - t0)
+        dets = r.boxes.data.cpu().numpy()
+        persons = dets[dets[:, 5] == 0, :4]
+        iou = iou_matrix(truth, persons) if len(persons) else np.zeros((len(truth), 0))
+        found = int((iou.max(axis=1) >= 0.5).sum()) if len(persons) else 0
+        false_pos = int((iou.max(axis=0) < 0.5).sum()) if len(persons) else 0
+        p50, p99 = percentiles(times)
+        print(f"{label:>13} {region.inferences / region.frames:>10.0f} {p50:>8.1f} {p99:>8.1f} "
+              f"{found / len(truth):>7.0%} {false_pos:>7}")
+
+
+# ------------------- Lecture du pipe ffmpeg -------------------
+def _frame_source(frame_size, frames, bufsize):
+    """Sous-processus qui écrit des frames brutes sur stdout, comme ffmpeg -f rawvideo."""
+    code = (f"import sys; b = bytes({frame_size}); w = sys.stdout.buffer\n"
+            f"for _ in range({frames}): w.write(b)")
+    return subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE, bufsize=bufsize)
+
+
+def _ingest_copy(frame_size, frames, shape, trace):
+    """Ancienne lecture : read() + frombuffer + copy() à chaque frame."""
+    pipe = _frame_source(frame_size, frames, 10**8)
+    transient = []
+    n = 0
+    while True:
+        if trace:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        raw = pipe.stdout.read(frame_size)
+        if len(raw) != frame_size:
+            break
+        frame = np.frombuffer(raw, np.uint8).reshape(shape)
+        frame = frame.copy()
+        if trace:
+            transient.append(tracemalloc.get_traced_memory()[1] - base)
+        del raw, frame
+        n += 1
+    pipe.wait()
+    return n, transient
+
+
+def _ingest_pool(frame_size, frames, shape, trace):
+    """Nouvelle lecture : readinto dans un buffer du FramePool, rendu au pool ensuite."""
+    from pipeline import FramePool, read_exactly_into
+    pool = FramePool(shape, 4)
+    pipe = _frame_source(frame_size, frames, 0)
+    transient = []
+    n = 0
+    while True:
+        if trace:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        frame = pool.acquire()
+        ok = read_exactly_into(pipe.stdout, frame.array)
+        frame.release()
+        if not ok:
+            break
+        if trace:
+            transient.append(tracemalloc.get_traced_memory()[1] - base)
+        n += 1
+    pipe.wait()
+    return n, transient
+
+
+def bench_ingest(args):
+    """Allocations par frame et débit MB/s : read+copy contre readinto dans le pool."""
+    shape = (args.height, args.width, 3)
+    frame_size = int(np.prod(shape))
+    print(f"{'lecture':>8} {'MB/s':>8} {'frames/s':>9} {'alloc/frame':>12} {'Ko/frame':>9}")
+    for name, fn in (("copy", _ingest_copy), ("pool", _ingest_pool)):
+        # débit sans tracemalloc
+        start = time.monotonic()
+        n, _ = fn(frame_size, args.frames, shape, trace=False)
+        elapsed = time.monotonic() - start
+        # allocations transitoires (pic tracemalloc par frame)
+        tracemalloc.start()
+        _, transient = fn(frame_size, min(args.frames, 100), shape, trace=True)
+        tracemalloc.stop()
+        per_frame = float(np.mean(transient)) if transient else 0.0
+        print(f"{name:>8} {n * frame_size / elapsed / 1e6:>8.0f} {n / elapsed:>9.0f} "
+              f"{per_frame / frame_size:>12.2f} {per_frame / 1024:>9.1f}")
+
+
+# ------------------- Analyse audio -------------------
+def bench_audio(args):
+    """Coût par fenêtre et nombre de caméras tenables par coeur pour AudioEventDetector."""
+    from audio_events import AudioEventDetector
+
+    rate = 44100
+    rng = np.random.default_rng(0)
+    pcm = rng.normal(0, 0.003, rate * args.seconds)           # fond calme
+    for start in range(5, args.seconds - 1, 10):               # un claquement toutes les 10 s
+        burst = slice(start * rate, start * rate + rate // 20)
+        pcm[burst] += rng.normal(0, 0.5, rate // 20)
+    data = (np.clip(pcm, -1, 1) * 32767).astype(np.int16).tobytes()
+
+    detector = AudioEventDetector(rate=rate)
+    events = []
+    for i in range(0, len(data), args.chunk):
+        events += detector.process(data[i:i + args.chunk])
+    kinds = {}
+    for e in events:
+        kinds[e["type"]] = kinds.get(e["type"], 0) + 1
+    print(f"audio={args.seconds}s fenêtres={detector.windows} événements={kinds}")
+    print(f"coût={detector.cost_per_window_us:.1f} µs/fenêtre "
+          f"charge={detector.realtime_factor:.3%} d'un coeur par caméra "
+          f"-> ~{1 / detector.realtime_factor:.0f} caméras/coeur")
+
+
+# ------------------- Démarrage LBPH -------------------
+def bench_faces(args):
+    """Démarrage de FaceRecognitionOpenCV : entraînement complet, cache, ajout incrémental."""
+    import cv2
+    import tempfile
+    from recognition import FaceRecognitionOpenCV
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        known = os.path.join(tmp, "known_faces")
+
+        def add_images(person, count, first=0):
+            os.makedirs(os.path.join(known, person), exist_ok=True)
+            for i in range(first, first + count):
+                img = rng.integers(0, 255, (240, 240, 3), np.uint8)
+                cv2.imwrite(os.path.join(known, person, f"{i}.jpg"), img)
+
+        for p in range(args.persons):
+            add_images(f"person{p}", args.images)
+        model = os.path.join(tmp, "lbph_model.yml")
+
+        def timed(**kwargs):
+            t0 = time.perf_counter()
+            FaceRecognitionOpenCV(known_dir=known, model_path=model, **kwargs)
+            return time.perf_counter() - t0
+
+        cold = timed(use_cache=False)
+        warm = timed()
+        add_images("person0", args.added, first=args.images)
+        incremental = timed()
+
+    total = args.persons * args.images
+    print(f"images={total} ajoutées={args.added}")
+    print(f"entraînement complet={cold * 1000:.0f}ms cache={warm * 1000:.0f}ms "
+          f"incrémental={incremental * 1000:.0f}ms ({cold / warm:.1f}x plus rapide avec le cache)")
+
+
+# ------------------- Reconnaissance par lot -------------------
+def bench_recognize(args):
+    """recognize_face visage par visage contre recognize_batch (séquentiel puis pool de threads)."""
+    import cv2
+    import tempfile
+    from recognition import FaceRecognitionOpenCV
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        known = os.path.join(tmp, "known_faces")
+        for p in range(args.persons):
+            os.makedirs(os.path.join(known, f"person{p}"))
+            for i in range(args.images):
+                img = rng.integers(0, 255, (200, 200, 3), np.uint8)
+                cv2.imwrite(os.path.join(known, f"person{p}", f"{i}.png"), img)
+        recog = FaceRecognitionOpenCV(known_dir=known, model_path=os.path.join(tmp, "lbph_model.yml"))
+
+    crops = [rng.integers(0, 255, (int(rng.integers(60, 240)), int(rng.integers(60, 200)), 3), np.uint8)
+             for _ in range(args.faces)]
+    print(f"lot de {args.faces} visages, galerie LBPH de {args.persons * args.images} images")
+
+    def run(name, fn):
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            out = fn()
+            times.append(time.perf_counter() - t0)
+        p50, p99 = percentiles(times)
+        print(f"{name:>22} p50={p50:7.1f}ms p99={p99:7.1f}ms")
+        return out
+
+    reference = run("visage par visage", lambda: [recog.recognize_face(c) for c in crops])
+    for workers in sorted({1, args.workers}):
+        recog.workers = workers
+        batch = run(f"lot, {workers} thread(s)", lambda: recog.recognize_batch(crops))
+        assert [n for n, _ in batch] == [n for n, _ in reference]
+    print(recog.format_batch())
+
+
+# ------------------- Galerie d'embeddings -------------------
+def bench_gallery(args):
+    """Latence de recherche top-k dans FaceIndex selon la taille de la galerie (RAM et memmap)."""
+    import tempfile
+    from recognition import FaceIndex
+
+    rng = np.random.default_rng(0)
+    queries = rng.normal(size=(args.queries, 128)).astype(np.float32)
+    print(f"{'embeddings':>10} {'RAM p50':>9} {'memmap p50':>11} {'p99':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            index = FaceIndex()
+            for start in range(0, size, 10000):
+                n = min(10000, size - start)
+                index.add(f"person{start}", rng.normal(size=(n, 128)))
+            path = os.path.join(tmp, f"gallery{size}")
+            index.save(path)
+            mapped, _ = FaceIndex.load(path)
+
+            row = []
+            for gallery in (index, mapped):
+                gallery.search(queries[0], k=args.k)  # pages du memmap chargées une fois
+                times = []
+                for q in queries:
+                    t0 = time.perf_counter()
+                    gallery.search(q, k=args.k)
+                    times.append(time.perf_counter() - t0)
+                row.append(percentiles(times))
+            print(f"{size:>10} {row[0][0]:>7.2f}ms {row[1][0]:>9.2f}ms {row[1][1]:>6.2f}ms")
+
+
+# ------------------- Historique des détections -------------------
+def bench_events(args):
+    """Débit d'écriture de DetectionStore et latence des requêtes indexées sur une grosse table."""
+    import tempfile
+    from event_store import DetectionStore
+
+    rng = np.random.default_rng(0)
+    names = ["Unknown"] + [f"person{i}" for i in range(args.persons)]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DetectionStore(os.path.join(tmp, "detections.sqlite"), batch_size=5000)
+        t_start = time.time() - args.days * 86400
+        t0 = time.perf_counter()
+        block = 10000
+        for first in range(0, args.rows, block):
+            n = min(block, args.rows - first)
+            times = t_start + np.sort(rng.random(n)) * args.days * 86400
+            cams = rng.integers(0, args.cameras, n)
+            who = rng.integers(0, len(names), n)
+            for t, c, w in zip(times.tolist(), cams.tolist(), who.tolist()):
+                store.add_records(f"cam{c}", t, [{"class": "person", "box": (0, 0, 10, 10), "name": names[w]}])
+            while store.queue.qsize() > 50000:  # la file bornée abandonnerait les lignes : on attend le writer
+                time.sleep(0.01)
+        store.flush()
+        elapsed = time.perf_counter() - t0
+        print(f"lignes={args.rows} écriture={args.rows / elapsed:,.0f} lignes/s perdues={store.dropped}")
+
+        night = (time.time() - 86400 - 4 * 3600, time.time() - 86400 + 7 * 3600)
+        queries = {
+            "inconnus cam0 une nuit": lambda: store.unknown_faces("cam0", *night, limit=None),
+            "première vue person1 sur 1 jour": lambda: store.first_sighting("person1", time.time() - 86400),
+            "dernière vue person2": lambda: store.last_sighting("person2"),
+            "comptage cam1 sur 1 h": lambda: store.count("cam1", time.time() - 3600),
+        }
+        for label, fn in queries.items():
+            times = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                out = fn()
+                times.append(time.perf_counter() - t0)
+            p50, p99 = percentiles(times)
+            n = 0 if out is None else 1 if isinstance(out, dict) and "camera" in out else len(out)
+            print(f"{label:>34} p50={p50:7.2f}ms p99={p99:7.2f}ms ({n} résultats)")
+        store.close()
+
+
+# ------------------- MAIN -------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks CPU")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("batch", help="inférence YOLO par lot (MicroBatcher)")
+    p.add_argument("--model", default="src/yolov8n.pt")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    p.add_argument("--frames", type=int, default=8, help="frames par source")
+    p.add_argument("--max-wait", type=float, default=0.05)
+    p.add_argument("--width", type=int, default=640)
+    p.add_argument("--height", type=int, default=480)
+    p.set_defaults(func=bench_batch)
+
+    p = sub.add_parser("backends", help="YOLO PyTorch FP32 contre ONNX Runtime FP32 et INT8")
+    p.add_argument("--model", default="src/yolov8n.pt")
+    p.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    p.add_argument("--images", help="dossier d'images (défaut: images d'exemple d'ultralytics)")
+    p.add_argument("--calibration", help="images pour la quantification INT8 statique (défaut: dynamique)")
+    p.add_argument("--threads", type=int, default=None, help="threads intra-opérateurs ONNX Runtime")
+    p.add_argument("--conf", type=float, default=0.25)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_backends)
+
+    p = sub.add_parser("tiles", help="petites personnes en 4K : plein cadre, ROI, tuiles, ROI + tuiles")
+    p.add_argument("--image", help="image source (défaut: bus.jpg d'ultralytics)")
+    p.add_argument("--width", type=int, default=3840)
+    p.add_argument("--height", type=int, default=2160)
+    p.add_argument("--scale", type=float, default=0.3, help="réduction des copies (personnes lointaines)")
+    p.add_argument("--copies", type=int, default=8)
+    p.add_argument("--tile", type=int, default=640)
+    p.add_argument("--conf", type=float, default=0.4)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_tiles)
+
+    p = sub.add_parser("ingest", help="lecture du pipe ffmpeg : read+copy contre readinto+pool")
+    p.add_argument("--frames", type=int, default=500)
+    p.add_argument("--width", type=int, default=640)
+    p.add_argument("--height", type=int, default=480)
+    p.set_defaults(func=bench_ingest)
+
+    p = sub.add_parser("audio", help="analyse audio (AudioEventDetector)")
+    p.add_argument("--seconds", type=int, default=60)
+    p.add_argument("--chunk", type=int, default=1024, help="octets par bloc, comme AudioRTMP")
+    p.set_defaults(func=bench_audio)
+
+    p = sub.add_parser("faces", help="démarrage LBPH (FaceRecognitionOpenCV) avec et sans cache")
+    p.add_argument("--persons", type=int, default=10)
+    p.add_argument("--images", type=int, default=30, help="images par personne")
+    p.add_argument("--added", type=int, default=5, help="images ajoutées avant le dernier démarrage")
+    p.set_defaults(func=bench_faces)
+
+    p = sub.add_parser("recognize", help="reconnaissance LBPH visage par visage contre par lot")
+    p.add_argument("--faces", type=int, default=16, help="visages par lot")
+    p.add_argument("--persons", type=int, default=5)
+    p.add_argument("--images", type=int, default=20, help="images par personne")
+    p.add_argument("--workers", type=int, default=os.cpu_count())
+    p.add_argument("--repeat", type=int, default=20)
+    p.set_defaults(func=bench_recognize)
+
+    p = sub.add_parser("gallery", help="recherche top-k dans la galerie SFace (FaceIndex)")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("-k", type=int, default=5)
+    p.set_defaults(func=bench_gallery)
+
+    p = sub.add_parser("events", help="écriture et requêtes de l'historique des détections (DetectionStore)")
+    p.add_argument("--rows", type=int, default=1000000)
+    p.add_argument("--cameras", type=int, default=20)
+    p.add_argument("--persons", type=int, default=50)
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--repeat", type=int, default=20)
+    p.set_defaults(func=bench_events)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
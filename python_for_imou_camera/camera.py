@@ -1,126 +1,190 @@
 # camera.py
 
-import cv2
 import time
-import uuid
-import hashlib
-import requests
+import threading
 import subprocess
-import numpy as np
-from detection import yolov8_detection
-from config import AppId, AppSecret, BASE_URL 
+from detection import yolov8_detect, yolov8_predict_batch, warm_up
+from tiling import RegionDetector
+from config import rois as camera_rois
+from imou_api import get_client
 from audio import AudioRTMP 
-#from motion_tracking import MotionDetector
+from pipeline import PipelineStats, FrameRing, CaptureThread, DetectionWorker
+from motion_tracking import MotionDetector
+from tracker import PersonTracker
+from sinks import annotate_detections, make_sink, WindowSink
+from recorder import ClipRecorder
+from archive import SegmentArchive
+from event_store import DetectionStore
+from camera_movement import PTZController
+from ffmpeg_stream import build_video_command, output_geometry, frame_shape, AVStream, ResilientStream
+from audio_events import AudioEventDetector
 
-# ------------------- Fonctions utilitaires -------------------
-def make_sign(ts, nonce, secret):
-    raw = f"time:{ts},nonce:{nonce},appSecret:{secret}"
-    return hashlib.md5(raw.encode("utf-8")).hexdigest()
-
-def post(endpoint, payload):
-    url = f"{BASE_URL}/{endpoint}"
-    r = requests.post(url, json=payload)
-    r.raise_for_status()
-    return r.json()
-
-# ------------------- Authentification -------------------
+# ------------------- API Imou (client partagé, voir imou_api.py) -------------------
 def get_access_token():
-    ts = int(time.time())
-    nonce = str(uuid.uuid4())
-    sign = make_sign(ts, nonce, AppSecret)
-    payload = {
-        "system": {"ver": "1.0", "appId": AppId, "sign": sign, "time": ts, "nonce": nonce},
-        "id": str(uuid.uuid4()),
-        "params": {}
-    }
-    data = post("accessToken", payload)
-    if data["result"]["code"] == "0":
-        return data["result"]["data"]["accessToken"]
-    raise Exception(f"Login failed: {data}")
-
-# ------------------- Lister devices -------------------
+    return get_client().get_access_token()
+
 def get_live_list(token, query_range="1-10"):
-    ts = int(time.time())
-    nonce = str(uuid.uuid4())
-    sign = make_sign(ts, nonce, AppSecret)
-    payload = {
-        "system": {"ver": "1.0", "appId": AppId, "sign": sign, "time": ts, "nonce": nonce},
-        "id": str(uuid.uuid4()),
-        "params": {"token": token, "queryRange": query_range}
-    }
-    data = post("liveList", payload)
-    if data["result"]["code"] == "0":
-        return data["result"]["data"]["lives"]
-    raise Exception(f"liveList failed: {data}")
-
-# ------------------- Gestion RTMP -------------------
+    return get_client().get_live_list(query_range, token=token)
+
 def create_rtmp(token, device_id, channel_id="0"):
-    ts = int(time.time())
-    nonce = str(uuid.uuid4())
-    sign = make_sign(ts, nonce, AppSecret)
-    payload = {
-        "system": {"ver": "1.0", "appId": AppId, "sign": sign, "time": ts, "nonce": nonce},
-        "id": str(uuid.uuid4()),
-        "params": {"deviceId": device_id, "channelId": channel_id, "token": token}
-    }
-    data = post("createDeviceRtmpLive", payload)
-    code = data["result"]["code"]
-    if code == "0":
-        return data["result"]["data"]["rtmp"]
-    elif code == "LV1001":
-        return query_rtmp(token, device_id, channel_id)
-    else:
-        raise Exception(f"createDeviceRtmpLive failed: {data}")
+    return get_client().create_rtmp(device_id, channel_id, token=token)
 
 def query_rtmp(token, device_id, channel_id="0"):
-    ts = int(time.time())
-    nonce = str(uuid.uuid4())
-    sign = make_sign(ts, nonce, AppSecret)
-    payload = {
-        "system": {"ver": "1.0", "appId": AppId, "sign": sign, "time": ts, "nonce": nonce},
-        "id": str(uuid.uuid4()),
-        "params": {"deviceId": device_id, "channelId": channel_id, "token": token}
-    }
-    data = post("queryDeviceRtmpLive", payload)
-    if data["result"]["code"] == "0":
-        return data["result"]["data"]["rtmp"]
-    else:
-        raise Exception(f"queryDeviceRtmpLive failed: {data}")
+    return get_client().query_rtmp(device_id, channel_id, token=token)
+
+def device_rtmp(token, device):
+    """Premier flux RTMP annoncé par liveList pour ce device, sinon en crée un."""
+    return get_client().device_rtmp(device, token=token)
 
 # ------------------- Lecture RTMP stable via FFmpeg -------------------
-def open_rtmp_stream_ffmpeg(rtmp_url, width=640, height=480):
-    command = [
-        "ffmpeg",
-        "-i", rtmp_url,
-        "-f", "rawvideo",
-        "-pix_fmt", "bgr24",
-        "-"
-    ]
-    pipe = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=10**8)
-    frame_count = 0
-    process_every_n = 15
+def open_rtmp_stream_ffmpeg(rtmp_url, width=None, height=None, fps=None, pix_fmt="bgr24", hwaccel=None,
+                            detection_workers=1, queue_size=4, stats_interval=5.0, motion=True,
+                            av_stream=None, audio=None, tracker=True, sinks=None, result_ttl=2.0,
+                            on_result=None, region=None):
+    """
+    Pipeline en 3 étages : capture (thread qui vide le pipe ffmpeg dans un ring buffer),
+    détection (worker(s) qui prennent toujours la frame la plus récente) et affichage.
+    Une détection lente ne bloque plus la lecture du flux.
+    motion: True (MotionDetector par défaut), une instance de MotionDetector
+    (sensibilité / ROI personnalisées) ou False pour lancer YOLO sur toutes les frames.
+    width/height: taille voulue, mise à l'échelle par ffmpeg (None = taille réelle du flux, sondée)
+    fps: décimation faite par ffmpeg (None = toutes les frames)
+    pix_fmt: format de sortie de ffmpeg, seul bgr24 est accepté (YOLO, MotionDetector et la
+    reconnaissance faciale attendent des frames BGR ; gray / rgb24 restent pour les autres lecteurs)
+    hwaccel: "none" pour forcer le décodage CPU, None pour laisser ffmpeg choisir
+    detection_workers: 2 recouvre YOLO et la reconnaissance faciale de deux frames ; au-delà, aucun gain
+    av_stream: AVStream ou ResilientStream déjà démarré (audio + vidéo sur une seule connexion),
+    remplace les options ffmpeg
+    audio: AudioRTMP branché sur av_stream.audio, pour afficher le décalage A/V
+    tracker: True (PersonTracker par défaut), une instance de PersonTracker ou False ;
+    les personnes suivies sont encadrées sur le flux live entre deux détections (boîtes extrapolées)
+    sinks: sorties des images annotées (voir sinks.py), None = fenêtre locale ;
+    [NullSink()] pour un serveur sans écran. L'arrêt vient de la fenêtre ("q"), de Ctrl+C ou de la fin du flux.
+    result_ttl: âge maximal (secondes) d'un résultat de détection pour être encore dessiné
+    on_result: callback(seq, result) depuis le worker pour chaque résultat (ex: ClipRecorder.trigger)
+    region: RegionDetector optionnel (ROI et/ou tuiles) à la place du predict plein cadre
+    """
+    if av_stream is not None:
+        width, height, pix_fmt, fps = av_stream.width, av_stream.height, av_stream.pix_fmt, av_stream.fps
+        video, stop_source = av_stream.video, av_stream.stop
+    if pix_fmt != "bgr24":
+        raise ValueError(f"pix_fmt non supporté par la détection: {pix_fmt} (bgr24 attendu)")
+    if av_stream is None:
+        width, height = output_geometry(rtmp_url, width, height)
+        command = build_video_command(rtmp_url, width, height, fps=fps, pix_fmt=pix_fmt, hwaccel=hwaccel)
+        # bufsize=0 : readinto écrit directement dans les buffers du pool, sans copie intermédiaire
+        pipe = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=0)
+        video, stop_source = pipe.stdout, pipe.terminate
+    print(f"[PIPELINE] 📐 {width}x{height} {pix_fmt}" + (f" @ {fps} fps" if fps else ""))
+
+    stats = PipelineStats()
+    ring = FrameRing(frame_shape(width, height, pix_fmt), capacity=queue_size, stats=stats,
+                     consumers=detection_workers + 1)
+    capture = CaptureThread(video, ring)
+    # modèles partagés entre workers : YOLO d'un côté, visages (YuNet, reconnaissance) de l'autre ;
+    # avec plusieurs workers, la reconnaissance d'une frame tourne pendant le predict de la suivante
+    detect_lock = threading.Lock()
+    face_lock = threading.Lock()
+    if motion is True:
+        motion = MotionDetector()
+    if tracker is True:
+        tracker = PersonTracker()
+    if sinks is None:
+        sinks = [WindowSink()]
+    # la détection de mouvement garde un état (fond) : un seul appel à la fois
+    motion_lock = threading.Lock()
+
+    def gate(frame):
+        with motion_lock:
+            return motion.detect(frame)
+
+    def detect(frame):
+        with detect_lock:
+            results = region(frame) if region is not None else yolov8_predict_batch([frame])[0]
+        with face_lock:
+            return yolov8_detect(frame, tracker=tracker or None, results=results)
+
+    workers = [DetectionWorker(ring, detect, on_result=on_result, gate=gate if motion else None)
+               for _ in range(detection_workers)]
+    capture.start()
+    for w in workers:
+        w.start()
+
+    last_seq = 0
+    last_stats = time.time()
+    running = True
     try:
-        prev_time = time.time()
-        while True:
-            raw_frame = pipe.stdout.read(width * height * 3)
-            if len(raw_frame) != width * height * 3:
-                break
-            frame = np.frombuffer(raw_frame, np.uint8).reshape((height, width, 3))
-            frame = frame.copy()
+        while running:
+            frame = ring.read_latest(after_seq=last_seq, timeout=0.5)
+            if frame is None:
+                if ring.closed:
+                    break
+                continue
+            last_seq = frame.seq
 
-            frame_count += 1
-            if frame_count % process_every_n == 0:
-                yolov8_detection(frame)
+            # dernier résultat de détection disponible, tous workers confondus (ignoré s'il est trop ancien)
+            latest = max((w.latest for w in workers if w.latest), default=None, key=lambda r: r[0])
+            result = latest[1] if latest and time.time() - latest[1]["timestamp"] <= result_ttl else None
 
-            cv2.imshow("Camera Live", frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+            # annotation seulement si une sortie en a besoin pour cette frame
+            wanted = [sink for sink in sinks if sink.wants(result)]
+            if wanted:
+                # copie : la frame du pool est partagée avec les workers
+                image = annotate_detections(frame.array, result, tracker.boxes_at() if tracker else None)
+                for sink in wanted:
+                    running = sink.publish(image, result) is not False and running
+            frame.release()
+
+            if time.time() - last_stats >= stats_interval:
+                print(f"[PIPELINE] {stats.format()}")
+                if motion:
+                    print(f"[MOTION] {motion.format()}")
+                if tracker:
+                    print(f"[TRACK] {tracker.format()}")
+                if av_stream is not None and audio is not None:
+                    # même horloge : position audio - PTS de la dernière frame vidéo
+                    offset = audio.position - av_stream.video_time(stats.captured)
+                    print(f"[AV] décalage audio/vidéo {offset * 1000:+.0f} ms")
+                if isinstance(av_stream, ResilientStream):
+                    print(f"[STREAM] {av_stream.format()}")
+                last_stats = time.time()
     finally:
-        pipe.terminate()
-        cv2.destroyAllWindows()
+        capture.stop()
+        for w in workers:
+            w.stop()
+        stop_source()
+        for sink in sinks:
+            sink.close()
+    return stats.snapshot()
 
 # ------------------- MAIN -------------------
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Détection sur la première caméra disponible")
+    parser.add_argument("--sink", action="append", choices=["window", "none", "snapshot", "mjpeg"],
+                        help="sortie des images annotées, répétable (défaut: window)")
+    parser.add_argument("--port", type=int, default=8080, help="port de l'aperçu MJPEG")
+    parser.add_argument("--snapshot-dir", default="snapshots")
+    parser.add_argument("--record", choices=["person", "unknown"],
+                        help="clips vidéo quand une personne (ou un visage inconnu) est détectée")
+    parser.add_argument("--pre-roll", type=float, default=10.0, help="secondes avant l'événement")
+    parser.add_argument("--post-roll", type=float, default=10.0, help="secondes après le dernier événement")
+    parser.add_argument("--events", metavar="DB", help="historique des détections (SQLite), ex: detections.sqlite")
+    parser.add_argument("--archive", action="store_true",
+                        help="enregistrement continu sans réencodage dans archive/, détections indexées")
+    parser.add_argument("--follow", action="store_true", help="suivi PTZ automatique de la personne détectée")
+    parser.add_argument("--tile", type=int, help="inférence en tuiles de TILE pixels (caméras 2K/4K, ex: 640)")
+    parser.add_argument("--ptz-rate", type=float, default=2.0, help="appels PTZ maximum par seconde")
+    args = parser.parse_args()
+    # modèles chargés pendant la connexion à l'API et au flux, rapport de démarrage à la fin
+    warm_up(background=True)
+    sink_names = args.sink or ["window"]
+    sink_options = {"mjpeg": {"port": args.port}, "snapshot": {"output_dir": args.snapshot_dir}}
+    sinks = [make_sink(name, **sink_options.get(name, {})) for name in sink_names]
+    for sink in sinks:
+        if hasattr(sink, "url"):
+            print(f"✅ Aperçu MJPEG: {sink.url}")
+
     token = get_access_token()
     devices = get_live_list(token)
     chosen_device = None
@@ -137,21 +201,85 @@ if __name__ == "__main__":
         if chosen_rtmp:
             break
 
+    if not chosen_device:
+        chosen_device = devices[0]
+    device_id = chosen_device["deviceId"]
+    channel_id = str(chosen_device["channelId"])
     if not chosen_rtmp:
-        if not chosen_device:
-            chosen_device = devices[0]
-        device_id = chosen_device["deviceId"]
-        channel_id = str(chosen_device["channelId"])
         chosen_rtmp = create_rtmp(token, device_id, channel_id)
 
     print(f"✅ RTMP URL: {chosen_rtmp}")
+    camera_name = f"{device_id}_{channel_id}"
+    rois = camera_rois.get(camera_name)  # zones utiles de cette caméra (config.rois)
+
+    # --- 🎙️ Un seul ffmpeg pour l'audio et la vidéo, relancé automatiquement ---
+    # les URLs RTMP expirent : en cas d'échecs répétés on en redemande une (jeton renouvelé par le client)
+    refresh_url = lambda: get_client().create_rtmp(device_id, channel_id)
+    av = ResilientStream(AVStream(chosen_rtmp), url_provider=refresh_url)
+
+    # --- 🎥 Clips sur détection : copie du H.264 d'origine, pré-enregistrement glissant ---
+    # les segments sont écrits par le ffmpeg de la détection (sortie -c copy en plus) : une seule connexion
+    # RTMP ; avec l'archive, les clips sont assemblés à partir de ses segments
+    recorder = None
+    if args.record:
+        recorder = ClipRecorder(stream=None if args.archive else av, pre_roll=args.pre_roll,
+                                post_roll=args.post_roll).start()
+
+    # --- 🗄️ Archive continue, les détections sont indexées sur la même ligne de temps ---
+    archive = None
+    if args.archive:
+        archive = SegmentArchive().start()
+        archive.add_camera(camera_name, stream=av, on_segment=recorder.add_segment if recorder else None)
+
+    av.start()
+    motion = MotionDetector(hold=3.0, rois=rois)
+    audio_manager = None
+    if av.audio is not None:
+        def on_audio_event(event):
+            print(f"[AUDIO] 🔊 {event['type']} à {event['time']:.1f}s ({event['rms_db']:.0f} dBFS)")
+            motion.trigger()  # un bruit suffit à lancer la détection vidéo
+
+        # écoute locale seulement avec une fenêtre (serveur sans écran = souvent sans sortie audio)
+        audio_manager = AudioRTMP(chosen_rtmp, source=av.audio, listen="window" in sink_names,
+                                  analyzer=AudioEventDetector(rate=av.sample_rate, on_event=on_audio_event))
+        audio_manager.start()
+
+    store = DetectionStore(args.events) if args.events else None
+
+    # --- 🔍 YOLO limité aux ROI de la caméra et/ou en tuiles (petites personnes lointaines) ---
+    region = RegionDetector(yolov8_predict_batch, rois=rois, tile=args.tile) if rois or args.tile else None
+
+    # --- 🎯 Suivi PTZ : commandes regroupées et envoyées par un thread, jamais depuis la boucle vidéo ---
+    ptz = PTZController(device_id, channel_id, max_rate=args.ptz_rate) if args.follow else None
 
-    # --- 🎙️ Lancer audio RTMP en parallèle ---
-    # Après avoir récupéré chosen_rtmp
-    audio_manager = AudioRTMP(chosen_rtmp)
-    audio_manager.start()
+    def on_result(seq, result):
+        if store:
+            store.add(camera_name, result)  # file en mémoire, écrite par lots dans un thread
+        names = [p["name"] for p in result["persons"]]
+        if recorder:
+            wanted = [n for n in names if n == "Unknown"] if args.record == "unknown" else names
+            if wanted:
+                recorder.trigger(args.record)
+        if archive and names:
+            archive.add_event(camera_name, "person", when=result["timestamp"], names=names)
+        if ptz:
+            ptz.follow([p["box"] for p in result["persons"]], result["shape"])
 
     try:
-        open_rtmp_stream_ffmpeg(chosen_rtmp)  # ta fonction vidéo
+        open_rtmp_stream_ffmpeg(chosen_rtmp, av_stream=av, audio=audio_manager, motion=motion,
+                                sinks=sinks, on_result=on_result, region=region)  # ta fonction vidéo
     finally:
-        audio_manager.stop()
+        if region:
+            print(f"[REGION] {region.format()}")
+        if ptz:
+            ptz.stop()
+            print(f"[PTZ] {ptz.format()}")
+        if recorder:
+            recorder.stop()
+        if archive:
+            archive.stop()
+        if store:
+            store.close()
+        av.stop()  # débloque la lecture audio en cours (même pendant une reconnexion)
+        if audio_manager:
+            audio_manager.stop()
@@ -1,74 +1,19 @@
 import time
-import uuid
-import hashlib
-import requests
-from config import AppId, AppSecret, BASE_URL
-
-# ------------------- Utilitaires -------------------
-def make_sign(ts, nonce, secret):
-    raw = f"time:{ts},nonce:{nonce},appSecret:{secret}"
-    return hashlib.md5(raw.encode("utf-8")).hexdigest()
-
-def post(endpoint, payload):
-    url = f"{BASE_URL}/{endpoint}"
-    r = requests.post(url, json=payload)
-    r.raise_for_status()
-    return r.json()
+import threading
+from collections import deque
+from imou_api import get_client, ImouApiError
 
 # ------------------- Authentification -------------------
 def get_access_token():
-    ts = int(time.time())
-    nonce = str(uuid.uuid4())
-    sign = make_sign(ts, nonce, AppSecret)
-    payload = {
-        "system": {"ver": "1.0", "appId": AppId, "sign": sign, "time": ts, "nonce": nonce},
-        "id": str(uuid.uuid4()),
-        "params": {}
-    }
-    data = post("accessToken", payload)
-    if data["result"]["code"] == "0":
-        return data["result"]["data"]["accessToken"]
-    raise Exception(f"Login failed: {data}")
+    return get_client().get_access_token()
 
 # ------------------- Liste des devices -------------------
 def get_live_list(token, query_range="1-10"):
-    ts = int(time.time())
-    nonce = str(uuid.uuid4())
-    sign = make_sign(ts, nonce, AppSecret)
-    payload = {
-        "system": {"ver": "1.0", "appId": AppId, "sign": sign, "time": ts, "nonce": nonce},
-        "id": str(uuid.uuid4()),
-        "params": {"token": token, "queryRange": query_range}
-    }
-    data = post("liveList", payload)
-    if data["result"]["code"] == "0":
-        return data["result"]["data"]["lives"]
-    raise Exception(f"liveList failed: {data}")
+    return get_client().get_live_list(query_range, token=token)
 
 # ------------------- Mouvement PTZ -------------------
-OPERATIONS = {
-    "up": 0,
-    "down": 1,
-    "left": 2,
-    "right": 3
-}
-
 def move_ptz(token, device_id, operation, duration_ms=200, channel_id="0"):
-    ts = int(time.time())
-    nonce = str(uuid.uuid4())
-    sign = make_sign(ts, nonce, AppSecret)
-    payload = {
-        "system": {"ver": "1.0", "appId": AppId, "sign": sign, "time": ts, "nonce": nonce},
-        "id": str(uuid.uuid4()),
-        "params": {
-            "token": token,
-            "deviceId": device_id,
-            "channelId": channel_id,
-            "operation": str(OPERATIONS[operation]),
-            "duration": str(duration_ms)
-        }
-    }
-    return post("controlMovePTZ", payload)
+    return get_client().move_ptz(device_id, operation, duration_ms, channel_id, token=token)
 
 # Fonctions pratiques
 def move_up(token, device_id, channel_id="0"): return move_ptz(token, device_id, "up", channel_id=channel_id)
@@ -76,8 +21,185 @@ def move_down(token, device_id, channel_id="0"): return move_ptz(token, device_i
 def move_left(token, device_id, channel_id="0"): return move_ptz(token, device_id, "left", channel_id=channel_id)
 def move_right(token, device_id, channel_id="0"): return move_ptz(token, device_id, "right", channel_id=channel_id)
 
+# ------------------- Suivi automatique -------------------
+class PTZController:
+    """
+    Suivi PTZ en boucle fermée : follow(boxes, shape) calcule l'écart entre la cible et le centre
+    de l'image et dépose au plus une commande par axe (pan / tilt) dans une file.
+    Une commande plus récente remplace celle en attente sur le même axe (coalescence) ;
+    un thread envoie les commandes en respectant max_rate appels par seconde et attend la fin
+    du mouvement (+ settle) avant la suivante ; les commandes déposées pendant le mouvement, calculées
+    sur une image qui bougeait encore, sont abandonnées. follow() ne fait jamais d'appel HTTP.
+    La durée du mouvement est proportionnelle à l'écart (min_duration -> max_duration ms).
+    """
+    def __init__(self, device_id, channel_id="0", client=None, max_rate=2.0, deadzone=0.15,
+                 min_duration=100, max_duration=600, settle=0.3, head_ratio=0.25):
+        """
+        max_rate: appels controlMovePTZ maximum par seconde
+        deadzone: écart relatif (0 = centre, 1 = bord) en dessous duquel on ne bouge pas
+        settle: secondes d'attente après un mouvement (image stabilisée, nouvelle détection)
+        head_ratio: point visé dans la boîte, depuis le haut (0.25 = vers la tête)
+        """
+        self.device_id = device_id
+        self.channel_id = channel_id
+        self.client = client or get_client()
+        self.min_interval = 1.0 / max_rate
+        self.deadzone = deadzone
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.settle = settle
+        self.head_ratio = head_ratio
+
+        self.pending = {}            # axe -> (opération, durée ms, instant de dépôt, dernier dépôt)
+        self.cond = threading.Condition()
+        self.running = True
+        self.busy_until = 0.0
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=100)   # durée des appels HTTP
+        self.queue_delays = deque(maxlen=100)  # dépôt -> envoi
+        self.call_times = deque(maxlen=1000)
+
+        # démarré en dernier : _run et format() lisent les compteurs ci-dessus
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    # ---------- Calcul de l'écart ----------
+    def error(self, box, shape):
+        """Écart (ex, ey) dans [-1, 1] entre le point visé de la boîte et le centre de l'image."""
+        h, w = shape[:2]
+        x1, y1, x2, y2 = box[:4]
+        cx = (x1 + x2) / 2
+        cy = y1 + (y2 - y1) * self.head_ratio
+        return (cx - w / 2) / (w / 2), (cy - h / 2) / (h / 2)
+
+    def duration(self, err):
+        """Durée (ms) proportionnelle à l'écart au-delà de la zone morte."""
+        k = (abs(err) - self.deadzone) / (1 - self.deadzone)
+        return int(self.min_duration + min(1.0, k) * (self.max_duration - self.min_duration))
+
+    def follow(self, boxes, shape):
+        """Vise la plus grande boîte (personne la plus proche). Retourne l'écart (ex, ey) ou None."""
+        if not boxes:
+            return None
+        target = max(boxes, key=lambda b: (b[2] - b[0]) * (b[3] - b[1]))
+        ex, ey = self.error(target, shape)
+        if abs(ex) > self.deadzone:
+            self.submit("pan", "right" if ex > 0 else "left", self.duration(ex))
+        if abs(ey) > self.deadzone:
+            self.submit("tilt", "down" if ey > 0 else "up", self.duration(ey))
+        return ex, ey
+
+    # ---------- File de commandes ----------
+    def submit(self, axis, operation, duration_ms):
+        """Dépose une commande ; remplace celle qui attend encore sur le même axe."""
+        with self.cond:
+            self.submitted += 1
+            now = queued_at = time.monotonic()
+            if axis in self.pending:
+                self.coalesced += 1
+                queued_at = self.pending[axis][2]  # garde son rang : un axe ne peut pas affamer l'autre
+            self.pending[axis] = (operation, duration_ms, queued_at, now)
+            self.cond.notify()
+
+    def _run(self):
+        last_call = 0.0
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or not self.running)
+                if not self.running:
+                    return
+                # débit maximal et fin du mouvement précédent (les commandes continuent de se regrouper)
+                wait = max(last_call + self.min_interval, self.busy_until) - time.monotonic()
+                if wait > 0:
+                    self.cond.wait(wait)
+                    continue
+                # écart mesuré pendant le mouvement précédent : périmé, on attend une image stabilisée
+                for stale in [a for a, p in self.pending.items() if p[3] < self.busy_until]:
+                    del self.pending[stale]
+                    self.dropped += 1
+                if not self.pending:
+                    continue
+                # la commande la plus ancienne d'abord : pan et tilt alternent
+                axis = min(self.pending, key=lambda a: self.pending[a][2])
+                operation, duration_ms, queued_at, _ = self.pending.pop(axis)
+
+            t0 = time.monotonic()
+            try:
+                self.client.move_ptz(self.device_id, operation, duration_ms, self.channel_id)
+                self.sent += 1
+            except (ImouApiError, OSError) as e:
+                self.failures += 1
+                print(f"[PTZ] ❌ {operation} {duration_ms}ms : {e}")
+            last_call = time.monotonic()
+            self.latencies.append(last_call - t0)
+            self.queue_delays.append(t0 - queued_at)
+            self.call_times.append(last_call)
+            self.busy_until = t0 + duration_ms / 1000 + self.settle
+
+    # ---------- Statistiques ----------
+    def call_rate(self, window=60.0):
+        """Appels API par seconde sur les window dernières secondes."""
+        now = time.monotonic()
+        recent = [t for t in self.call_times if now - t <= window]
+        if not recent:
+            return 0.0
+        return len(recent) / min(window, max(now - recent[0], self.min_interval))
+
+    def format(self):
+        lat = sorted(self.latencies)
+        p50 = lat[len(lat) // 2] * 1000 if lat else 0.0
+        delay = sorted(self.queue_delays)
+        d50 = delay[len(delay) // 2] * 1000 if delay else 0.0
+        return (f"commandes={self.submitted} regroupées={self.coalesced} périmées={self.dropped} "
+                f"envoyées={self.sent} "
+                f"échecs={self.failures} latence p50={p50:.0f}ms attente p50={d50:.0f}ms "
+                f"débit={self.call_rate():.2f} appels/s")
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.worker.join(timeout=5)
+
+
+def simulate_follow(seconds=10.0, fps=15, max_rate=2.0):
+    """
+    Suivi hors ligne contre StubImouServer : la caméra simulée tourne selon les commandes reçues,
+    une personne immobile doit revenir au centre de l'image.
+    """
+    from imou_stub import StubImouServer
+    from imou_api import ImouClient
+
+    with StubImouServer(latency=0.05) as stub:
+        client = ImouClient(base_url=stub.base_url, token_cache=None)
+        ptz = PTZController("STUB0001", client=client, max_rate=max_rate)
+        shape = (480, 640, 3)
+        target = (520.0, 330.0)  # position de la personne, en pixels, quand pan = tilt = 0
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            x = target[0] - stub.ptz["pan"] * stub.ptz_pixels_per_ms
+            y = target[1] - stub.ptz["tilt"] * stub.ptz_pixels_per_ms
+            ptz.follow([(x - 40, y - 30, x + 40, y + 170)], shape)  # y: tête (head_ratio=0.25)
+            time.sleep(1 / fps)
+        ptz.stop()
+        ex, ey = ptz.error((x - 40, y - 30, x + 40, y + 170), shape)
+        print(f"[PTZ] écart final ex={ex:+.2f} ey={ey:+.2f} (zone morte {ptz.deadzone})")
+        print(f"[PTZ] {ptz.format()}")
+        return ex, ey
+
+
 # ------------------- MAIN -------------------
 if __name__ == "__main__":
+    import sys
+    if "--simulate" in sys.argv:  # suivi automatique hors ligne, sans compte ni caméra
+        simulate_follow()
+        sys.exit(0)
+
     token = get_access_token()
     print("✅ AccessToken:", token)
 
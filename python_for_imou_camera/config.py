@@ -6,4 +6,9 @@ AppId =        "AppId"                     # get from imou dev app
 DeviceId = "DeviceId"                            # get from imou life app
 
 detection_device = "cpu" # cpu for old graphic card or gpu 
+detection_backend = "torch" # "torch", "onnx" (ONNX Runtime, faster on CPU) or "onnx-int8" (quantized, needs onnxruntime)
+face_backend = "lbph"    # "lbph" (OpenCV LBPH) or "sface" (embeddings, needs src/face_recognition_sface_2021dec.onnx)
 
+# useful areas per camera "<deviceId>_<channelId>": list of polygons [(x, y), ...] in frame pixels
+# only these areas are analysed (motion and YOLO), e.g. {"ABC123_0": [[(0, 300), (1920, 300), (1920, 1080), (0, 1080)]]}
+rois = {}
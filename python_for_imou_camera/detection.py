@@ -1,17 +1,32 @@
 
 
 # detection.py
+import time
 import cv2
-from ultralytics import YOLO
-from recognition import FaceRecognitionOpenCV
-from config import detection_device
-
-# Charger YOLOv8 nano (CPU)
-model = YOLO("src/yolov8n.pt")
-model.to(detection_device)
-
-# Initialisation de la reconnaissance
-face_recog = FaceRecognitionOpenCV(known_dir="known_faces")
+import numpy as np
+from models import registry
+from recognition import FaceRecognitionOpenCV, FaceRecognitionSFace
+from face_detection import FaceDetector
+from sinks import annotate_detections
+from onnx_backend import load_yolo
+from config import detection_device, detection_backend, face_backend
+
+# ------------------- Modèles (chargés à la première utilisation, voir models.py) -------------------
+# YOLOv8 nano (CPU) : PyTorch, ou ONNX Runtime FP32 / INT8 (voir config.detection_backend)
+registry.register("yolo", lambda: load_yolo("src/yolov8n.pt", detection_backend, detection_device),
+                  warmup=lambda m: m.predict(np.zeros((480, 640, 3), np.uint8), verbose=False))
+registry.register("face_recognizer",
+                  lambda: (FaceRecognitionSFace if face_backend == "sface" else FaceRecognitionOpenCV)(
+                      known_dir="known_faces"),
+                  warmup=lambda m: m.recognize_batch([np.zeros((100, 100, 3), np.uint8)]))
+registry.register("face_detector", FaceDetector,
+                  warmup=lambda m: m.detect(np.zeros((320, 160, 3), np.uint8)))
+
+def warm_up(background=False):
+    """Charge YOLO et la reconnaissance avec une inférence factice (background: dans un thread)."""
+    if background:
+        return registry.warm_up_async("yolo", "face_recognizer", "face_detector")
+    return registry.warm_up("yolo", "face_recognizer", "face_detector")
 
 # ------------------- Extraction des personnes -------------------
 def yolov8_extract_persons(frame, results, conf_threshold=0.4):
@@ -32,69 +47,160 @@ def yolov8_extract_persons(frame, results, conf_threshold=0.4):
                     boxes.append((x1, y1, x2, y2))
     return persons, boxes
 
-# ------------------- Affichage des personnes + reconnaissance -------------------
-def yolov8_display_persons(frame, results, conf_threshold=0.4):
+# ------------------- Reconnaissance des personnes -------------------
+def yolov8_recognize_persons(frame, results, conf_threshold=0.4, tracker=None):
+    """
+    Localise les visages dans chaque personne puis les reconnaît, sans rien dessiner.
+    Retourne une liste de dicts {"box", "name", "confidence", "face_box", "track_id"} (None si absent ;
+    confidence = distance de reconnaissance, plus petit = plus sûr) ;
+    sans visage utilisable (absent, trop petit ou flou) le nom vaut "Unknown" et la reconnaissance n'est pas appelée.
+    tracker: PersonTracker optionnel ; une personne déjà identifiée sur sa piste garde son nom
+    sans nouvelle localisation ni reconnaissance du visage.
+    """
     persons, boxes = yolov8_extract_persons(frame, results, conf_threshold)
-    annotated_persons = []
+    track_ids = tracker.update(boxes) if tracker is not None else [None] * len(boxes)
+    names = ["Unknown"] * len(persons)
+    confidences = [None] * len(persons)
+    face_boxes = [None] * len(persons)
+    face_points = [None] * len(persons)
+
+    # 1) visages à reconnaître (pistes sans identité sûre en cache)
+    to_recognize = []
+    for idx, (person_img, box, track_id) in enumerate(zip(persons, boxes, track_ids)):
+        if tracker is not None and not tracker.should_recognize(track_id):
+            names[idx] = tracker.identity(track_id)
+            continue
+        faces = registry.get("face_detector").detect(person_img, offset=box[:2])
+        if faces:
+            # plus grand visage du crop : celui de la personne (les autres sont partiellement cachés)
+            face = max(faces, key=lambda f: (f[2] - f[0]) * (f[3] - f[1]))
+            face_boxes[idx], face_points[idx] = face[:4], face[5]
+            to_recognize.append(idx)
+        elif tracker is not None:
+            tracker.set_identity(track_id, "Unknown", float("inf"))
+
+    # 2) un seul lot pour tous les visages de la frame
+    if to_recognize:
+        recognizer = registry.get("face_recognizer")
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in (face_boxes[i] for i in to_recognize)]
+        # repères YuNet dans le repère du crop (alignement SFace), None avec Haar
+        points = [None if face_points[i] is None else face_points[i] - np.float32(face_boxes[i][:2])
+                  for i in to_recognize]
+        for idx, (name, conf) in zip(to_recognize, recognizer.recognize_batch(crops, points)):
+            names[idx], confidences[idx] = name, float(conf)
+            if tracker is not None:
+                # seuil dans les unités du recognizer actif (distance LBPH ou cosinus SFace)
+                tracker.set_identity(track_ids[idx], name, conf, low_conf=recognizer.low_conf)
+
+    return [{"box": box, "name": name, "confidence": conf, "face_box": face_box, "track_id": track_id}
+            for box, name, conf, face_box, track_id in zip(boxes, names, confidences, face_boxes, track_ids)]
 
-    for idx, (person_img, box) in enumerate(zip(persons, boxes)):
-        # Reconnaissance directe sur la mini image
-        name, conf = face_recog.recognize_face(person_img)
-        annotated_person_img = face_recog.annotate_face(person_img, name)
+# ------------------- Affichage des personnes + reconnaissance -------------------
+def yolov8_display_persons(frame, results, conf_threshold=0.4, show=True, tracker=None):
+    """
+    yolov8_recognize_persons + un crop annoté par personne (une fenêtre par personne si show).
+    Retourne une liste (crop annoté, boîte personne, nom, boîte visage ou None).
+    """
+    annotated_persons = []
+    for idx, person in enumerate(yolov8_recognize_persons(frame, results, conf_threshold, tracker)):
+        x1, y1, x2, y2 = person["box"]
+        # copie : le crop est une vue sur la frame, partagée avec les autres étages du pipeline
+        annotated_person_img = frame[y1:y2, x1:x2].copy()
+        if person["face_box"]:
+            fx1, fy1, fx2, fy2 = person["face_box"]
+            cv2.rectangle(annotated_person_img, (fx1 - x1, fy1 - y1), (fx2 - x1, fy2 - y1), (255, 0, 0), 2)
+        annotated_person_img = registry.get("face_recognizer").annotate_face(annotated_person_img, person["name"])
 
         # Affiche chaque visage reconnu
-        cv2.imshow(f"Person {idx}", annotated_person_img)
+        if show:
+            cv2.imshow(f"Person {idx}", annotated_person_img)
 
-        annotated_persons.append((annotated_person_img, box, name))
+        annotated_persons.append((annotated_person_img, person["box"], person["name"], person["face_box"]))
     return annotated_persons
 
-# ------------------- Détection et annotation principale -------------------
-def yolov8_detection(frame):
-    results_list = model.predict(frame, conf=0.4)
-    results = results_list[0]
-    annotated_frame = results.plot()
-
-    # Obtenir les mini images annotées et les résultats faciaux
-    annotated_persons = yolov8_display_persons(frame, results, conf_threshold=0.4)
-
-    # Annoter le flux principal avec noms
-    for _, box, name in annotated_persons:
-        x1, y1, x2, y2 = box
-        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0,255,0), 2)
-        cv2.putText(annotated_frame, name, (x1, y2+20),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0,255,0), 2)
-
-    cv2.imshow("YOLOv8 Detection", annotated_frame)
+# ------------------- Détection structurée -------------------
+def yolov8_objects(results, conf_threshold=0.4):
+    """Tous les objets détectés : liste de dicts {"box", "class_id", "class_name", "score"}."""
+    objects = []
+    xyxy = results.boxes.xyxy.cpu().numpy().astype(int)
+    class_ids = results.boxes.cls.cpu().numpy().astype(int)
+    scores = results.boxes.conf.cpu().numpy()
+    for box, cls_id, score in zip(xyxy, class_ids, scores):
+        if score >= conf_threshold:
+            objects.append({"box": tuple(box.tolist()), "class_id": int(cls_id),
+                            "class_name": results.names[int(cls_id)], "score": float(score)})
+    return objects
+
+def yolov8_detect(frame, tracker=None, conf=0.4, results=None):
+    """
+    Détection + reconnaissance sans aucun dessin ni fenêtre.
+    results: sortie de model.predict déjà calculée pour cette frame (ex: par lot), sinon predict ici.
+    Retourne {"timestamp", "shape", "objects" (voir yolov8_objects), "persons" (voir yolov8_recognize_persons)} ;
+    l'annotation se fait à la demande avec sinks.annotate_detections.
+    """
+    timestamp = time.time()
+    if results is None:
+        results = registry.get("yolo").predict(frame, conf=conf, verbose=False)[0]
+    return {
+        "timestamp": timestamp,
+        "shape": frame.shape,
+        "objects": yolov8_objects(results, conf),
+        "persons": yolov8_recognize_persons(frame, results, conf, tracker),
+    }
 
+# ------------------- Détection et annotation principale -------------------
+def yolov8_detection(frame, show=True, tracker=None):
+    """
+    Détection + reconnaissance sur une frame, retourne la frame annotée.
+    show=False : n'ouvre aucune fenêtre (appel depuis un thread worker).
+    tracker: PersonTracker optionnel (identités mises en cache par piste)
+    """
+    annotated_frame = annotate_detections(frame, yolov8_detect(frame, tracker=tracker))
+    if show:
+        cv2.imshow("YOLOv8 Detection", annotated_frame)
+    return annotated_frame
 
+# ------------------- Détection par lot -------------------
+def yolov8_predict_batch(frames, conf=0.4):
+    """Un seul predict pour plusieurs frames (une ou plusieurs caméras), résultats dans le même ordre"""
+    return registry.get("yolo").predict(list(frames), conf=conf, verbose=False)
 
 
-import cv2
-from ultralytics import YOLO
-import torch
 
 
 class Yolov8Detector:
-    def __init__(self, model_path="src/yolov8n.pt", conf=0.4, device=None):
+    def __init__(self, model_path="src/yolov8n.pt", conf=0.4, device=None, backend="torch", threads=None,
+                 inter_threads=None, calibration_dir=None, provider="cpu"):
         """
         :param model_path: chemin vers le modèle YOLOv8 (n = nano, s = small, m = medium, etc.)
         :param conf: seuil de confiance
         :param device: "cpu" ou "cuda", si None → auto-détection
+        :param backend: "torch", "onnx" (ONNX Runtime FP32) ou "onnx-int8" (quantifié), ONNX toujours sur CPU
+        :param threads / inter_threads: threads intra / inter-opérateurs d'ONNX Runtime
+        :param calibration_dir: images de la caméra pour la quantification INT8 statique
+        :param provider: "cpu" ou "openvino" pour les backends ONNX
         """
-        self.model = YOLO(model_path)
         self.conf = conf
+        self.backend = backend
 
         # Choix du device
-        if device is None:
+        if backend != "torch":
+            self.device = "cpu"
+        elif device is None:
+            import torch  # seulement pour l'auto-détection : importer detection ne charge pas PyTorch
             self.device = "cuda" if torch.cuda.is_available() else "cpu"
         else:
             self.device = device
 
-        self.model.to(self.device)
-        print(f"✅ YOLO chargé sur {self.device} avec {model_path}")
+        # partagé avec les autres détecteurs de même configuration du processus (chargé une seule fois)
+        key = f"yolo:{model_path}:{backend}:{self.device}:{threads}:{inter_threads}:{provider}:{calibration_dir}"
+        self.model = registry.get(key, lambda: load_yolo(model_path, backend, self.device, threads=threads,
+                                                         inter_threads=inter_threads,
+                                                         calibration_dir=calibration_dir, provider=provider))
+        print(f"✅ YOLO chargé sur {self.device} avec {model_path} ({backend})")
 
     def detect(self, frame, show=True):
-        """Détecte les objets sur une frame"""
+        """Détecte les objets sur une frame (show=False : aucune fenêtre, ex: serveur sans écran)"""
         results_list = self.model.predict(frame, conf=self.conf, device=self.device)
         results = results_list[0]
 
@@ -104,6 +210,10 @@ class Yolov8Detector:
 
         return results
 
+    def detect_batch(self, frames):
+        """Détecte sur un lot de frames en un seul predict, résultats dans le même ordre"""
+        return self.model.predict(list(frames), conf=self.conf, device=self.device, verbose=False)
+
     def extract_persons(self, frame, results):
         """Retourne les crops de personnes détectées"""
         persons = []
@@ -1,155 +1,218 @@
+import sys
 import time
-import uuid
-import hashlib
+import asyncio
+import urllib.parse
 import requests
-import subprocess
-from config import AppId, AppSecret, BASE_URL  # Assure-toi que ces constantes existent
+from imou_api import get_client, ImouApiError
+
+try:
+    import aiohttp
+except ImportError:  # optionnel : sans aiohttp, les sondes HLS passent par requests dans des threads
+    aiohttp = None
 
 # ---------- Réglages ----------
 QUERY_RANGE = "1-50"  # Nombre d'items à parcourir côté API
 CHECK_URLS = True     # Vérifie que les URLs répondent
 
-# ---------- Utilitaires ----------
-def make_sign(time_stamp, nonce, secret):
-    raw = f"time:{time_stamp},nonce:{nonce},appSecret:{secret}"
-    return hashlib.md5(raw.encode("utf-8")).hexdigest()
-
-def post(endpoint, payload):
-    url = f"{BASE_URL}/{endpoint}"
-    r = requests.post(url, json=payload, timeout=15)
-    r.raise_for_status()
-    return r.json()
-
+# ---------- API Imou (client partagé, voir imou_api.py) ----------
 def get_access_token():
-    ts = int(time.time())
-    nonce = str(uuid.uuid4())
-    sign = make_sign(ts, nonce, AppSecret)
-    payload = {
-        "system": {"ver": "1.0", "appId": AppId, "sign": sign, "time": ts, "nonce": nonce},
-        "id": str(uuid.uuid4()),
-        "params": {}
-    }
-    data = post("accessToken", payload)
-    if data.get("result", {}).get("code") == "0":
-        return data["result"]["data"]["accessToken"]
-    raise RuntimeError(f"Login failed: {data}")
-
-# ---------- Vérifications d’URL ----------
-def check_hls(url):
-    if not CHECK_URLS:
-        return True
-    try:
-        r = requests.get(url, stream=True, timeout=5)
-        return 200 <= r.status_code < 400
-    except requests.RequestException:
-        return False
-
-def check_rtmp(url):
-    if not CHECK_URLS:
-        return True
+    return get_client().get_access_token()
+
+# ---------- Gestion RTMP ----------
+def query_rtmp(token, device_id, channel_id="0"):
     try:
-        import urllib.parse
+        return get_client().query_rtmp(device_id, channel_id, token=token)
+    except ImouApiError:
+        return None
+
+# ---------- Découverte asynchrone ----------
+class StreamProber:
+    """
+    Sonde en parallèle tous les flux HLS / RTMP (au plus concurrency à la fois),
+    avec un cache par URL de durée ttl secondes (vidé à chaque passage de watch) : une URL
+    partagée par plusieurs devices n'est sondée qu'une fois, même par des sondes simultanées.
+    Chaque sonde retourne {"kind", "url", "ok", "status", "latency_ms", "error", "checked_at"}.
+    """
+    def __init__(self, concurrency=20, ttl=60, hls_timeout=5, rtmp_timeout=3):
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.hls_timeout = hls_timeout
+        self.rtmp_timeout = rtmp_timeout
+        self.cache = {}           # url -> asyncio.Task de la sonde (en cours ou terminée)
+        self._semaphore = None
+        self._http = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        if aiohttp is not None:
+            self._http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.hls_timeout))
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+
+    async def probe(self, kind, url):
+        task = self.cache.get(url)
+        if task is None or task.cancelled() or (task.done() and task.result()["checked_at"] + self.ttl <= time.time()):
+            # tâche en cache dès le lancement : les sondes simultanées de la même URL l'attendent
+            task = self.cache[url] = asyncio.ensure_future(self._probe(kind, url))
+        return await asyncio.shield(task)
+
+    async def _probe(self, kind, url):
+        if not CHECK_URLS:
+            return {"kind": kind, "url": url, "ok": True, "status": None,
+                    "latency_ms": None, "error": None, "checked_at": time.time()}
+        async with self._semaphore:
+            t0 = time.perf_counter()
+            status, error = None, None
+            try:
+                if kind == "hls":
+                    status = await self._probe_hls(url)
+                    ok = 200 <= status < 400
+                else:
+                    await self._probe_rtmp(url)
+                    ok = True
+            except Exception as e:
+                ok, error = False, f"{type(e).__name__}: {e}"
+            return {"kind": kind, "url": url, "ok": ok, "status": status,
+                    "latency_ms": (time.perf_counter() - t0) * 1000, "error": error,
+                    "checked_at": time.time()}
+
+    async def _probe_hls(self, url):
+        if self._http is not None:
+            async with self._http.get(url) as r:
+                return r.status
+        # sans aiohttp : requests dans le pool de threads d'asyncio
+        r = await asyncio.to_thread(requests.get, url, stream=True, timeout=self.hls_timeout)
+        r.close()
+        return r.status_code
+
+    async def _probe_rtmp(self, url):
         parsed = urllib.parse.urlparse(url)
-        hostname = parsed.hostname
         port = parsed.port or 1935  # Port RTMP par défaut
-        import socket
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(3)
-        s.connect((hostname, port))
-        s.close()
-        return True
-    except Exception:
-        return False
+        _, writer = await asyncio.wait_for(asyncio.open_connection(parsed.hostname, port), self.rtmp_timeout)
+        writer.close()
+        await writer.wait_closed()
+
+    async def probe_device(self, device, token=None):
+        """Sonde tous les flux d'un device et choisit le flux HLS / RTMP à utiliser."""
+        device_id = device.get("deviceId", "N/A")
+        channel_id = str(device.get("channelId", "0"))
+        probes = []
+        for stream in device.get("streams") or []:
+            if stream.get("hls"):
+                probes.append(self.probe("hls", stream["hls"]))
+            if stream.get("rtmp"):
+                probes.append(self.probe("rtmp", stream["rtmp"]))
+        streams = list(await asyncio.gather(*probes))
+
+        hls = next((s["url"] for s in streams if s["kind"] == "hls" and s["ok"]), None)
+        rtmp = next((s["url"] for s in streams if s["kind"] == "rtmp" and s["ok"]), None)
+        created = None
+        if rtmp is None:
+            # aucun RTMP joignable : on demande celui de l'API
+            url = await asyncio.to_thread(query_rtmp, token, device_id, channel_id)
+            if url:
+                created = await self.probe("rtmp", url)
+                if created["ok"]:
+                    rtmp = url
+        return {"deviceId": device_id, "channelId": channel_id, "streams": streams,
+                "created": created, "hls": hls, "rtmp": rtmp, "reachable": bool(hls or rtmp)}
+
+    async def discover(self, token=None, query_range=QUERY_RANGE):
+        devices = await asyncio.to_thread(get_client().get_live_list, query_range, token)
+        return list(await asyncio.gather(*(self.probe_device(d, token) for d in devices)))
+
+    async def watch(self, interval=30, on_update=None, token=None, query_range=QUERY_RANGE, rounds=None):
+        """
+        Mode surveillance : redécouvre et resonde toutes les interval secondes.
+        on_update(results, changed) est appelé à chaque passage, changed = devices dont l'état a changé.
+        Une erreur (API, réseau) est affichée et le passage suivant a lieu normalement.
+        """
+        previous = {}
+        n = 0
+        while rounds is None or n < rounds:
+            started = time.monotonic()
+            # chaque passage resonde vraiment : le cache ne sert qu'à dédoublonner les URLs du passage
+            self.cache.clear()
+            try:
+                results = await self.discover(token, query_range)
+                changed = [r for r in results if previous.get(r["deviceId"]) != r["reachable"]]
+                previous = {r["deviceId"]: r["reachable"] for r in results}
+                if on_update:
+                    on_update(results, changed)
+            except Exception as e:
+                print(f"[WATCH] ❌ passage {n + 1} : {type(e).__name__}: {e}")
+            n += 1
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def discover_devices(token=None, query_range=QUERY_RANGE, **prober_options):
+    """Version synchrone de StreamProber.discover."""
+    async def run():
+        async with StreamProber(**prober_options) as prober:
+            return await prober.discover(token, query_range)
+    return asyncio.run(run())
+
+
+def watch_devices(interval=30, on_update=None, token=None, query_range=QUERY_RANGE, **prober_options):
+    async def run():
+        async with StreamProber(**prober_options) as prober:
+            await prober.watch(interval, on_update, token, query_range)
+    asyncio.run(run())
 
-# ---------- Gestion RTMP ----------
-def query_rtmp(token, device_id, channel_id="0"):
-    ts = int(time.time())
-    nonce = str(uuid.uuid4())
-    sign = make_sign(ts, nonce, AppSecret)
-    payload = {
-        "system": {"ver": "1.0", "appId": AppId, "sign": sign, "time": ts, "nonce": nonce},
-        "id": str(uuid.uuid4()),
-        "params": {"deviceId": device_id, "channelId": channel_id, "token": token}
-    }
-    data = post("queryDeviceRtmpLive", payload)
-    if data.get("result", {}).get("code") == "0":
-        return data["result"]["data"]["rtmp"]
-    return None
 
 # ---------- Listing principal ----------
+def print_device(idx, result):
+    print("=" * 80)
+    print(f"Device {idx}: {result['deviceId']} (Channel: {result['channelId']})")
+    if result["streams"]:
+        print("Flux disponibles :")
+    for s in result["streams"]:
+        status = "✅" if s["ok"] else "❌"
+        print(f"  - {s['kind'].upper()}: {status} {s['url']} ({s['latency_ms'] or 0:.0f} ms)")
+    created = result["created"]
+    if created:
+        status = "✅" if created["ok"] else "❌"
+        print(f"  - RTMP (créé): {status} {created['url']}")
+    elif not result["rtmp"]:
+        print("  - Impossible de créer un flux RTMP.")
+
+    # Résumé des flux utilisables
+    if result["hls"]:
+        print(f"\n  🔹 Utilise ce flux HLS: {result['hls']}")
+    if result["rtmp"]:
+        print(f"  🔹 Utilise ce flux RTMP: {result['rtmp']}")
+    print()
+
+
 def list_devices_and_streams(token, query_range=QUERY_RANGE):
-    ts = int(time.time())
-    nonce = str(uuid.uuid4())
-    sign = make_sign(ts, nonce, AppSecret)
-    payload = {
-        "system": {"ver": "1.0", "appId": AppId, "sign": sign, "time": ts, "nonce": nonce},
-        "id": str(uuid.uuid4()),
-        "params": {"token": token, "queryRange": query_range}
-    }
-    data = post("liveList", payload)
-    if data.get("result", {}).get("code") != "0":
-        raise RuntimeError(f"liveList failed: {data}")
-
-    devices = data["result"]["data"].get("lives", [])
-    if not devices:
+    t0 = time.perf_counter()
+    results = discover_devices(token, query_range)
+    if not results:
         print("⚠️ Aucun device trouvé.")
-        return
+        return results
 
-    print(f"📋 {len(devices)} device(s) trouvé(s)\n")
-    for idx, device in enumerate(devices):
-        print("=" * 80)
-        device_id = device.get("deviceId", "N/A")
-        channel_id = str(device.get("channelId", "0"))
-        print(f"Device {idx}: {device_id} (Channel: {channel_id})")
-
-        # Lister les flux disponibles
-        working_hls = []
-        working_rtmp = None
-        if "streams" in device and device["streams"]:
-            print("Flux disponibles :")
-            for stream in device["streams"]:
-                hls_url = stream.get("hls")
-                rtmp_url = stream.get("rtmp")
-
-                if hls_url:
-                    ok = check_hls(hls_url)
-                    status = "✅" if ok else "❌"
-                    print(f"  - HLS: {status} {hls_url}")
-                    if ok:
-                        working_hls.append(hls_url)
-
-                if rtmp_url:
-                    ok = check_rtmp(rtmp_url)
-                    status = "✅" if ok else "❌"
-                    print(f"  - RTMP: {status} {rtmp_url}")
-                    if ok:
-                        working_rtmp = rtmp_url
-
-        # Si aucun flux RTMP n'est disponible, essayer d'en créer un
-        if not working_rtmp:
-            print("  ➡️ Tentative de création d'un flux RTMP...")
-            rtmp_url = query_rtmp(token, device_id, channel_id)
-            if rtmp_url:
-                ok = check_rtmp(rtmp_url)
-                status = "✅" if ok else "❌"
-                print(f"  - RTMP (créé): {status} {rtmp_url}")
-                if ok:
-                    working_rtmp = rtmp_url
-            else:
-                print("  - Impossible de créer un flux RTMP.")
-
-        # Résumé des flux utilisables
-        if working_hls:
-            print(f"\n  🔹 Utilise ce flux HLS: {working_hls[0]}")
-        if working_rtmp:
-            print(f"  🔹 Utilise ce flux RTMP: {working_rtmp}")
-        print()
+    print(f"📋 {len(results)} device(s) trouvé(s) en {time.perf_counter() - t0:.1f}s\n")
+    for idx, result in enumerate(results):
+        print_device(idx, result)
+    return results
 
 # ---------- MAIN ----------
 if __name__ == "__main__":
     try:
         token = get_access_token()
         print("✅ AccessToken obtenu.")
+        if "--watch" in sys.argv:
+            def on_update(results, changed):
+                up = sum(r["reachable"] for r in results)
+                print(f"[WATCH] {time.strftime('%H:%M:%S')} {up}/{len(results)} caméra(s) joignable(s)")
+                for r in changed:
+                    print(f"  {'✅' if r['reachable'] else '❌'} {r['deviceId']} rtmp={r['rtmp']} hls={r['hls']}")
+            # token=None : le client renouvelle le jeton lui-même pendant une longue surveillance
+            watch_devices(on_update=on_update, token=None)
         list_devices_and_streams(token)
 
         print("""Quel flux choisir ?
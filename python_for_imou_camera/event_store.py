@@ -0,0 +1,199 @@
+# event_store.py
+# Historique des détections dans SQLite : écritures groupées dans un thread, requêtes indexées.
+import time
+import queue
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    camera TEXT NOT NULL,
+    time REAL NOT NULL,
+    class TEXT NOT NULL,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER,
+    score REAL,
+    track_id INTEGER,
+    name TEXT,
+    confidence REAL
+);
+CREATE INDEX IF NOT EXISTS detections_time ON detections (time);
+CREATE INDEX IF NOT EXISTS detections_camera_time ON detections (camera, time);
+CREATE INDEX IF NOT EXISTS detections_name_time ON detections (name, time);
+"""
+
+COLUMNS = ("camera", "time", "class", "x1", "y1", "x2", "y2", "score", "track_id", "name", "confidence")
+
+
+def today(now=None):
+    """(début, fin) de la journée en cours, heure locale."""
+    now = now or datetime.now()
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start.timestamp(), (start + timedelta(days=1)).timestamp()
+
+
+def last_night(start_hour=20, end_hour=7, now=None):
+    """(début, fin) de la dernière nuit : hier start_hour -> aujourd'hui end_hour, heure locale."""
+    now = now or datetime.now()
+    end = now.replace(hour=end_hour, minute=0, second=0, microsecond=0)
+    if end > now:
+        end -= timedelta(days=1)
+    start = (end - timedelta(days=1)).replace(hour=start_hour)
+    return start.timestamp(), end.timestamp()
+
+
+class DetectionStore:
+    """
+    Chaque détection devient une ligne (caméra, instant, classe, boîte, score, piste, nom, confiance).
+    add() ne touche jamais au disque : les lignes passent par une file bornée (les plus récentes sont
+    abandonnées et comptées si elle déborde) et un thread les écrit par lots de batch_size
+    ou toutes les flush_interval secondes, une transaction par lot.
+    Index sur le temps, (caméra, temps) et (nom, temps) : les requêtes par période, caméra
+    ou personne ne parcourent que les lignes concernées, même avec des dizaines de millions de lignes.
+    """
+    def __init__(self, path="detections.sqlite", batch_size=500, flush_interval=1.0, max_queue=100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(max_queue)
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.write_time = 0.0
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")  # WAL : durable à la perte de courant près du dernier lot
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()  # une connexion partagée entre le writer et les requêtes
+
+        self.stop_event = threading.Event()
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    # ---------- Écriture ----------
+    def add_records(self, camera, when, records):
+        """
+        records: dicts {"class", "box", "score", "track_id", "name", "confidence"} (clés optionnelles
+        sauf "class" et "box"). Ne bloque jamais.
+        """
+        for r in records:
+            x1, y1, x2, y2 = r["box"]
+            row = (camera, when, r["class"], x1, y1, x2, y2, r.get("score"), r.get("track_id"),
+                   r.get("name"), r.get("confidence"))
+            try:
+                self.queue.put_nowait(row)
+            except queue.Full:
+                self.dropped += 1
+
+    def add(self, camera, result):
+        """Enregistre un résultat de detection.yolov8_detect : les personnes avec leur identité, les autres objets."""
+        records = [{"class": o["class_name"], "box": o["box"], "score": o["score"]}
+                   for o in result["objects"] if o["class_name"] != "person"]
+        scores = {o["box"]: o["score"] for o in result["objects"] if o["class_name"] == "person"}
+        records += [dict(p, **{"class": "person", "score": scores.get(p["box"])}) for p in result["persons"]]
+        self.add_records(camera, result["timestamp"], records)
+
+    def _write_loop(self):
+        while not (self.stop_event.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and time.monotonic() < deadline:
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            t0 = time.perf_counter()
+            try:
+                with self.lock, self.db:
+                    self.db.executemany(f"INSERT INTO detections ({', '.join(COLUMNS)}) "
+                                        f"VALUES ({', '.join('?' * len(COLUMNS))})", batch)
+                self.written += len(batch)
+                self.batches += 1
+            except sqlite3.Error as e:
+                self.dropped += len(batch)
+                print(f"[EVENTS] ❌ écriture de {len(batch)} détections : {e}")
+            finally:
+                self.write_time += time.perf_counter() - t0
+                for _ in batch:
+                    self.queue.task_done()
+
+    def flush(self):
+        """Attend que toutes les détections reçues soient écrites."""
+        self.queue.join()
+
+    # ---------- Requêtes ----------
+    def query(self, camera=None, name=None, cls=None, start=None, end=None, limit=1000, newest_first=False):
+        """Détections filtrées, sous forme de dicts, dans l'ordre chronologique (ou inverse)."""
+        where, params = [], []
+        for column, value in (("camera", camera), ("name", name), ("class", cls)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if start is not None:
+            where.append("time >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("time < ?")
+            params.append(end)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM detections"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY time {'DESC' if newest_first else 'ASC'}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+        return [self._record(row) for row in rows]
+
+    @staticmethod
+    def _record(row):
+        record = dict(zip(COLUMNS, row))
+        record["box"] = tuple(record.pop(k) for k in ("x1", "y1", "x2", "y2"))
+        return record
+
+    def unknown_faces(self, camera=None, start=None, end=None, limit=1000):
+        """Visages non reconnus, ex: unknown_faces("salon", *last_night())."""
+        return self.query(camera=camera, name="Unknown", start=start, end=end, limit=limit)
+
+    def first_sighting(self, name, start=None, end=None, camera=None):
+        """Première détection de name sur la période, ex: first_sighting("moi", *today()), ou None."""
+        found = self.query(camera=camera, name=name, start=start, end=end, limit=1)
+        return found[0] if found else None
+
+    def last_sighting(self, name, start=None, end=None, camera=None):
+        found = self.query(camera=camera, name=name, start=start, end=end, limit=1, newest_first=True)
+        return found[0] if found else None
+
+    def count(self, camera=None, start=None, end=None):
+        """Nombre de détections par nom sur la période : {nom: n}."""
+        where, params = ["name IS NOT NULL"], []
+        if camera is not None:
+            where.append("camera = ?")
+            params.append(camera)
+        if start is not None:
+            where.append("time >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("time < ?")
+            params.append(end)
+        with self.lock:
+            rows = self.db.execute(f"SELECT name, COUNT(*) FROM detections WHERE {' AND '.join(where)} "
+                                   f"GROUP BY name", params).fetchall()
+        return dict(rows)
+
+    # ---------- Statistiques ----------
+    def format(self):
+        per_row = self.write_time / self.written * 1e6 if self.written else 0.0
+        return (f"écrites={self.written} lots={self.batches} en attente={self.queue.qsize()} "
+                f"perdues={self.dropped} coût={per_row:.1f}µs/ligne")
+
+    def close(self):
+        self.stop_event.set()
+        self.writer.join()
+        with self.lock:
+            self.db.close()
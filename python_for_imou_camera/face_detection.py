@@ -0,0 +1,106 @@
+# face_detection.py
+# Localisation des visages dans les crops de personnes, avant la reconnaissance LBPH.
+import os
+import cv2
+import numpy as np
+
+YUNET_MODEL = "src/face_detection_yunet_2023mar.onnx"
+
+
+class FaceDetector:
+    """
+    Cherche les visages dans le haut d'un crop de personne, réduit à max_width pixels :
+    YuNet (cv2.FaceDetectorYN) si le modèle ONNX est présent, sinon la cascade de Haar d'OpenCV.
+    Les boîtes sont retournées en coordonnées de la frame, avec les 5 points de YuNet
+    (yeux, nez, coins de la bouche) pour l'alignement SFace ; les visages trop petits
+    ou trop flous pour LBPH sont écartés.
+    """
+    def __init__(self, method="auto", model_path=YUNET_MODEL, max_width=160, head_ratio=0.5,
+                 min_size=40, min_sharpness=30.0, score_threshold=0.6):
+        """
+        method: "auto", "yunet" ou "haar"
+        max_width: largeur maximale du crop analysé (réduit avant détection)
+        head_ratio: part haute du crop où chercher le visage (1.0 = tout le crop)
+        min_size: côté minimal du visage en pixels de la frame d'origine
+        min_sharpness: variance du Laplacien minimale (plus petit = accepte plus de flou)
+        score_threshold: score minimal d'un visage YuNet
+        """
+        if method == "auto":
+            method = "yunet" if os.path.exists(model_path) and hasattr(cv2, "FaceDetectorYN") else "haar"
+        if method not in ("yunet", "haar"):
+            raise ValueError(f"Méthode inconnue: {method}")
+        self.method = method
+        self.max_width = max_width
+        self.head_ratio = head_ratio
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+
+        if method == "yunet":
+            self.yunet = cv2.FaceDetectorYN.create(model_path, "", (max_width, max_width),
+                                                   score_threshold=score_threshold)
+        else:
+            path = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+            self.cascade = cv2.CascadeClassifier(path)
+            if self.cascade.empty():
+                raise RuntimeError(f"Cascade de Haar introuvable: {path}")
+
+        self.crops = 0
+        self.faces = 0
+        self.too_small = 0
+        self.too_blurry = 0
+
+    def _detect(self, small):
+        """Boîtes (x, y, w, h, score, points) dans l'image réduite ; points (5, 2) ou None (Haar)."""
+        if self.method == "yunet":
+            h, w = small.shape[:2]
+            self.yunet.setInputSize((w, h))
+            _, faces = self.yunet.detect(small)
+            if faces is None:
+                return []
+            return [(*f[:4], float(f[-1]), f[4:14].reshape(5, 2)) for f in faces]
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        boxes = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4, minSize=(12, 12))
+        return [(x, y, w, h, 1.0, None) for x, y, w, h in boxes]
+
+    def detect(self, crop, offset=(0, 0)):
+        """
+        crop: image BGR d'une personne, offset: (x1, y1) du crop dans la frame
+        Retourne une liste (x1, y1, x2, y2, score, points) en coordonnées de la frame, visages utilisables
+        seulement ; points = tableau (5, 2) des repères YuNet, None avec la cascade de Haar.
+        """
+        self.crops += 1
+        h, w = crop.shape[:2]
+        region = crop[:max(1, int(h * self.head_ratio))]
+        if region.shape[0] < self.min_size or region.shape[1] < self.min_size:
+            self.too_small += 1
+            return []
+        scale = min(1.0, self.max_width / region.shape[1])
+        small = region if scale == 1.0 else cv2.resize(region, None, fx=scale, fy=scale,
+                                                       interpolation=cv2.INTER_AREA)
+
+        faces = []
+        for x, y, fw, fh, score, points in self._detect(small):
+            x1, y1 = max(0, int(x / scale)), max(0, int(y / scale))
+            x2, y2 = min(w, int((x + fw) / scale)), min(region.shape[0], int((y + fh) / scale))
+            if min(x2 - x1, y2 - y1) < self.min_size:
+                self.too_small += 1
+                continue
+            if self.sharpness(crop[y1:y2, x1:x2]) < self.min_sharpness:
+                self.too_blurry += 1
+                continue
+            ox, oy = offset
+            if points is not None:
+                points = (points / scale + np.float32((ox, oy))).astype(np.float32)
+            faces.append((x1 + ox, y1 + oy, x2 + ox, y2 + oy, score, points))
+        self.faces += len(faces)
+        return faces
+
+    @staticmethod
+    def sharpness(face_img):
+        """Variance du Laplacien : faible sur un visage flou (bougé, mise au point, compression)."""
+        gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+        return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+    def format(self):
+        return (f"détecteur={self.method} personnes={self.crops} visages={self.faces} "
+                f"trop petits={self.too_small} flous={self.too_blurry}")
@@ -0,0 +1,505 @@
+# ffmpeg_stream.py
+import os
+import re
+import json
+import time
+import threading
+import subprocess
+from pipeline import read_exactly_into
+
+# canaux par format de pixel supporté en sortie rawvideo
+PIX_FMT_CHANNELS = {"bgr24": 3, "rgb24": 3, "gray": 1}
+
+
+# ------------------- Sonde du flux -------------------
+def _parse_rate(rate):
+    """'25/1' -> 25.0, '0/0' -> None"""
+    try:
+        num, den = (float(x) for x in rate.split("/"))
+        return num / den if den else None
+    except (AttributeError, ValueError):
+        return None
+
+
+def probe_stream(url, timeout=15):
+    """
+    Géométrie réelle du flux vidéo : {"width", "height", "fps", "codec", "has_audio"}.
+    Utilise ffprobe, sinon lit la bannière de ffmpeg -i.
+    """
+    command = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", "stream=codec_type,width,height,avg_frame_rate,r_frame_rate,codec_name",
+        "-of", "json",
+        url
+    ]
+    try:
+        out = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+        streams = json.loads(out.stdout or "{}").get("streams", [])
+        video = [s for s in streams if s.get("codec_type") == "video" and s.get("width")]
+        if video:
+            s = video[0]
+            return {
+                "width": int(s["width"]),
+                "height": int(s["height"]),
+                "fps": _parse_rate(s.get("avg_frame_rate")) or _parse_rate(s.get("r_frame_rate")),
+                "codec": s.get("codec_name"),
+                "has_audio": any(s.get("codec_type") == "audio" for s in streams),
+            }
+    except (FileNotFoundError, subprocess.TimeoutExpired, ValueError):
+        pass
+    return probe_stream_banner(url, timeout)
+
+
+def probe_stream_banner(url, timeout=15):
+    """Repli sans ffprobe : ffmpeg -i sans sortie affiche les flux sur stderr puis s'arrête."""
+    try:
+        out = subprocess.run(["ffmpeg", "-hide_banner", "-i", url],
+                             capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired as e:
+        out = e
+    stderr = out.stderr or ""
+    if isinstance(stderr, bytes):
+        stderr = stderr.decode("utf-8", "replace")
+    m = re.search(r"Stream #\S+.*Video: (\w+).*?, (\d{2,5})x(\d{2,5})", stderr)
+    if not m:
+        raise RuntimeError(f"Impossible de lire la géométrie du flux: {url}")
+    fps = re.search(r"([\d.]+) fps", stderr[m.start():])
+    return {
+        "width": int(m.group(2)),
+        "height": int(m.group(3)),
+        "fps": float(fps.group(1)) if fps else None,
+        "codec": m.group(1),
+        "has_audio": re.search(r"Stream #\S+.*Audio:", stderr) is not None,
+    }
+
+
+# ------------------- Commande ffmpeg -------------------
+def output_geometry(url, width=None, height=None, info=None):
+    """
+    Taille des frames en sortie. Sans width/height : taille réelle du flux (sonde).
+    Avec une seule dimension : l'autre suit le ratio du flux (arrondie au pair).
+    info: résultat de probe_stream déjà obtenu, pour ne pas sonder deux fois
+    """
+    if width and height:
+        return width, height
+    info = info or probe_stream(url)
+    if width:
+        return width, max(2, round(width * info["height"] / info["width"] / 2) * 2)
+    if height:
+        return max(2, round(height * info["width"] / info["height"] / 2) * 2), height
+    return info["width"], info["height"]
+
+
+def build_video_command(url, width=None, height=None, fps=None, pix_fmt="bgr24", hwaccel=None):
+    """
+    Commande ffmpeg rawvideo sur stdout. La décimation (fps) et la mise à l'échelle (scale)
+    se font dans ffmpeg, Python ne reçoit que les frames et les pixels utiles.
+    hwaccel: None = choix de ffmpeg, "none" = décodage CPU forcé, sinon "vaapi", "cuda", ...
+    """
+    command = _input_args(url, hwaccel)
+    command += _video_output_args(width, height, fps, pix_fmt)
+    command += ["-an", "-"]
+    return command
+
+
+def build_av_command(url, width=None, height=None, fps=None, pix_fmt="bgr24", hwaccel=None,
+                     sample_rate=44100, channels=1, audio_fd=3):
+    """
+    Une seule connexion RTMP pour l'audio et la vidéo :
+    vidéo rawvideo sur stdout, audio PCM s16le sur le descripteur audio_fd (pipe:N).
+    """
+    command = _input_args(url, hwaccel)
+    command += ["-map", "0:v:0"] + _video_output_args(width, height, fps, pix_fmt) + ["pipe:1"]
+    command += [
+        "-map", "0:a:0",
+        "-af", "aresample=async=1",  # comble les trous : la position audio reste alignée sur les PTS
+        "-f", "s16le",
+        "-acodec", "pcm_s16le",
+        "-ac", str(channels),
+        "-ar", str(sample_rate),
+        f"pipe:{audio_fd}"
+    ]
+    return command
+
+
+def build_segment_command(url, pattern, segment_seconds=2, segment_format="mpegts", start_number=0):
+    """
+    Copie du flux d'origine (H.264 / AAC, sans décodage ni réencodage) en segments de segment_seconds
+    (coupés sur les images clés). Chaque segment terminé est annoncé sur stdout : "fichier,début,fin".
+    pattern: chemin avec un numéro, ex: "buffer/seg_%06d.ts"
+    """
+    return _input_args(url, None) + _segment_output_args(pattern, segment_seconds, segment_format, start_number)
+
+
+def _segment_output_args(pattern, segment_seconds, segment_format, start_number, segment_list="pipe:1"):
+    return [
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-c", "copy",
+        "-f", "segment",
+        "-segment_time", str(segment_seconds),
+        "-segment_format", segment_format,
+        "-segment_start_number", str(start_number),
+        "-reset_timestamps", "1",
+        "-segment_list", segment_list,
+        "-segment_list_type", "csv",
+        pattern
+    ]
+
+
+def segment_events(pipe, segment_dir):
+    """
+    Segments annoncés par ffmpeg (liste csv "fichier,début,fin" de build_segment_command), jusqu'à EOF :
+    {"path", "duration", "start_wall", "end_wall"} (horloge murale, time.time()).
+    """
+    for line in pipe:
+        try:
+            name, start, end = line.decode("utf-8").strip().rsplit(",", 2)
+            duration = float(end) - float(start)
+        except ValueError:
+            continue
+        now = time.time()
+        yield {"path": os.path.join(segment_dir, os.path.basename(name)),
+               "duration": duration, "start_wall": now - duration, "end_wall": now}
+
+
+def build_concat_command(list_file, output):
+    """Assemble des segments (liste au format du démuxeur concat) en un seul fichier, sans réencodage."""
+    return ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-f", "concat", "-safe", "0", "-i", list_file,
+            "-c", "copy", "-movflags", "+faststart", output]
+
+
+def _input_args(url, hwaccel):
+    command = ["ffmpeg", "-nostdin", "-loglevel", "error"]
+    if hwaccel:
+        command += ["-hwaccel", hwaccel]
+    return command + ["-i", url]
+
+
+def _video_output_args(width, height, fps, pix_fmt):
+    if pix_fmt not in PIX_FMT_CHANNELS:
+        raise ValueError(f"pix_fmt non supporté: {pix_fmt}")
+    filters = []
+    if fps:
+        filters.append(f"fps={fps}")  # avant scale : on ne redimensionne que les frames gardées
+    if width and height:
+        filters.append(f"scale={width}:{height}")
+    args = ["-vf", ",".join(filters)] if filters else []
+    return args + ["-f", "rawvideo", "-pix_fmt", pix_fmt]
+
+
+def frame_shape(width, height, pix_fmt="bgr24"):
+    channels = PIX_FMT_CHANNELS[pix_fmt]
+    return (height, width, channels) if channels > 1 else (height, width)
+
+
+# ------------------- Audio + vidéo, un seul ffmpeg -------------------
+class AVStream:
+    """
+    Un seul processus ffmpeg (donc une seule connexion RTMP) par caméra :
+    - video : stdout, frames rawvideo à cadence constante
+    - audio : pipe supplémentaire, PCM s16le (None si le flux n'a pas d'audio)
+    Les deux sorties partagent l'horloge d'entrée de ffmpeg : la frame n est à n / fps secondes
+    et l'échantillon k à k / sample_rate secondes depuis le début du flux.
+    Les deux pipes doivent être lus en continu, sinon ffmpeg bloque l'autre sortie.
+    add_segment_output() ajoute une copie du flux d'origine en segments (-c copy, sans décodage)
+    au même ffmpeg : enregistrement et archive sans seconde connexion RTMP.
+    start() peut être rappelé après stop() (relance, éventuellement sur une nouvelle url) :
+    la géométrie reste celle fixée à la construction.
+    """
+    def __init__(self, url, width=None, height=None, fps=None, pix_fmt="bgr24", hwaccel=None,
+                 sample_rate=44100, channels=1, audio=True):
+        """audio=False : vidéo seule, pas de sonde si width, height et fps sont donnés"""
+        info = {"fps": None, "has_audio": False}
+        if audio or not (width and height and fps):
+            info = probe_stream(url)
+        width, height = output_geometry(url, width, height, info)
+        self.url = url
+        self.width = width
+        self.height = height
+        # cadence explicite : l'index de frame donne le PTS
+        self.fps = fps or info["fps"] or 25
+        self.pix_fmt = pix_fmt
+        self.hwaccel = hwaccel
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.has_audio = audio and info["has_audio"]
+        self.proc = None
+        self.video = None
+        self.audio = None
+        self.started_at = None
+        self.segment_output = None   # (pattern, secondes, format, on_segment)
+        self.segment_number = 0      # numéro du prochain segment (continu entre deux relances)
+        self.segment_reader = None
+
+    @property
+    def shape(self):
+        return frame_shape(self.width, self.height, self.pix_fmt)
+
+    def add_segment_output(self, pattern, segment_seconds=2, segment_format="mpegts", on_segment=None):
+        """
+        Segments du flux d'origine écrits par ce ffmpeg (voir build_segment_command), une seule sortie
+        par flux, à déclarer avant start(). on_segment(segment) est appelé depuis un thread de lecture.
+        """
+        if self.segment_output is not None:
+            raise ValueError("Une seule sortie segments par flux")
+        os.makedirs(os.path.dirname(pattern) or ".", exist_ok=True)
+        self.segment_output = (pattern, segment_seconds, segment_format, on_segment)
+
+    def start(self):
+        if self.audio is not None:
+            self.audio.close()  # pipe audio du processus précédent (relance)
+        fds = []
+        if self.has_audio:
+            audio_r, audio_w = os.pipe()
+            command = build_av_command(self.url, self.width, self.height, self.fps, self.pix_fmt,
+                                       self.hwaccel, self.sample_rate, self.channels, audio_fd=audio_w)
+            fds.append(audio_w)
+        else:
+            command = build_video_command(self.url, self.width, self.height, self.fps,
+                                          self.pix_fmt, self.hwaccel)
+        if self.segment_output:
+            pattern, segment_seconds, segment_format, _ = self.segment_output
+            list_r, list_w = os.pipe()
+            command += _segment_output_args(pattern, segment_seconds, segment_format, self.segment_number,
+                                            f"pipe:{list_w}")
+            fds.append(list_w)
+        self.proc = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=0, pass_fds=tuple(fds))
+        for fd in fds:
+            os.close(fd)
+        if self.has_audio:
+            self.audio = os.fdopen(audio_r, "rb")
+        if self.segment_output:
+            self.segment_reader = threading.Thread(target=self._read_segments, args=(os.fdopen(list_r, "rb"),),
+                                                   daemon=True)
+            self.segment_reader.start()
+        self.video = self.proc.stdout
+        self.started_at = time.time()
+        return self
+
+    def _read_segments(self, pipe):
+        pattern, _, _, on_segment = self.segment_output
+        with pipe:
+            for segment in segment_events(pipe, os.path.dirname(pattern)):
+                self.segment_number += 1
+                if on_segment:
+                    try:
+                        on_segment(segment)
+                    except Exception as e:
+                        print(f"[STREAM] ⚠️ segment {segment['path']} : {e}")
+
+    def video_time(self, frame_index):
+        """PTS (secondes depuis le début du flux) de la frame n° frame_index (0 = première)."""
+        return frame_index / self.fps
+
+    def audio_time(self, samples):
+        """PTS de l'échantillon n° samples."""
+        return samples / self.sample_rate
+
+    def stop(self):
+        if self.proc:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=3)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        if self.segment_reader:
+            # dernier segment annoncé par ffmpeg à l'arrêt : traité avant une relance (numéros continus)
+            self.segment_reader.join(timeout=3)
+
+
+# ------------------- Reconnexion automatique -------------------
+class _ResilientReader:
+    """Lecteur stable vu par les étages en aval : survit aux relances de ffmpeg."""
+    def __init__(self, stream, kind):
+        self.stream = stream
+        self.kind = kind
+
+    def read_frame(self, buf):
+        """Lit une frame complète dans buf ; une frame tronquée par une coupure est relue en entier."""
+        while self.stream.running:
+            generation, pipe = self.stream.current(self.kind)
+            try:
+                ok = pipe is not None and read_exactly_into(pipe, buf)
+            except (ValueError, OSError):  # pipe fermé par une relance pendant la lecture
+                ok = False
+            if ok:
+                self.stream.alive()
+                return True
+            self.stream.reconnect(generation, f"{self.kind}: fin de flux / lecture incomplète")
+        return False
+
+    def read(self, n):
+        """Lit jusqu'à n octets (un nombre entier d'échantillons audio)."""
+        align = self.stream.channels * 2
+        while self.stream.running:
+            generation, pipe = self.stream.current(self.kind)
+            try:
+                data = pipe.read(n) if pipe is not None else b""
+            except (ValueError, OSError):  # pipe fermé par une relance pendant la lecture
+                data = b""
+            data = data[:len(data) - len(data) % align]
+            if data:
+                self.stream.alive()
+                return data
+            self.stream.reconnect(generation, f"{self.kind}: fin de flux")
+        return b""
+
+
+class ResilientStream:
+    """
+    Enveloppe un AVStream pour qu'il ne s'arrête jamais tout seul :
+    - EOF, lecture incomplète ou blocage (aucun octet pendant stall_timeout) -> ffmpeg relancé
+      avec un backoff exponentiel
+    - après refresh_after échecs consécutifs, l'URL RTMP est redemandée via url_provider()
+      (ex: création / requête du flux par l'OpenAPI, les URLs expirent)
+    - video / audio restent les mêmes objets : les étages en aval continuent sans redémarrer
+    - métriques : reconnexions, blocages, rafraîchissements d'URL, temps d'indisponibilité
+    S'utilise à la place d'un AVStream (mêmes attributs width, height, fps, shape, video_time...).
+    """
+    def __init__(self, source, url_provider=None, stall_timeout=15.0, backoff=1.0, max_backoff=60.0,
+                 refresh_after=2, max_retries=None):
+        self.source = source
+        self.url_provider = url_provider
+        self.stall_timeout = stall_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.refresh_after = refresh_after
+        self.max_retries = max_retries
+
+        self.lock = threading.Lock()
+        self.swapped = threading.Condition(self.lock)  # notifié quand un nouveau ffmpeg remplace l'ancien
+        self.stop_event = threading.Event()
+        self.running = False
+        self.reconnecting = False
+        self.generation = 0
+        self.last_data = time.monotonic()
+        self.watchdog = None
+
+        self.failures = 0        # échecs consécutifs
+        self.reconnects = 0
+        self.stalls = 0
+        self.url_refreshes = 0
+        self.downtime = 0.0
+        self.down_since = None
+        self.last_error = None
+
+        self.video = _ResilientReader(self, "video")
+        self.audio = _ResilientReader(self, "audio") if source.has_audio else None
+
+    def __getattr__(self, name):
+        # width, height, fps, pix_fmt, shape, sample_rate, video_time, audio_time... de l'AVStream
+        return getattr(self.source, name)
+
+    def start(self):
+        self.running = True
+        self.source.start()
+        self.last_data = time.monotonic()
+        self.watchdog = threading.Thread(target=self._watch, daemon=True)
+        self.watchdog.start()
+        return self
+
+    def current(self, kind):
+        with self.lock:
+            return self.generation, getattr(self.source, kind)
+
+    def alive(self):
+        self.last_data = time.monotonic()
+        if self.down_since is not None:
+            with self.lock:
+                if self.down_since is not None:
+                    self.downtime += self.last_data - self.down_since
+                    self.down_since = None
+                    self.failures = 0
+                    print(f"[STREAM] ✅ Flux rétabli ({self.format()})")
+
+    def reconnect(self, generation, reason):
+        """
+        Relance ffmpeg (un seul lecteur s'en charge, l'autre attend le nouveau processus).
+        Le verrou n'est tenu que pour décider et pour échanger le processus : l'arrêt de l'ancien ffmpeg,
+        le backoff et la demande d'URL se font sans bloquer les lecteurs ni stop().
+        """
+        with self.lock:
+            if generation != self.generation or not self.running:
+                return
+            if self.reconnecting:
+                # un autre lecteur (audio / vidéo) relance déjà ffmpeg
+                self.swapped.wait_for(lambda: generation != self.generation or not self.running, timeout=1.0)
+                return
+            self.reconnecting = True
+            if self.down_since is None:
+                self.down_since = time.monotonic()
+            self.last_error = reason
+            self.failures += 1
+            failures = self.failures
+
+        try:
+            self.source.stop()
+            if self.max_retries is not None and failures > self.max_retries:
+                print(f"[STREAM] ❌ Abandon après {self.max_retries} tentatives : {reason}")
+                self.running = False
+                return
+            delay = min(self.max_backoff, self.backoff * 2 ** (failures - 1))
+            print(f"[STREAM] ⚠️ {reason} -> relance dans {delay:.0f}s (tentative {failures})")
+            if self.stop_event.wait(delay):
+                self.running = False
+                return
+            url = None
+            if self.url_provider and failures >= self.refresh_after:
+                try:
+                    url = self.url_provider()
+                except Exception as e:
+                    print(f"[STREAM] ⚠️ Impossible de renouveler l'URL : {e}")
+
+            with self.lock:
+                if not self.running:
+                    return
+                if url:
+                    self.source.url = url
+                    self.url_refreshes += 1
+                self.source.start()
+                self.generation += 1
+                self.reconnects += 1
+                self.last_data = time.monotonic()
+        finally:
+            with self.lock:
+                self.reconnecting = False
+                self.swapped.notify_all()
+
+    def _watch(self):
+        while not self.stop_event.wait(1.0):
+            if self.reconnecting or time.monotonic() - self.last_data < self.stall_timeout:
+                continue
+            # plus aucun octet : on tue ffmpeg, les lecteurs voient EOF et relancent
+            with self.lock:
+                proc = self.source.proc
+                self.stalls += 1
+                self.last_data = time.monotonic()
+            if proc and proc.poll() is None:
+                proc.kill()
+
+    def metrics(self):
+        down = self.downtime
+        if self.down_since is not None:
+            down += time.monotonic() - self.down_since
+        return {
+            "url": self.source.url,
+            "reconnects": self.reconnects,
+            "stalls": self.stalls,
+            "url_refreshes": self.url_refreshes,
+            "downtime_s": down,
+            "connected": self.down_since is None,
+            "last_error": self.last_error,
+        }
+
+    def format(self):
+        m = self.metrics()
+        return (f"reconnexions={m['reconnects']} blocages={m['stalls']} urls={m['url_refreshes']} "
+                f"indisponible={m['downtime_s']:.0f}s")
+
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
+        with self.lock:
+            self.swapped.notify_all()
+        self.source.stop()
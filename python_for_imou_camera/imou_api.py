@@ -0,0 +1,236 @@
+# imou_api.py
+# Client OpenAPI Imou partagé : une session HTTP keep-alive, jeton en cache, retries.
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from collections import deque, defaultdict
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from config import AppId, AppSecret, BASE_URL
+
+OPERATIONS = {
+    "up": 0,
+    "down": 1,
+    "left": 2,
+    "right": 3
+}
+
+
+class ImouApiError(RuntimeError):
+    """Réponse de l'API avec un code différent de "0"."""
+    def __init__(self, endpoint, code, data):
+        super().__init__(f"{endpoint} failed ({code}): {data}")
+        self.endpoint = endpoint
+        self.code = code
+        self.data = data
+
+
+def make_sign(ts, nonce, secret):
+    raw = f"time:{ts},nonce:{nonce},appSecret:{secret}"
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+class ImouClient:
+    """
+    Client thread-safe de l'OpenAPI Imou.
+    - requests.Session partagée (connexions TLS réutilisées, pool de taille pool_size)
+    - timeout sur chaque appel, retries avec backoff exponentiel sur erreurs réseau / 5xx / 429,
+      sauf pour les commandes non idempotentes (NO_RETRY : un mouvement PTZ rejoué tourne deux fois)
+    - jeton en mémoire + sur disque, renouvelé avant expiration (refresh_margin secondes)
+    - latence mesurée par endpoint
+    """
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    NO_RETRY = {"controlMovePTZ"}
+
+    def __init__(self, app_id=AppId, app_secret=AppSecret, base_url=BASE_URL, timeout=15,
+                 retries=3, backoff=0.5, token_cache="imou_token.json", refresh_margin=300, pool_size=10):
+        """
+        token_cache: fichier du cache de jeton (None = mémoire seulement)
+        """
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.token_cache = token_cache
+        self.refresh_margin = refresh_margin
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._token = None
+        self._expires_at = 0.0
+        self._token_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self.latencies = defaultdict(lambda: deque(maxlen=200))
+        self.calls = defaultdict(int)
+        self.failures = defaultdict(int)
+
+    # ---------- HTTP ----------
+    def post(self, endpoint, payload):
+        url = f"{self.base_url}/{endpoint}"
+        retries = 0 if endpoint in self.NO_RETRY else self.retries
+        for attempt in range(retries + 1):
+            t0 = time.perf_counter()
+            try:
+                r = self.session.post(url, json=payload, timeout=self.timeout)
+                if r.status_code in self.RETRY_STATUS and attempt < retries:
+                    raise requests.HTTPError(f"HTTP {r.status_code}", response=r)
+                r.raise_for_status()
+                data = r.json()
+                self._record(endpoint, time.perf_counter() - t0)
+                return data
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                self._record(endpoint, time.perf_counter() - t0, failed=True)
+                status = getattr(e.response, "status_code", None)
+                retryable = status is None or status in self.RETRY_STATUS
+                if not retryable or attempt == retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def _record(self, endpoint, seconds, failed=False):
+        with self._stats_lock:
+            self.calls[endpoint] += 1
+            self.latencies[endpoint].append(seconds)
+            if failed:
+                self.failures[endpoint] += 1
+
+    def request(self, endpoint, params=None):
+        """Appel signé, retourne result["data"] ou lève ImouApiError."""
+        ts = int(time.time())
+        nonce = str(uuid.uuid4())
+        payload = {
+            "system": {"ver": "1.0", "appId": self.app_id, "sign": make_sign(ts, nonce, self.app_secret),
+                       "time": ts, "nonce": nonce},
+            "id": str(uuid.uuid4()),
+            "params": params or {}
+        }
+        data = self.post(endpoint, payload)
+        result = data.get("result", {})
+        code = result.get("code")
+        if code != "0":
+            raise ImouApiError(endpoint, code, data)
+        return result.get("data", {})
+
+    def authed(self, endpoint, params=None, token=None):
+        """
+        Appel avec jeton. Sans jeton explicite, utilise le cache et,
+        si l'API répond jeton invalide (codes TK...), le renouvelle et réessaie une fois.
+        """
+        if token is not None:
+            return self.request(endpoint, dict(params or {}, token=token))
+        try:
+            return self.request(endpoint, dict(params or {}, token=self.get_access_token()))
+        except ImouApiError as e:
+            if not str(e.code).startswith("TK"):
+                raise
+            return self.request(endpoint, dict(params or {}, token=self.get_access_token(force=True)))
+
+    # ---------- Jeton ----------
+    def get_access_token(self, force=False):
+        with self._token_lock:
+            now = time.time()
+            if not force and self._token is None:
+                self._load_token_cache()
+            if force or self._token is None or now >= self._expires_at - self.refresh_margin:
+                data = self.request("accessToken")
+                self._token = data["accessToken"]
+                # expireTime : durée de validité en secondes (3 jours par défaut côté Imou)
+                self._expires_at = now + float(data.get("expireTime", 3 * 24 * 3600))
+                self._save_token_cache()
+            return self._token
+
+    def _load_token_cache(self):
+        if not self.token_cache or not os.path.exists(self.token_cache):
+            return
+        try:
+            with open(self.token_cache, encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cached.get("app_id") == self.app_id and cached.get("base_url") == self.base_url:
+            self._token = cached.get("token")
+            self._expires_at = float(cached.get("expires_at", 0))
+
+    def _save_token_cache(self):
+        if not self.token_cache:
+            return
+        tmp = f"{self.token_cache}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"app_id": self.app_id, "base_url": self.base_url,
+                       "token": self._token, "expires_at": self._expires_at}, f)
+        os.replace(tmp, self.token_cache)
+
+    # ---------- Endpoints ----------
+    def get_live_list(self, query_range="1-10", token=None):
+        return self.authed("liveList", {"queryRange": query_range}, token).get("lives", [])
+
+    def create_rtmp(self, device_id, channel_id="0", token=None):
+        try:
+            return self.authed("createDeviceRtmpLive",
+                               {"deviceId": device_id, "channelId": channel_id}, token)["rtmp"]
+        except ImouApiError as e:
+            if e.code == "LV1001":  # flux déjà créé
+                return self.query_rtmp(device_id, channel_id, token)
+            raise
+
+    def query_rtmp(self, device_id, channel_id="0", token=None):
+        return self.authed("queryDeviceRtmpLive",
+                           {"deviceId": device_id, "channelId": channel_id}, token)["rtmp"]
+
+    def move_ptz(self, device_id, operation, duration_ms=200, channel_id="0", token=None):
+        return self.authed("controlMovePTZ", {
+            "deviceId": device_id,
+            "channelId": channel_id,
+            "operation": str(OPERATIONS[operation]),
+            "duration": str(duration_ms)
+        }, token)
+
+    def device_rtmp(self, device, token=None):
+        """Premier flux RTMP annoncé par liveList pour ce device, sinon en crée un."""
+        for s in device.get("streams", []):
+            if s.get("rtmp"):
+                return s["rtmp"]
+        return self.create_rtmp(device["deviceId"], str(device.get("channelId", "0")), token)
+
+    # ---------- Statistiques ----------
+    def stats(self):
+        with self._stats_lock:
+            out = {}
+            for endpoint, lat in self.latencies.items():
+                ms = np.array(lat) * 1000
+                out[endpoint] = {
+                    "calls": self.calls[endpoint],
+                    "failures": self.failures[endpoint],
+                    "latency_ms_p50": float(np.percentile(ms, 50)),
+                    "latency_ms_p99": float(np.percentile(ms, 99)),
+                }
+            return out
+
+    def format_stats(self):
+        return "\n".join(f"{ep}: appels={s['calls']} échecs={s['failures']} "
+                         f"p50={s['latency_ms_p50']:.0f}ms p99={s['latency_ms_p99']:.0f}ms"
+                         for ep, s in self.stats().items())
+
+
+# ------------------- Client partagé -------------------
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Client unique du processus (créé au premier appel)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ImouClient()
+        return _client
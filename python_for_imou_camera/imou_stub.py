@@ -0,0 +1,183 @@
+# imou_stub.py
+# Faux serveur OpenAPI Imou, hors ligne, pour tester le client sans compte ni caméra.
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class StubImouServer:
+    """
+    Serveur HTTP local qui répond aux endpoints utilisés par le projet.
+    - devices: liste renvoyée par liveList
+    - latency: délai artificiel par requête (secondes)
+    - fail_next(n, status): les n prochaines requêtes échouent avec ce code HTTP
+    - revoke_tokens(): les jetons déjà émis sont refusés (code TK1002), comme un jeton expiré côté Imou
+    - calls: liste (endpoint, params) des requêtes reçues
+    - ptz: position simulée {"pan", "tilt"} en ms de mouvement cumulées (droite / bas positifs),
+      ptz_pixels_per_ms: déplacement de l'image par ms de mouvement, pour simuler un suivi
+    """
+    def __init__(self, devices=None, latency=0.0, token_ttl=3600, port=0):
+        self.devices = devices if devices is not None else [
+            {"deviceId": "STUB0001", "channelId": "0",
+             "streams": [{"hls": "http://127.0.0.1/stub.m3u8", "rtmp": "rtmp://127.0.0.1/live/stub"}]},
+        ]
+        self.latency = latency
+        self.token_ttl = token_ttl
+        self.calls = []
+        self.tokens_issued = 0
+        self.revoked_below = 1   # jetons stub-token-N acceptés si N >= revoked_below
+        self.ptz = {"pan": 0, "tilt": 0}
+        self.ptz_pixels_per_ms = 0.5
+        self._failures = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/openapi"
+
+    def fail_next(self, n=1, status=503):
+        with self._lock:
+            self._failures += [status] * n
+
+    def revoke_tokens(self):
+        with self._lock:
+            self.revoked_below = self.tokens_issued + 1
+
+    def count(self, endpoint):
+        """Nombre de requêtes reçues pour endpoint (retries compris)."""
+        with self._lock:
+            return sum(1 for e, _ in self.calls if e == endpoint)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------- Réponses ----------
+    def respond(self, endpoint, params):
+        """Retourne (code Imou, data) pour un endpoint."""
+        if endpoint == "accessToken":
+            self.tokens_issued += 1
+            return "0", {"accessToken": f"stub-token-{self.tokens_issued}", "expireTime": self.token_ttl}
+        if "token" in params:
+            token = str(params["token"])
+            if not token.startswith("stub-token-") or int(token.rsplit("-", 1)[1]) < self.revoked_below:
+                return "TK1002", {}
+        if endpoint == "liveList":
+            return "0", {"count": len(self.devices), "lives": self.devices}
+        if endpoint in ("createDeviceRtmpLive", "queryDeviceRtmpLive"):
+            return "0", {"rtmp": f"rtmp://127.0.0.1/live/{params.get('deviceId')}_{params.get('channelId')}"}
+        if endpoint == "controlMovePTZ":
+            axis, sign = {"0": ("tilt", -1), "1": ("tilt", 1), "2": ("pan", -1), "3": ("pan", 1)}.get(
+                str(params.get("operation")), (None, 0))
+            if axis is None:
+                return "OP1009", {}
+            self.ptz[axis] += sign * int(params.get("duration", 0))
+            return "0", {}
+        return "OP1009", {}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                endpoint = self.path.rstrip("/").rsplit("/", 1)[-1]
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                params = body.get("params", {})
+                with stub._lock:
+                    stub.calls.append((endpoint, params))
+                    failure = stub._failures.pop(0) if stub._failures else None
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if failure:
+                    self.send_response(failure)
+                    self.end_headers()
+                    return
+                code, data = stub.respond(endpoint, params)
+                out = json.dumps({"id": body.get("id"), "result": {"code": code, "msg": "", "data": data}})
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out.encode("utf-8"))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+# ------------------- Vérifications -------------------
+def self_check():
+    """ImouClient contre le stub : retries, jeton renouvelé, PTZ. Lève AssertionError au premier écart."""
+    import requests
+    from imou_api import ImouClient
+
+    with StubImouServer(latency=0.002) as stub:
+        client = ImouClient(base_url=stub.base_url, token_cache=None, backoff=0.01)
+
+        # 503 transitoires : réessayés, le jeton finit par être obtenu
+        stub.fail_next(2)
+        token = client.get_access_token()
+        assert token == "stub-token-1" and stub.count("accessToken") == 3, stub.calls
+        print("✅ retries sur 503")
+
+        # jeton en cache : un seul accessToken pour 50 appels
+        for _ in range(50):
+            client.get_live_list()
+        assert stub.tokens_issued == 1
+        print("✅ jeton réutilisé")
+
+        # jeton refusé (TK1002) : renouvelé puis l'appel est rejoué une fois
+        stub.revoke_tokens()
+        assert client.get_live_list()[0]["deviceId"] == "STUB0001"
+        assert stub.tokens_issued == 2 and client.get_access_token() == "stub-token-2"
+        print("✅ jeton renouvelé après TK1002")
+
+        # jeton proche de l'expiration : renouvelé avant l'appel
+        client.refresh_margin = stub.token_ttl + 1
+        client.get_live_list()
+        assert stub.tokens_issued == 3
+        client.refresh_margin = 300
+        print("✅ jeton renouvelé avant expiration")
+
+        # PTZ : opération et durée transmises, position simulée mise à jour
+        client.move_ptz("STUB0001", "right", 300)
+        client.move_ptz("STUB0001", "up", 100)
+        assert stub.ptz == {"pan": 300, "tilt": -100}, stub.ptz
+        print("✅ PTZ")
+
+        # PTZ non idempotent : une erreur 503 remonte sans que la commande soit rejouée
+        calls = stub.count("controlMovePTZ")
+        stub.fail_next(1)
+        try:
+            client.move_ptz("STUB0001", "right", 300)
+            raise AssertionError("503 sur controlMovePTZ non remontée")
+        except requests.HTTPError:
+            pass
+        assert stub.count("controlMovePTZ") == calls + 1, stub.calls
+        print("✅ PTZ sans retry")
+
+        assert client.create_rtmp("STUB0001") == "rtmp://127.0.0.1/live/STUB0001_0"
+        print(client.format_stats())
+
+
+# ------------------- MAIN -------------------
+if __name__ == "__main__":
+    # python imou_stub.py : vérifie ImouClient hors ligne (code de sortie non nul en cas d'échec)
+    self_check()
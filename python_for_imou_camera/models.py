@@ -0,0 +1,94 @@
+# models.py
+# Registre des modèles du processus : chargés à la première utilisation, une seule fois, avec warm-up.
+import time
+import threading
+
+STARTED = time.perf_counter()  # référence du rapport de démarrage (import de ce module)
+
+
+class ModelRegistry:
+    """
+    nom -> fabrique (+ warm-up optionnel). get(nom) construit le modèle au premier appel et le partage
+    ensuite entre tous les threads du processus ; deux modèles différents peuvent se charger en parallèle,
+    un même modèle n'est jamais chargé deux fois. warm_up() fait une inférence factice
+    pour que la première vraie frame ne paie pas l'initialisation paresseuse des bibliothèques.
+    """
+    def __init__(self):
+        self.factories = {}   # nom -> (fabrique, warm-up)
+        self.models = {}
+        self.locks = {}
+        self.warmed = set()
+        self.timings = {}     # nom -> {"load": s, "warmup": s}
+        self.errors = {}      # nom -> dernière erreur de chargement / warm-up
+        self.lock = threading.Lock()
+
+    def register(self, name, factory, warmup=None):
+        """factory() -> modèle ; warmup(modèle) : inférence factice (exceptions affichées, jamais levées)."""
+        with self.lock:
+            self.factories.setdefault(name, (factory, warmup))
+            self.locks.setdefault(name, threading.Lock())
+
+    def get(self, name, factory=None, warmup=None):
+        """Modèle name, chargé si besoin (factory / warmup : enregistrement à la volée, ex: Yolov8Detector)."""
+        model = self.models.get(name)
+        if model is not None:
+            return model
+        if factory is not None:
+            self.register(name, factory, warmup)
+        if name not in self.factories:
+            raise KeyError(f"Modèle inconnu: {name}")
+        with self.locks[name]:
+            if name not in self.models:
+                t0 = time.perf_counter()
+                self.models[name] = self.factories[name][0]()
+                self.timings.setdefault(name, {})["load"] = time.perf_counter() - t0
+        return self.models[name]
+
+    def loaded(self, name):
+        return name in self.models
+
+    def warm_up(self, *names):
+        """
+        Charge et fait tourner une fois chaque modèle (tous ceux enregistrés si aucun nom).
+        Un modèle qui ne se charge pas est noté dans errors et n'empêche pas les suivants ;
+        get(name) réessaiera de le charger à la première utilisation.
+        """
+        for name in names or list(self.factories):
+            try:
+                model = self.get(name)
+            except Exception as e:
+                self.errors[name] = f"chargement : {e}"
+                print(f"[MODELS] ❌ chargement {name} : {e}")
+                continue
+            warmup = self.factories[name][1]
+            with self.locks[name]:
+                if name in self.warmed or warmup is None:
+                    continue
+                t0 = time.perf_counter()
+                try:
+                    warmup(model)
+                except Exception as e:
+                    self.errors[name] = f"warm-up : {e}"
+                    print(f"[MODELS] ⚠️ warm-up {name} : {e}")
+                self.timings[name]["warmup"] = time.perf_counter() - t0
+                self.warmed.add(name)
+        return self
+
+    def warm_up_async(self, *names, report=True):
+        """warm_up dans un thread (ex: pendant la connexion à la caméra), rapport affiché à la fin."""
+        def run():
+            self.warm_up(*names)
+            if report:
+                print(f"[MODELS] {self.format()}")
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def format(self):
+        parts = [f"{name}: chargement {t.get('load', 0):.2f}s warm-up {t.get('warmup', 0):.2f}s"
+                 for name, t in self.timings.items()]
+        parts += [f"{name}: ❌ {error}" for name, error in self.errors.items()]
+        return " | ".join(parts + [f"prêt {time.perf_counter() - STARTED:.2f}s après le démarrage"])
+
+
+registry = ModelRegistry()
@@ -0,0 +1,105 @@
+# motion_tracking.py
+import time
+import cv2
+import numpy as np
+
+
+class MotionDetector:
+    """
+    Détecteur de mouvement peu coûteux placé devant YOLO :
+    frame réduite en niveaux de gris, différence avec un fond moyen glissant
+    (ou soustraction de fond MOG2), seuillage puis proportion de pixels en mouvement dans les ROI.
+    """
+    def __init__(self, width=160, threshold=25, min_area=0.002, alpha=0.05,
+                 rois=None, hold=1.0, method="diff"):
+        """
+        width: largeur de l'image réduite utilisée pour l'analyse
+        threshold: écart de niveau de gris pour qu'un pixel soit "en mouvement" (plus petit = plus sensible)
+        min_area: proportion minimale de pixels en mouvement dans les ROI (plus petit = plus sensible)
+        alpha: vitesse d'adaptation du fond (éclairage qui change lentement)
+        rois: liste de polygones [(x, y), ...] en pixels de la frame d'origine, None = toute l'image
+        hold: secondes pendant lesquelles la détection reste active après le dernier mouvement
+        method: "diff" (fond moyen glissant) ou "mog2" (cv2.createBackgroundSubtractorMOG2)
+        """
+        if method not in ("diff", "mog2"):
+            raise ValueError(f"Méthode inconnue: {method}")
+        self.width = width
+        self.threshold = threshold
+        self.min_area = min_area
+        self.alpha = alpha
+        self.rois = rois
+        self.hold = hold
+        self.method = method
+
+        self.size = None
+        self.mask = None
+        self.roi_pixels = 0
+        self.background = None
+        self.subtractor = None
+        self.last_motion = None
+        self.last_ratio = 0.0
+
+        self.frames = 0
+        self.active = 0
+
+    def _prepare(self, frame):
+        h, w = frame.shape[:2]
+        scale = self.width / w
+        self.size = (self.width, max(1, round(h * scale)))
+        if self.rois:
+            self.mask = np.zeros((self.size[1], self.size[0]), np.uint8)
+            for poly in self.rois:
+                pts = np.round(np.asarray(poly, np.float32) * scale).astype(np.int32)
+                cv2.fillPoly(self.mask, [pts], 255)
+            self.roi_pixels = max(1, int(np.count_nonzero(self.mask)))
+        else:
+            self.mask = None
+            self.roi_pixels = self.size[0] * self.size[1]
+        if self.method == "mog2":
+            self.subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False)
+
+    def update(self, frame):
+        """Analyse une frame et retourne la proportion de pixels en mouvement dans les ROI."""
+        if self.size is None:
+            self._prepare(frame)
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+
+        if self.method == "mog2":
+            moving = self.subtractor.apply(gray, learningRate=self.alpha)
+        else:
+            if self.background is None:
+                self.background = gray.astype(np.float32)
+                return 0.0
+            diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+            _, moving = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+            cv2.accumulateWeighted(gray, self.background, self.alpha)
+
+        if self.mask is not None:
+            np.bitwise_and(moving, self.mask, out=moving)
+        self.last_ratio = np.count_nonzero(moving) / self.roi_pixels
+        return self.last_ratio
+
+    def detect(self, frame):
+        """True si la détection doit tourner sur cette frame (mouvement présent ou récent)."""
+        now = time.monotonic()
+        if self.update(frame) >= self.min_area:
+            self.last_motion = now
+        active = self.last_motion is not None and now - self.last_motion <= self.hold
+        self.frames += 1
+        self.active += active
+        return active
+
+    def trigger(self):
+        """Force la détection pendant hold secondes (ex: événement audio sur une scène immobile)."""
+        self.last_motion = time.monotonic()
+
+    @property
+    def saved_ratio(self):
+        """Proportion des frames analysées pour lesquelles l'inférence a été évitée."""
+        return 1 - self.active / self.frames if self.frames else 0.0
+
+    def format(self):
+        return (f"mouvement={self.last_ratio:.3%} frames={self.frames} "
+                f"inférences évitées={self.frames - self.active} ({self.saved_ratio:.0%})")
@@ -0,0 +1,185 @@
+# onnx_backend.py
+# YOLOv8 exporté en ONNX (FP32 ou INT8) et exécuté par ONNX Runtime, plus rapide que PyTorch sur CPU.
+import os
+import ast
+import cv2
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+# ------------------- Export et quantification -------------------
+def _stale(path, source):
+    return not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(source)
+
+
+def export_onnx(model_path="src/yolov8n.pt", imgsz=640):
+    """Exporte le modèle en ONNX à côté du .pt (src/yolov8n.onnx), réutilisé tant que le .pt ne change pas."""
+    onnx_path = os.path.splitext(model_path)[0] + ".onnx"
+    if _stale(onnx_path, model_path):
+        from ultralytics import YOLO
+        print(f"[ONNX] export de {model_path} -> {onnx_path}")
+        # batch et taille dynamiques : un seul fichier pour l'inférence image par image et par lot
+        exported = YOLO(model_path).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if os.path.abspath(exported) != os.path.abspath(onnx_path):
+            os.replace(exported, onnx_path)
+    return onnx_path
+
+
+class _CalibrationReader:
+    """Images de calibration pour quantize_static, prétraitées comme à l'inférence."""
+    def __init__(self, images, input_name, imgsz, limit=100):
+        self.batches = iter([{input_name: letterbox_batch([cv2.imread(p)], imgsz)[0]}
+                             for p in images[:limit]])
+
+    def get_next(self):
+        return next(self.batches, None)
+
+
+def quantize_int8(onnx_path, calibration_dir=None, imgsz=640):
+    """
+    Variante INT8 (src/yolov8n.int8.onnx), refaite si le modèle FP32 change.
+    Avec calibration_dir (images de la caméra) : quantification statique QDQ, poids et activations INT8,
+    la plus rapide ; sinon quantification dynamique (poids INT8 seulement), sans données mais moins précise.
+    """
+    from onnxruntime import quantization as q
+
+    int8_path = os.path.splitext(onnx_path)[0] + ".int8.onnx"
+    if not _stale(int8_path, onnx_path):
+        return int8_path
+    images = []
+    if calibration_dir:
+        images = sorted(os.path.join(calibration_dir, f) for f in os.listdir(calibration_dir)
+                        if f.lower().endswith((".jpg", ".jpeg", ".png")))
+    if images:
+        import onnxruntime as ort
+        input_name = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        print(f"[ONNX] quantification statique INT8 ({min(len(images), 100)} images de calibration)")
+        q.quantize_static(onnx_path, int8_path, _CalibrationReader(images, input_name, imgsz),
+                          quant_format=q.QuantFormat.QDQ, per_channel=True,
+                          activation_type=q.QuantType.QUInt8, weight_type=q.QuantType.QInt8)
+    else:
+        print("[ONNX] quantification dynamique INT8 (aucune image de calibration)")
+        q.quantize_dynamic(onnx_path, int8_path, weight_type=q.QuantType.QUInt8)
+    return int8_path
+
+
+# ------------------- Pré / post-traitement -------------------
+def letterbox_batch(frames, imgsz=640):
+    """
+    Frames BGR -> tenseur (N, 3, imgsz, imgsz) RGB float32 [0, 1], redimensionnées sans déformation
+    et complétées en gris comme ultralytics. Retourne aussi (ratio, pad_x, pad_y) par frame.
+    """
+    batch = np.full((len(frames), imgsz, imgsz, 3), 114, np.uint8)
+    transforms = []
+    for i, frame in enumerate(frames):
+        h, w = frame.shape[:2]
+        r = min(imgsz / h, imgsz / w)
+        nw, nh = round(w * r), round(h * r)
+        px, py = (imgsz - nw) // 2, (imgsz - nh) // 2
+        batch[i, py:py + nh, px:px + nw] = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        transforms.append((r, px, py))
+    tensor = batch[..., ::-1].transpose(0, 3, 1, 2).astype(np.float32) / 255.0
+    return np.ascontiguousarray(tensor), transforms
+
+
+def decode(output, transform, shape, conf=0.25, iou=0.45, max_det=300):
+    """
+    Sortie YOLOv8 d'une image (4 + classes, ancres) -> détections (n, 6) x1, y1, x2, y2, score, classe
+    en pixels de la frame d'origine, après NMS par classe.
+    """
+    pred = output.T
+    class_ids = pred[:, 4:].argmax(axis=1)
+    scores = pred[np.arange(len(pred)), 4 + class_ids]
+    keep = scores >= conf
+    pred, class_ids, scores = pred[keep], class_ids[keep], scores[keep]
+    if not len(pred):
+        return np.empty((0, 6), np.float32)
+
+    r, px, py = transform
+    cx, cy, w, h = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+    boxes = np.column_stack(((cx - w / 2 - px) / r, (cy - h / 2 - py) / r,
+                             (cx + w / 2 - px) / r, (cy + h / 2 - py) / r))
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+    xywh = np.column_stack((boxes[:, :2], boxes[:, 2:] - boxes[:, :2]))
+    kept = cv2.dnn.NMSBoxesBatched(xywh.tolist(), scores.tolist(), class_ids.tolist(), conf, iou, top_k=max_det)
+    kept = np.asarray(kept, np.int64).reshape(-1)
+    return np.column_stack((boxes[kept], scores[kept], class_ids[kept])).astype(np.float32)
+
+
+def to_results(frame, dets, names, path=None):
+    """Détections (n, 6) -> ultralytics Results (boxes.xyxy / cls / conf, plot()), comme YOLO.predict."""
+    import torch
+    from ultralytics.engine.results import Results
+    return Results(frame, path=path, names=names, boxes=torch.from_numpy(np.ascontiguousarray(dets, np.float32)))
+
+
+# ------------------- Inférence -------------------
+class OnnxYolo:
+    """
+    YOLOv8 ONNX exécuté par ONNX Runtime, interchangeable avec ultralytics.YOLO pour predict() :
+    mêmes objets Results (boxes.xyxy, boxes.cls, boxes.conf, plot()), donc mêmes detect / extract_persons.
+    threads / inter_threads: threads intra / inter-opérateurs d'ONNX Runtime (None = défaut ORT).
+    provider: "cpu" ou "openvino" (onnxruntime-openvino, repli sur le CPU s'il est absent).
+    """
+    def __init__(self, onnx_path, conf=0.25, iou=0.45, threads=None, inter_threads=None, provider="cpu",
+                 max_det=300):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        if inter_threads:
+            options.inter_op_num_threads = inter_threads
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        providers = ["CPUExecutionProvider"]
+        if provider == "openvino":
+            if "OpenVINOExecutionProvider" in ort.get_available_providers():
+                providers.insert(0, "OpenVINOExecutionProvider")
+            else:
+                print("[ONNX] ⚠️ OpenVINO indisponible (pip install onnxruntime-openvino) -> CPU")
+        self.session = ort.InferenceSession(onnx_path, options, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+
+        meta = self.session.get_modelmeta().custom_metadata_map  # écrit par l'export ultralytics
+        self.names = ast.literal_eval(meta["names"]) if "names" in meta else {i: str(i) for i in range(80)}
+        self.imgsz = ast.literal_eval(meta["imgsz"])[0] if "imgsz" in meta else 640
+        self.path = onnx_path
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+
+    def predict(self, source, conf=None, iou=None, **kwargs):
+        """source: une frame ou une liste de frames (un seul run par lot). Retourne une liste de Results."""
+        frames = source if isinstance(source, (list, tuple)) else [source]
+        tensor, transforms = letterbox_batch(frames, self.imgsz)
+        outputs = self.session.run(None, {self.input_name: tensor})[0]
+        results = []
+        for frame, output, transform in zip(frames, outputs, transforms):
+            dets = decode(output, transform, frame.shape, self.conf if conf is None else conf,
+                          self.iou if iou is None else iou, self.max_det)
+            results.append(to_results(frame, dets, self.names, self.path))
+        return results
+
+    __call__ = predict
+
+
+def load_yolo(model_path="src/yolov8n.pt", backend="torch", device="cpu", threads=None, inter_threads=None,
+              calibration_dir=None, provider="cpu"):
+    """
+    Modèle YOLO pour backend "torch" (ultralytics / PyTorch), "onnx" (FP32) ou "onnx-int8".
+    Les variantes ONNX sont exportées et mises en cache à côté du .pt au premier appel.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend inconnu: {backend} (choix: {', '.join(BACKENDS)})")
+    if backend == "torch":
+        from ultralytics import YOLO
+        model = YOLO(model_path)
+        model.to(device)
+        return model
+    path = export_onnx(model_path)
+    if backend == "onnx-int8":
+        path = quantize_int8(path, calibration_dir)
+    return OnnxYolo(path, threads=threads, inter_threads=inter_threads, provider=provider)
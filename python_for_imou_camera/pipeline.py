@@ -0,0 +1,344 @@
+# pipeline.py
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from collections import deque
+import numpy as np
+
+
+# ------------------- Statistiques -------------------
+class PipelineStats:
+    """
+    Compteurs partagés entre les étages du pipeline :
+    frames capturées / traitées / perdues / en erreur, profondeur de file et latence bout en bout.
+    """
+    def __init__(self, window=300):
+        self.lock = threading.Lock()
+        self.captured = 0
+        self.processed = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.errors = 0
+        self.queue_depth = 0
+        self.latencies = deque(maxlen=window)
+
+    def add_latency(self, seconds):
+        with self.lock:
+            self.processed += 1
+            self.latencies.append(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            lat = np.array(self.latencies) * 1000 if self.latencies else None
+            return {
+                "captured": self.captured,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "skipped": self.skipped,
+                "errors": self.errors,
+                "queue_depth": self.queue_depth,
+                "latency_ms_last": float(lat[-1]) if lat is not None else None,
+                "latency_ms_p50": float(np.percentile(lat, 50)) if lat is not None else None,
+                "latency_ms_p99": float(np.percentile(lat, 99)) if lat is not None else None,
+            }
+
+    def format(self):
+        s = self.snapshot()
+        if s["latency_ms_p50"] is None:
+            latency = "latence n/a"
+        else:
+            latency = (f"latence last={s['latency_ms_last']:.0f}ms "
+                       f"p50={s['latency_ms_p50']:.0f}ms p99={s['latency_ms_p99']:.0f}ms")
+        return (f"capturées={s['captured']} traitées={s['processed']} "
+                f"perdues={s['dropped']} ignorées={s['skipped']} erreurs={s['errors']} file={s['queue_depth']} {latency}")
+
+
+# ------------------- Pool de buffers -------------------
+class PooledFrame:
+    """
+    Buffer préalloué du pool avec compteur de références.
+    Chaque étage qui garde la frame appelle retain(), puis release() quand il a fini ;
+    au dernier release() le buffer retourne dans le pool.
+    """
+    __slots__ = ("array", "pool", "refs", "seq", "timestamp")
+
+    def __init__(self, array, pool):
+        self.array = array
+        self.pool = pool
+        self.refs = 0
+        self.seq = 0
+        self.timestamp = 0.0
+
+    def retain(self):
+        with self.pool.cond:
+            self.refs += 1
+        return self
+
+    def release(self):
+        with self.pool.cond:
+            self.refs -= 1
+            if self.refs == 0:
+                self.pool.free.append(self)
+                self.pool.cond.notify()
+
+
+class FramePool:
+    """Pool fixe de frames numpy : aucune allocation en régime permanent."""
+    def __init__(self, shape, size):
+        self.shape = tuple(shape)
+        self.size = size
+        self.cond = threading.Condition()
+        self.free = [PooledFrame(np.empty(shape, np.uint8), self) for _ in range(size)]
+
+    def acquire(self, timeout=None):
+        """Prend un buffer libre (refs=1), attend si tous sont utilisés. None si timeout."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.free, timeout):
+                return None
+            frame = self.free.pop()
+            frame.refs = 1
+            return frame
+
+    @property
+    def in_use(self):
+        with self.cond:
+            return self.size - len(self.free)
+
+
+def read_exactly_into(stream, buf):
+    """
+    Remplit buf (tableau numpy contigu) depuis stream avec readinto, sans allocation.
+    Retourne False sur EOF ou lecture incomplète.
+    """
+    view = memoryview(buf).cast("B")
+    n = 0
+    while n < len(view):
+        got = stream.readinto(view[n:])
+        if not got:
+            return False
+        n += got
+    return True
+
+
+# ------------------- Ring buffer de frames -------------------
+class FrameRing:
+    """
+    File bornée des dernières frames publiées, politique drop-oldest.
+    Les frames viennent d'un FramePool et sont partagées sans copie : les consommateurs
+    reçoivent une référence (retain) sur la plus récente et doivent appeler release().
+    Les frames sorties de la file avant d'avoir été prises par un worker sont comptées comme perdues.
+    """
+    def __init__(self, shape, capacity=4, stats=None, consumers=2):
+        """
+        capacity: nombre de frames publiées gardées dans la file
+        consumers: nombre d'étages pouvant garder une frame en même temps (workers + affichage),
+                   utilisé pour dimensionner le pool
+        """
+        self.shape = tuple(shape)
+        self.capacity = capacity
+        self.stats = stats or PipelineStats()
+        # file pleine + une frame par consommateur + celle en cours d'écriture
+        self.pool = FramePool(shape, capacity + consumers + 1)
+        self.frames = deque()
+        self.cond = threading.Condition()
+        self.write_seq = 0    # numéro de la dernière frame publiée
+        self.claimed_seq = 0  # dernière frame prise par un worker de détection
+        self.closed = False
+
+    def acquire(self, timeout=None):
+        """Buffer vide à remplir par le producteur puis à passer à publish()."""
+        return self.pool.acquire(timeout)
+
+    def publish(self, frame, timestamp):
+        """Publie une frame remplie ; la référence du producteur passe à la file."""
+        with self.cond:
+            self.write_seq += 1
+            frame.seq = self.write_seq
+            frame.timestamp = timestamp
+            self.frames.append(frame)
+            if len(self.frames) > self.capacity:
+                self.frames.popleft().release()
+            self.stats.captured += 1
+            self.stats.queue_depth = min(self.write_seq - self.claimed_seq, self.capacity)
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def _wait_newer(self, seq, timeout):
+        end = time.monotonic() + timeout if timeout is not None else None
+        while self.write_seq <= seq and not self.closed:
+            remaining = end - time.monotonic() if end is not None else None
+            if remaining is not None and remaining <= 0:
+                return False
+            self.cond.wait(remaining)
+        return self.write_seq > seq
+
+    def read_latest(self, after_seq=0, timeout=None):
+        """
+        Référence sur la frame la plus récente (plus récente que after_seq), à libérer avec release().
+        Ne compte pas de frames perdues : utilisé par l'affichage.
+        Retourne None si fermé / timeout.
+        """
+        with self.cond:
+            if not self._wait_newer(after_seq, timeout):
+                return None
+            return self.frames[-1].retain()
+
+    def claim_latest(self, timeout=None):
+        """
+        Comme read_latest, mais la frame est réservée pour un seul worker
+        et les frames sautées depuis la précédente réservation sont comptées comme perdues.
+        """
+        with self.cond:
+            if not self._wait_newer(self.claimed_seq, timeout):
+                return None
+            seq = self.write_seq
+            self.stats.dropped += seq - self.claimed_seq - 1
+            self.claimed_seq = seq
+            self.stats.queue_depth = 0
+            return self.frames[-1].retain()
+
+
+# ------------------- Étages -------------------
+class CaptureThread(threading.Thread):
+    """
+    Vide en continu le stdout de ffmpeg dans le ring buffer (readinto dans les buffers du pool).
+    stream: pipe binaire, ou objet avec read_frame(buf) (ex: ResilientStream.video qui gère les reconnexions)
+    """
+    def __init__(self, stream, ring):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.ring = ring
+        self.stop_event = threading.Event()
+
+    def run(self):
+        read_frame = getattr(self.stream, "read_frame", None)
+        try:
+            while not self.stop_event.is_set():
+                frame = self.ring.acquire()
+                ok = read_frame(frame.array) if read_frame else read_exactly_into(self.stream, frame.array)
+                if not ok:
+                    frame.release()
+                    break
+                self.ring.publish(frame, time.monotonic())
+        finally:
+            self.ring.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class DetectionWorker(threading.Thread):
+    """
+    Prend toujours la frame la plus récente, appelle detect_fn(frame)
+    et garde le dernier résultat. Les frames intermédiaires sont abandonnées.
+    gate(frame) optionnel (ex: MotionDetector.detect) : si False, la frame est ignorée sans inférence.
+    La frame est partagée avec les autres étages : detect_fn ne doit pas la modifier.
+    """
+    def __init__(self, ring, detect_fn, on_result=None, gate=None):
+        super().__init__(daemon=True)
+        self.ring = ring
+        self.detect_fn = detect_fn
+        self.gate = gate
+        self.on_result = on_result
+        self.latest = None
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            frame = self.ring.claim_latest(timeout=0.5)
+            if frame is None:
+                if self.ring.closed:
+                    break
+                continue
+            try:
+                if self.gate is not None and not self.gate(frame.array):
+                    with self.ring.stats.lock:
+                        self.ring.stats.skipped += 1
+                    continue
+                result = self.detect_fn(frame.array)
+                self.ring.stats.add_latency(time.monotonic() - frame.timestamp)
+                self.latest = (frame.seq, result)
+                if self.on_result:
+                    self.on_result(frame.seq, result)
+            except Exception as e:
+                # une frame en erreur ne doit pas arrêter la détection : on passe à la suivante
+                with self.ring.stats.lock:
+                    self.ring.stats.errors += 1
+                print(f"[PIPELINE] ❌ détection frame {frame.seq} : {type(e).__name__}: {e}")
+            finally:
+                frame.release()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+# ------------------- Micro-batching -------------------
+class MicroBatcher:
+    """
+    Regroupe les frames soumises par une ou plusieurs sources en lots :
+    un lot part dès qu'il atteint max_batch frames ou que la plus ancienne a attendu max_wait secondes.
+    batch_fn(frames) est appelé une seule fois par lot et doit renvoyer un résultat par frame,
+    chaque résultat est rendu à sa source via un Future.
+    """
+    def __init__(self, batch_fn, max_batch=8, max_wait=0.02):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.batch_sizes = deque(maxlen=300)
+        self.batch_times = deque(maxlen=300)
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, frame, source=None):
+        future = Future()
+        future.source = source
+        self.queue.put((frame, future, time.monotonic()))
+        return future
+
+    def _loop(self):
+        closing = False
+        while not closing:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = item[2] + self.max_wait
+            while len(batch) < self.max_batch:
+                # délai dépassé : on prend encore ce qui est déjà en attente, sans attendre
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        item = self.queue.get(timeout=remaining)
+                    else:
+                        item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+
+            t0 = time.monotonic()
+            try:
+                outputs = list(self.batch_fn([frame for frame, _, _ in batch]))
+                if len(outputs) != len(batch):
+                    # associer les résultats aux frames serait faux : aucune source ne doit attendre à vide
+                    raise ValueError(f"batch_fn a renvoyé {len(outputs)} résultats pour {len(batch)} frames")
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            self.batch_times.append(time.monotonic() - t0)
+            self.batch_sizes.append(len(batch))
+            for (_, future, _), output in zip(batch, outputs):
+                future.set_result(output)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
@@ -1,90 +1,123 @@
 # recognition.py
-import cv2
-import numpy as np
-from pathlib import Path
 import os
+import json
+import time
+import threading
 import cv2
 import numpy as np
 from pathlib import Path
-import os
+from concurrent.futures import ThreadPoolExecutor
 
-class FaceRecognitionOpenCV:
-    def __init__(self, known_dir="known_faces", threshold=80):
-        """
-        known_dir: dossier contenant les sous-dossiers par personne
-        threshold: seuil de confiance pour LBPH (plus petit = plus strict)
-        """
-        self.threshold = threshold
-        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
-        self.labels = {}
-        self.train_recognizer(known_dir)
+IMAGE_PATTERNS = ["*.jpg", "*.jpeg", "*.png", "*.JPG", "*.JPEG", "*.PNG"]
+MANIFEST_VERSION = 1
+
+
+def stack_faces(face_imgs, size, gray=False):
+    """
+    Redimensionne tous les crops BGR dans un seul tableau (N, h, w, 3),
+    puis une seule conversion en niveaux de gris pour tout le lot si gray.
+    """
+    w, h = size
+    batch = np.empty((len(face_imgs), h, w, 3), np.uint8)
+    for i, img in enumerate(face_imgs):
+        cv2.resize(img, size, dst=batch[i])
+    if not gray:
+        return batch
+    if not len(batch):
+        return np.empty((0, h, w), np.uint8)
+    return cv2.cvtColor(batch.reshape(-1, w, 3), cv2.COLOR_BGR2GRAY).reshape(-1, h, w)
 
-    def train_recognizer(self, known_dir):
-        images, labels = [], []
-        label_id = 0
 
+class FaceRecognizerBase:
+    """
+    API commune des recognizers (LBPH, SFace) : recognize_face / recognize_frames / recognize_frame,
+    annotate_*, lots répartis sur un pool de threads et durées du dernier lot.
+    Une sous-classe fournit recognize_batch(face_imgs, points=None) -> [(nom, distance)] (plus petit = plus proche)
+    et ses seuils threshold / low_conf dans ses propres unités.
+    """
+    def __init__(self, threshold, low_conf, workers=None):
+        self.threshold = threshold
+        self.low_conf = low_conf
+        self.workers = workers or os.cpu_count()
+        self._executor = None
+        self.last_batch = None
+
+    # ---------- Images d'enrôlement ----------
+    @staticmethod
+    def scan_known_faces(known_dir):
+        """{chemin: (personne, mtime_ns, taille)} pour toutes les images de known_dir"""
         known_path = Path(known_dir)
         if not known_path.exists():
             raise ValueError(f"[ERROR] Dossier {known_dir} introuvable.")
 
-        for folder in known_path.iterdir():
+        files = {}
+        for folder in sorted(known_path.iterdir()):
             if not folder.is_dir():
-                continue  
-
+                continue
             person_name = folder.name  # nom du dossier = label (ex: "moi")
-            files = []
-            for ext in ["*.jpg", "*.jpeg", "*.png", "*.JPG", "*.JPEG", "*.PNG"]:
-                files.extend(folder.glob(ext))
-
-            if not files:
+            found = []
+            for ext in IMAGE_PATTERNS:
+                found.extend(folder.glob(ext))
+            if not found:
                 print(f"[WARN] Aucun fichier image trouvé pour {person_name}, ignoré.")
                 continue
+            for file_ in sorted(set(found)):
+                st = file_.stat()
+                files[str(file_.resolve())] = (person_name, st.st_mtime_ns, st.st_size)
+        return files
 
-            for file_ in files:
-                img = cv2.imread(str(file_))
-                if img is None:
-                    continue
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                gray = cv2.resize(gray, (200, 200))  # <-- Ajoute cette ligne
-                images.append(gray)
-                labels.append(label_id)
+    # ---------- Reconnaissance ----------
+    def _map(self, fn, items):
+        """fn sur chaque élément, réparti sur un pool de threads (OpenCV relâche le GIL)."""
+        if self.workers <= 1 or len(items) < 2:
+            return [fn(item) for item in items]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="recognition")
+        return list(self._executor.map(fn, items))
 
-            self.labels[label_id] = person_name
-            label_id += 1
+    def recognize_batch(self, face_imgs, points=None):
+        raise NotImplementedError
 
-            
+    def _record_batch(self, faces, t0, t1):
+        t2 = time.perf_counter()
+        self.last_batch = {"faces": faces, "preprocess_ms": (t1 - t0) * 1000,
+                           "recognize_ms": (t2 - t1) * 1000, "total_ms": (t2 - t0) * 1000}
 
-        if not images:
-            raise ValueError(f"No valid images found in {known_dir}")
-
-        
-        self.recognizer.train(images, np.array(labels))
-        self.recognizer.save("lbph_model.yml")
-        print(f"[INFO] {len(self.labels)} personnes entraînées: {list(self.labels.values())}")
+    def format_batch(self):
+        b = self.last_batch
+        if not b:
+            return "aucun lot"
+        return (f"lot={b['faces']} visages prétraitement={b['preprocess_ms']:.1f}ms "
+                f"reconnaissance={b['recognize_ms']:.1f}ms total={b['total_ms']:.1f}ms")
 
     def recognize_face(self, face_img):
-        gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
-        gray = cv2.resize(gray, (200, 200))  # <-- standardiser la taille
-        label, confidence = self.recognizer.predict(gray)
-        if confidence <= self.threshold:
-            name = self.labels[label]
-        else:
-            name = "Unknown"
-        return name, confidence
+        return self.recognize_batch([face_img])[0]
+
+    def recognize_frames(self, items):
+        """
+        items: liste de (frame, faces), faces = liste de tuples (x1, y1, x2, y2), une entrée par caméra
+        Tous les visages sont reconnus en un seul lot.
+        Retourne une liste par frame de tuples ((x1, y1, x2, y2), name), alignée sur faces
+        (boîte vide : "Unknown").
+        """
+        crops, where = [], []
+        for i, (frame, faces) in enumerate(items):
+            for j, (x1, y1, x2, y2) in enumerate(faces):
+                crop = frame[y1:y2, x1:x2]
+                if crop.size:
+                    crops.append(crop)
+                    where.append((i, j))
+        results = [[(tuple(box), "Unknown") for box in faces] for _, faces in items]
+        for (i, j), (name, _) in zip(where, self.recognize_batch(crops) if crops else []):
+            results[i][j] = (results[i][j][0], name)
+        return results
 
     def recognize_frame(self, frame, faces):
         """
         faces: liste de tuples (x1, y1, x2, y2)
-        Retourne: liste de tuples ((x1, y1, x2, y2), name)
+        Retourne: liste de tuples ((x1, y1, x2, y2), name), alignée sur faces
         """
-        results = []
-        for (x1, y1, x2, y2) in faces:
-            person_img = frame[y1:y2, x1:x2]
-            if person_img.size == 0:
-                continue
-            name, conf = self.recognize_face(person_img)
-            results.append(((x1, y1, x2, y2), name))
-        return results
+        return self.recognize_frames([(frame, faces)])[0]
 
     def annotate_frame(self, frame, results):
         for (x1, y1, x2, y2), name in results:
@@ -101,4 +134,447 @@ class FaceRecognitionOpenCV:
         cv2.rectangle(face_img, (0, 0), (w-1, h-1), (0, 255, 0), 2)
         cv2.putText(face_img, name, (10, h - 10),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        return face_img
\ No newline at end of file
+        return face_img
+
+
+class FaceRecognitionOpenCV(FaceRecognizerBase):
+    def __init__(self, known_dir="known_faces", threshold=80, model_path="lbph_model.yml", use_cache=True,
+                 workers=None, low_conf=60.0):
+        """
+        known_dir: dossier contenant les sous-dossiers par personne
+        threshold: seuil de confiance pour LBPH (plus petit = plus strict)
+        low_conf: distance LBPH au-dessus de laquelle une identité reconnue reste incertaine
+                  (PersonTracker la revérifie plus souvent)
+        model_path: modèle LBPH sauvegardé ; un manifeste (fichiers, mtime, taille, labels)
+                    est écrit à côté pour le recharger au démarrage suivant
+        use_cache: False pour forcer un réentraînement complet
+        workers: threads pour recognize_batch (None = nombre de coeurs, 1 = séquentiel)
+        """
+        super().__init__(threshold, low_conf, workers)
+        self.model_path = model_path
+        self.manifest_path = os.path.splitext(model_path)[0] + "_manifest.json"
+        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
+        self.labels = {}
+        if not (use_cache and self.load_cached_model(known_dir)):
+            self.train_recognizer(known_dir)
+
+    # ---------- Images d'enrôlement ----------
+    @staticmethod
+    def load_face(path):
+        img = cv2.imread(path)
+        if img is None:
+            return None
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, (200, 200))
+
+    # ---------- Entraînement complet ----------
+    def train_recognizer(self, known_dir):
+        images, labels = [], []
+        self.labels = {}
+        label_of = {}
+        entries = {}
+
+        files = self.scan_known_faces(known_dir)
+        for path, (person_name, mtime, size) in files.items():
+            if person_name not in label_of:
+                label_of[person_name] = len(label_of)
+                self.labels[label_of[person_name]] = person_name
+            gray = self.load_face(path)
+            entries[path] = {"mtime": mtime, "size": size, "person": person_name,
+                             "used": gray is not None}
+            if gray is None:
+                continue
+            images.append(gray)
+            labels.append(label_of[person_name])
+
+        if not images:
+            raise ValueError(f"No valid images found in {known_dir}")
+
+        self.recognizer.train(images, np.array(labels))
+        self.save_model(known_dir, entries)
+        print(f"[INFO] {len(self.labels)} personnes entraînées: {list(self.labels.values())}")
+
+    # ---------- Cache ----------
+    def load_cached_model(self, known_dir):
+        """
+        Recharge le modèle sauvegardé si le manifeste correspond encore à known_dir.
+        Les nouvelles images sont ajoutées avec LBPH update() ; une image modifiée ou supprimée
+        impose un réentraînement complet (LBPH ne sait pas retirer d'échantillons).
+        Retourne False si le cache est absent ou inutilisable.
+        """
+        if not (os.path.exists(self.model_path) and os.path.exists(self.manifest_path)):
+            return False
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if manifest.get("version") != MANIFEST_VERSION or \
+                manifest.get("known_dir") != str(Path(known_dir).resolve()):
+            return False
+
+        files = self.scan_known_faces(known_dir)
+        entries = manifest["files"]
+        stale = [p for p, e in entries.items()
+                 if p not in files or (e["person"], e["mtime"], e["size"]) != files[p]]
+        if stale:
+            print(f"[INFO] {len(stale)} image(s) modifiée(s) ou supprimée(s), réentraînement complet.")
+            return False
+
+        self.recognizer.read(self.model_path)
+        self.labels = {int(k): v for k, v in manifest["labels"].items()}
+        label_of = {name: label for label, name in self.labels.items()}
+
+        images, labels = [], []
+        new_files = [p for p in files if p not in entries]
+        for path in new_files:
+            person_name, mtime, size = files[path]
+            if person_name not in label_of:
+                label_of[person_name] = max(self.labels, default=-1) + 1
+                self.labels[label_of[person_name]] = person_name
+            gray = self.load_face(path)
+            entries[path] = {"mtime": mtime, "size": size, "person": person_name,
+                             "used": gray is not None}
+            if gray is not None:
+                images.append(gray)
+                labels.append(label_of[person_name])
+
+        if images:
+            self.recognizer.update(images, np.array(labels))
+        if new_files:
+            self.save_model(known_dir, entries)
+        print(f"[INFO] Modèle LBPH chargé depuis {self.model_path} "
+              f"({len(images)} nouvelle(s) image(s)), personnes: {list(self.labels.values())}")
+        return True
+
+    def save_model(self, known_dir, entries):
+        """Sauvegarde le modèle puis le manifeste (écrit en dernier : il valide le modèle)."""
+        self.recognizer.save(self.model_path)
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "known_dir": str(Path(known_dir).resolve()),
+            "labels": {str(k): v for k, v in self.labels.items()},
+            "files": entries,
+        }
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.manifest_path)
+
+    # ---------- Reconnaissance ----------
+    def recognize_batch(self, face_imgs, points=None):
+        """
+        Reconnaît plusieurs visages (d'une ou plusieurs frames) en un seul appel :
+        redimensionnement + conversion en gris du lot entier, puis predict LBPH en parallèle.
+        Retourne [(nom, confiance)] dans l'ordre des images ; durées des étapes dans self.last_batch.
+        points (repères YuNet) est ignoré : LBPH travaille sur le crop redimensionné.
+        """
+        t0 = time.perf_counter()
+        grays = stack_faces(face_imgs, (200, 200), gray=True)  # <-- standardiser la taille
+        t1 = time.perf_counter()
+        preds = self._map(self.recognizer.predict, list(grays))
+        results = [(self.labels[label] if confidence <= self.threshold else "Unknown", confidence)
+                   for label, confidence in preds]
+        self._record_batch(len(face_imgs), t0, t1)
+        return results
+
+# ------------------- Reconnaissance par embeddings (SFace) -------------------
+SFACE_MODEL = "src/face_recognition_sface_2021dec.onnx"
+YUNET_MODEL = "src/face_detection_yunet_2023mar.onnx"
+
+
+def face_row(points, w, h):
+    """Ligne de visage au format YuNet (x, y, w, h, 5 points, score) attendue par alignCrop."""
+    return np.float32([0, 0, w, h, *np.asarray(points, np.float32).ravel(), 1.0]).reshape(1, 15)
+
+
+class FaceIndex:
+    """
+    Galerie d'embeddings normalisés (float32, une ligne par image) avec recherche top-k
+    par similarité cosinus : un produit matrice-vecteur puis argpartition sur les k meilleurs.
+    Ajout / suppression de personnes à chaud ; sauvegardée en .npy et rechargée en memmap
+    (aucune copie en RAM tant que la galerie n'est pas modifiée).
+    Thread-safe : les modifications sont sérialisées par lock et publient (données, labels, taille)
+    en une seule affectation ; une recherche lit cet état une fois et n'est jamais bloquée.
+    """
+    def __init__(self, dim=128):
+        self.dim = dim
+        self._state = (np.empty((0, dim), np.float32), np.empty(0, np.int32), 0)
+        self.names = []      # label -> nom (jamais raccourcie : les labels publiés restent valides)
+        self.sources = []    # fichier d'origine de chaque ligne (None = ajout à chaud)
+        self.lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self._state[2]
+
+    @property
+    def embeddings(self):
+        data, _, size = self._state
+        return data[:size]
+
+    @property
+    def labels(self):
+        _, labels, size = self._state
+        return labels[:size]
+
+    def __len__(self):
+        return self.size
+
+    def people(self):
+        return sorted({self.names[label] for label in self.labels.tolist()})
+
+    def _reserve(self, n):
+        """
+        Tableaux où écrire n lignes de plus : ceux en place s'il reste de la capacité (les lignes après size
+        ne sont pas lues), sinon une copie de capacité doublée (ajouts amortis, memmap en lecture seule copié).
+        """
+        data, labels, size = self._state
+        if size + n <= len(data) and data.flags.writeable:
+            return data, labels
+        capacity = max(size + n, 2 * len(data), 64)
+        new_data = np.empty((capacity, self.dim), np.float32)
+        new_labels = np.empty(capacity, np.int32)
+        new_data[:size] = data[:size]
+        new_labels[:size] = labels[:size]
+        return new_data, new_labels
+
+    @staticmethod
+    def normalize(embeddings):
+        embeddings = np.asarray(embeddings, np.float32)
+        embeddings = embeddings.reshape(-1, embeddings.shape[-1])
+        return embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12)
+
+    def add(self, name, embeddings, sources=None):
+        embeddings = self.normalize(embeddings)
+        with self.lock:
+            if name not in self.names:
+                self.names.append(name)
+            data, labels = self._reserve(len(embeddings))
+            size = self.size
+            end = size + len(embeddings)
+            data[size:end] = embeddings
+            labels[size:end] = self.names.index(name)
+            self.sources = self.sources + (list(sources) if sources is not None else [None] * len(embeddings))
+            self._state = (data, labels, end)
+
+    def _keep(self, keep):
+        """Garde les lignes où keep est vrai (appelé sous self.lock)."""
+        removed = self.size - int(keep.sum())
+        if removed:
+            data, labels = self.embeddings[keep], self.labels[keep]
+            self.sources = [s for s, k in zip(self.sources, keep) if k]
+            self._state = (data, labels, len(data))
+        return removed
+
+    def remove(self, name):
+        """Supprime toutes les lignes d'une personne, retourne leur nombre."""
+        with self.lock:
+            if name not in self.names:
+                return 0
+            return self._keep(self.labels != self.names.index(name))
+
+    def remove_sources(self, paths):
+        paths = set(paths)
+        with self.lock:
+            return self._keep(np.array([s not in paths for s in self.sources], bool))
+
+    def search(self, embedding, k=1):
+        """Les k lignes les plus proches : liste (nom, similarité cosinus), la meilleure d'abord."""
+        return self.search_batch(embedding, k)[0]
+
+    def search_batch(self, embeddings, k=1):
+        """search pour plusieurs requêtes (N, dim) en un produit matriciel, une liste par requête."""
+        queries = self.normalize(embeddings)
+        data, labels, size = self._state  # état cohérent même si add / remove tourne en parallèle
+        if not size:
+            return [[] for _ in queries]
+        sims = queries @ data[:size].T
+        k = min(k, size)
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k] if k < size else \
+            np.broadcast_to(np.arange(size), sims.shape)
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_sims, axis=1)
+        top, top_sims = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_sims, order, axis=1)
+        labels = labels[:size][top]
+        return [[(self.names[l], float(v)) for l, v in zip(row_labels, row_sims)]
+                for row_labels, row_sims in zip(labels.tolist(), top_sims.tolist())]
+
+    # ---------- Persistance ----------
+    def save(self, path, meta=None):
+        """
+        path_embeddings.npy, path_labels.npy et path.json (noms, sources, meta) écrit en dernier.
+        Une galerie chargée en memmap est d'abord copiée en RAM : elle lit peut-être les fichiers réécrits ici.
+        """
+        with self.lock:
+            data, labels, size = self._state
+            if isinstance(data, np.memmap) or isinstance(labels, np.memmap):
+                self._state = (np.array(data[:size]), np.array(labels[:size]), size)
+            for suffix, array in (("embeddings", self.embeddings), ("labels", self.labels)):
+                tmp = f"{path}_{suffix}.npy.tmp"
+                with open(tmp, "wb") as f:
+                    np.save(f, np.ascontiguousarray(array))
+                os.replace(tmp, f"{path}_{suffix}.npy")
+            tmp = f"{path}.json.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": MANIFEST_VERSION, "dim": self.dim, "names": self.names,
+                           "sources": self.sources, "meta": meta or {}}, f)
+            os.replace(tmp, f"{path}.json")
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Retourne (index, meta) ou (None, None) si la sauvegarde est absente ou illisible."""
+        try:
+            with open(f"{path}.json", encoding="utf-8") as f:
+                saved = json.load(f)
+            mode = "r" if mmap else None
+            data = np.load(f"{path}_embeddings.npy", mmap_mode=mode)
+            labels = np.load(f"{path}_labels.npy", mmap_mode=mode)
+        except (OSError, ValueError):
+            return None, None
+        if saved.get("version") != MANIFEST_VERSION or len(data) != len(saved["sources"]):
+            return None, None
+        index = cls(saved["dim"])
+        index._state = (data, labels, len(data))
+        index.names, index.sources = saved["names"], saved["sources"]
+        return index, saved["meta"]
+
+
+class FaceRecognitionSFace(FaceRecognizerBase):
+    """
+    Même API que FaceRecognitionOpenCV (FaceRecognizerBase : recognize_face / recognize_frame / annotate_*),
+    mais chaque visage devient un embedding SFace (cv2.FaceRecognizerSF, ONNX, CPU)
+    cherché dans un FaceIndex : pas de réentraînement pour ajouter ou retirer quelqu'un.
+    Les visages sont alignés (alignCrop) sur les 5 points de YuNet, comme à l'entraînement de SFace ;
+    le simple redimensionnement à 112x112 ne sert que sans repères (cascade de Haar, pas de modèle YuNet).
+    recognize_face retourne (nom, distance cosinus) : plus petit = plus proche, comme LBPH.
+    """
+    def __init__(self, known_dir="known_faces", threshold=0.637, model_path=SFACE_MODEL,
+                 index_path="face_index", use_cache=True, workers=None, low_conf=0.5,
+                 detector_path=YUNET_MODEL):
+        """
+        threshold: distance cosinus maximale (1 - 0.363, seuil de similarité recommandé pour SFace
+                   sur des visages alignés)
+        detector_path: modèle YuNet pour trouver les repères des images d'enrôlement
+                       (absent = images redimensionnées sans alignement)
+        low_conf: distance cosinus au-dessus de laquelle une identité reconnue reste incertaine
+        index_path: préfixe des fichiers de la galerie sauvegardée (None = pas de sauvegarde)
+        use_cache: False pour recalculer tous les embeddings de known_dir
+        workers: threads pour recognize_batch (None = nombre de coeurs, 1 = séquentiel)
+        """
+        super().__init__(threshold, low_conf, workers)
+        self.index_path = index_path
+        self.model_path = model_path
+        self.detector_path = detector_path
+        self.aligned = os.path.exists(detector_path) and hasattr(cv2, "FaceDetectorYN")
+        # un réseau dnn par thread : forward() n'est pas thread-safe
+        self._local = threading.local()
+        self.index = None
+        meta = None
+        if use_cache and index_path:
+            self.index, meta = FaceIndex.load(index_path)
+        # une galerie calculée avec un autre alignement n'est pas comparable
+        if self.index is None or meta.get("known_dir") != str(Path(known_dir).resolve()) \
+                or meta.get("aligned", False) != self.aligned:
+            self.index, meta = FaceIndex(), {"files": {}}
+        self.sync_known_faces(known_dir, meta["files"])
+
+    @property
+    def model(self):
+        if not hasattr(self._local, "model"):
+            self._local.model = cv2.FaceRecognizerSF.create(self.model_path, "")
+        return self._local.model
+
+    @property
+    def detector(self):
+        if not hasattr(self._local, "detector"):
+            self._local.detector = cv2.FaceDetectorYN.create(self.detector_path, "", (320, 320))
+        return self._local.detector
+
+    def align(self, face_img, points=None):
+        """
+        Visage 112x112 pour SFace : alignCrop sur les 5 points (repère de face_img),
+        cherchés avec YuNet s'ils ne sont pas donnés ; sinon simple redimensionnement.
+        """
+        h, w = face_img.shape[:2]
+        if points is None and self.aligned:
+            self.detector.setInputSize((w, h))
+            _, faces = self.detector.detect(face_img)
+            if faces is not None:
+                points = max(faces, key=lambda f: f[2] * f[3])[4:14]
+        if points is None:
+            return cv2.resize(face_img, (112, 112))
+        return self.model.alignCrop(face_img, face_row(points, w, h))
+
+    def embed(self, face_img, points=None):
+        """Embedding (1, 128) d'une image de visage BGR, alignée par align()."""
+        return self.model.feature(self.align(face_img, points))
+
+    def _feature(self, face):
+        return self.model.feature(face)
+
+    def sync_known_faces(self, known_dir, files_seen):
+        """Met la galerie à jour depuis known_dir : seules les images nouvelles ou modifiées sont calculées."""
+        files = self.scan_known_faces(known_dir)
+        changed = [p for p, e in files_seen.items() if tuple(e) != files.get(p)]
+        self.index.remove_sources(changed)
+        new = [p for p in files if p in changed or p not in files_seen]
+        for path in new:
+            img = cv2.imread(path)
+            if img is not None:
+                self.index.add(files[path][0], self.embed(img), sources=[path])
+        if not len(self.index):
+            raise ValueError(f"No valid images found in {known_dir}")
+        self.meta = {"known_dir": str(Path(known_dir).resolve()), "files": files, "aligned": self.aligned}
+        if changed or new:
+            self.save()
+        print(f"[INFO] Galerie SFace: {len(self.index)} embeddings ({len(new)} calculés), "
+              f"personnes: {self.index.people()}")
+
+    def save(self):
+        if self.index_path:
+            self.index.save(self.index_path, self.meta)
+
+    # ---------- Galerie à chaud ----------
+    def add_person(self, name, face_imgs, persist=True):
+        """Ajoute des images de visage (BGR) pour name sans toucher au reste de la galerie."""
+        self.index.add(name, np.vstack([self.embed(img) for img in face_imgs]))
+        if persist:
+            self.save()
+
+    def remove_person(self, name, persist=True):
+        removed = self.index.remove(name)
+        if removed and persist:
+            self.save()
+        return removed
+
+    # ---------- Reconnaissance ----------
+    def recognize_batch(self, face_imgs, points=None):
+        """
+        Reconnaît plusieurs visages en un seul appel : alignement du lot, embeddings en parallèle,
+        puis une seule recherche matricielle dans la galerie.
+        points: repères YuNet (5, 2) par image dans le repère du crop (None = redimensionnement seul)
+        Retourne [(nom, distance)] dans l'ordre des images ; durées des étapes dans self.last_batch.
+        """
+        t0 = time.perf_counter()
+        if points is None or all(p is None for p in points):
+            faces = stack_faces(face_imgs, (112, 112))
+        else:
+            faces = np.stack([cv2.resize(img, (112, 112)) if p is None else
+                              self.model.alignCrop(img, face_row(p, img.shape[1], img.shape[0]))
+                              for img, p in zip(face_imgs, points)])
+        t1 = time.perf_counter()
+        if not len(faces):
+            self._record_batch(0, t0, t1)
+            return []
+        embeddings = np.vstack(self._map(self._feature, list(faces)))
+        results = []
+        for hits in self.index.search_batch(embeddings, k=1):
+            if not hits:
+                results.append(("Unknown", 1.0))
+                continue
+            name, similarity = hits[0]
+            distance = 1.0 - similarity
+            results.append(((name if distance <= self.threshold else "Unknown"), distance))
+        self._record_batch(len(face_imgs), t0, t1)
+        return results
@@ -0,0 +1,237 @@
+# recorder.py
+# Enregistrement vidéo sur événement : pré-enregistrement glissant en segments copiés du flux d'origine.
+import os
+import time
+import threading
+import subprocess
+from collections import deque, Counter
+from ffmpeg_stream import build_segment_command, build_concat_command, segment_events
+
+SEGMENT_EXTENSIONS = {"mpegts": "ts", "matroska": "mkv", "mp4": "mp4"}
+
+
+class StreamSegmenter(threading.Thread):
+    """
+    ffmpeg en copie de flux (aucun décodage) qui découpe la caméra en segments dans segment_dir,
+    relancé avec un backoff exponentiel s'il s'arrête (URL redemandée via url_provider après
+    refresh_after échecs, comme ResilientStream).
+    on_segment(segment) est appelé pour chaque segment terminé :
+    {"path", "duration", "start_wall", "end_wall"} (horloge murale, time.time()).
+    """
+    def __init__(self, url, segment_dir, segment_seconds=2, segment_format="mpegts", on_segment=None,
+                 url_provider=None, backoff=1.0, max_backoff=60.0, refresh_after=2, prefix="seg"):
+        super().__init__(daemon=True)
+        self.url = url
+        self.segment_dir = segment_dir
+        self.segment_seconds = segment_seconds
+        self.segment_format = segment_format
+        self.on_segment = on_segment
+        self.url_provider = url_provider
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.refresh_after = refresh_after
+        self.pattern = os.path.join(segment_dir, f"{prefix}_%06d.{SEGMENT_EXTENSIONS[segment_format]}")
+        self.number = 0          # numéro du prochain segment (continu entre deux relances)
+        self.proc = None
+        self.stop_event = threading.Event()
+        self.failures = 0
+        self.restarts = 0
+        os.makedirs(segment_dir, exist_ok=True)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            command = build_segment_command(self.url, self.pattern, self.segment_seconds,
+                                            self.segment_format, start_number=self.number)
+            self.proc = subprocess.Popen(command, stdout=subprocess.PIPE)
+            got_segment = False
+            for segment in segment_events(self.proc.stdout, self.segment_dir):
+                got_segment = True
+                self.number += 1
+                if self.on_segment:
+                    self.on_segment(segment)
+            self.proc.wait()
+            if self.stop_event.is_set():
+                break
+
+            self.failures = 0 if got_segment else self.failures + 1
+            delay = min(self.max_backoff, self.backoff * 2 ** self.failures)
+            print(f"[RECORDER] ⚠️ segmentation interrompue -> relance dans {delay:.0f}s")
+            if self.stop_event.wait(delay):
+                break
+            if self.url_provider and self.failures >= self.refresh_after:
+                try:
+                    self.url = self.url_provider() or self.url
+                except Exception as e:
+                    print(f"[RECORDER] ⚠️ Impossible de renouveler l'URL : {e}")
+            self.restarts += 1
+
+    def stop(self):
+        self.stop_event.set()
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()  # ffmpeg ferme proprement le segment en cours et l'annonce
+        if self.is_alive():
+            self.join(timeout=5)
+
+
+class ClipRecorder:
+    """
+    Clips vidéo déclenchés par événement, sans enregistrement ni encodage continus :
+    le flux H.264 d'origine est copié en petits segments (StreamSegmenter), seuls les pre_roll
+    dernières secondes sont gardées sur disque. trigger() ouvre un clip qui commence pre_roll secondes
+    avant l'événement et se termine post_roll secondes après le dernier trigger (au plus max_clip secondes) ;
+    les segments sont alors assemblés sans réencodage (démuxeur concat de ffmpeg).
+    Sources des segments :
+    - stream : AVStream / ResilientStream pas encore démarré, le ffmpeg de la détection écrit aussi
+      les segments (add_segment_output), aucune connexion de plus à la caméra ;
+    - url : connexion séparée (StreamSegmenter), un second ffmpeg qui tire le flux RTMP ;
+    - ni l'un ni l'autre : segments d'un autre enregistreur (ex: SegmentArchive) reçus par add_segment,
+      jamais supprimés ici.
+    """
+    def __init__(self, url=None, output_dir="clips", pre_roll=10.0, post_roll=10.0, max_clip=300.0,
+                 segment_seconds=2, segment_format="mpegts", buffer_dir=None, url_provider=None,
+                 on_clip=None, prefix="clip", stream=None):
+        """
+        url: flux à segmenter par un ffmpeg dédié (url_provider : URL renouvelée après des échecs)
+        stream: flux déjà ouvert par le pipeline, segmenté par son propre ffmpeg (prioritaire sur url)
+        pre_roll / post_roll: secondes gardées avant le premier et après le dernier événement
+        segment_seconds: durée visée des segments (coupés sur les images clés, donc approximative)
+        buffer_dir: dossier du pré-enregistrement (défaut: output_dir/.buffer)
+        on_clip: callback(path, info) après l'écriture de chaque clip
+        """
+        self.output_dir = output_dir
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.max_clip = max_clip
+        self.on_clip = on_clip
+        self.prefix = prefix
+        self.buffer_dir = buffer_dir or os.path.join(output_dir, ".buffer")
+        os.makedirs(output_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.buffer = deque()        # segments du pré-enregistrement, du plus ancien au plus récent
+        self.pinned = Counter()      # segments utilisés par un clip en cours ou en écriture
+        self.event = None
+        self.writers = []
+        self.clips = []
+        self.stopped = False
+        self.segmenter = None
+        self.owns_segments = stream is not None or url is not None
+        if stream is not None:
+            os.makedirs(self.buffer_dir, exist_ok=True)
+            pattern = os.path.join(self.buffer_dir, f"seg_%06d.{SEGMENT_EXTENSIONS[segment_format]}")
+            stream.add_segment_output(pattern, segment_seconds, segment_format, on_segment=self.add_segment)
+        elif url is not None:
+            self.segmenter = StreamSegmenter(url, self.buffer_dir, segment_seconds, segment_format,
+                                             on_segment=self.add_segment, url_provider=url_provider)
+
+    def start(self):
+        if self.owns_segments:
+            # segments d'une exécution précédente : jamais réutilisés
+            for name in os.listdir(self.buffer_dir):
+                os.remove(os.path.join(self.buffer_dir, name))
+        if self.segmenter:
+            self.segmenter.start()
+        return self
+
+    @property
+    def recording(self):
+        return self.event is not None
+
+    def trigger(self, reason="detection"):
+        """Signale un événement : ouvre un clip ou prolonge celui en cours."""
+        now = time.time()
+        with self.lock:
+            if self.event is None:
+                segments = [s for s in self.buffer if s["end_wall"] >= now - self.pre_roll]
+                self.event = {"start": now, "last": now, "reasons": Counter(), "segments": segments}
+                self.pinned.update(s["path"] for s in segments)
+                print(f"[RECORDER] 🔴 clip démarré ({reason})")
+            self.event["last"] = now
+            self.event["reasons"][reason] += 1
+
+    def add_segment(self, segment):
+        """Segment terminé {"path", "duration", "start_wall", "end_wall"} (callback on_segment)."""
+        finished = None
+        with self.lock:
+            if self.stopped:  # dernier segment du flux, écrit après stop()
+                self._remove(segment["path"])
+                return
+            self.buffer.append(segment)
+            event = self.event
+            if event is not None:
+                event["segments"].append(segment)
+                self.pinned[segment["path"]] += 1
+                if segment["end_wall"] >= event["last"] + self.post_roll \
+                        or segment["end_wall"] - event["start"] >= self.max_clip:
+                    finished, self.event = event, None
+            while self.buffer and self.buffer[0]["end_wall"] < segment["end_wall"] - self.pre_roll:
+                old = self.buffer.popleft()
+                if not self.pinned[old["path"]]:
+                    self._remove(old["path"])
+        if finished:
+            self._finish(finished)
+
+    def _finish(self, event):
+        writer = threading.Thread(target=self._write_clip, args=(event,), daemon=True)
+        self.writers = [w for w in self.writers if w.is_alive()] + [writer]
+        writer.start()
+
+    def _write_clip(self, event):
+        segments = event["segments"]
+        try:
+            if not segments:
+                return
+            stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(event["start"]))
+            path = os.path.join(self.output_dir, f"{self.prefix}_{stamp}.mp4")
+            list_file = path + ".txt"
+            with open(list_file, "w", encoding="utf-8") as f:
+                for s in segments:
+                    f.write(f"file '{os.path.abspath(s['path'])}'\n")
+            result = subprocess.run(build_concat_command(list_file, path), capture_output=True)
+            os.remove(list_file)
+            if result.returncode != 0:
+                print(f"[RECORDER] ❌ clip {path}: {result.stderr.decode(errors='replace').strip()}")
+                return
+            info = {"start": segments[0]["start_wall"], "end": segments[-1]["end_wall"],
+                    "duration": sum(s["duration"] for s in segments), "reasons": dict(event["reasons"])}
+            self.clips.append(path)
+            print(f"[RECORDER] 💾 {path} ({info['duration']:.0f}s)")
+            if self.on_clip:
+                self.on_clip(path, info)
+        finally:
+            with self.lock:
+                buffered = {s["path"] for s in self.buffer}
+                for s in segments:
+                    self.pinned[s["path"]] -= 1
+                    if not self.pinned[s["path"]] and s["path"] not in buffered:
+                        self._remove(s["path"])
+                self.pinned += Counter()  # retire les compteurs à zéro
+
+    def _remove(self, path):
+        if self.owns_segments and os.path.exists(path):  # segments d'un autre enregistreur : laissés en place
+            os.remove(path)
+
+    def stop(self):
+        """Arrête la segmentation, termine le clip en cours et attend l'écriture des clips."""
+        if self.segmenter:
+            self.segmenter.stop()
+        with self.lock:
+            self.stopped = True
+            event, self.event = self.event, None
+        if event is not None:
+            self._finish(event)
+        for w in self.writers:
+            w.join()
+        with self.lock:
+            self.buffer.clear()
+        # pré-enregistrement et segment éventuellement interrompu par l'arrêt
+        if self.owns_segments:
+            for name in os.listdir(self.buffer_dir):
+                self._remove(os.path.join(self.buffer_dir, name))
+        return list(self.clips)
+
+    def format(self):
+        buffered = sum(s["duration"] for s in self.buffer)
+        restarts = self.segmenter.restarts if self.segmenter else "-"
+        return (f"pré-enregistrement={buffered:.0f}s clips={len(self.clips)} "
+                f"{'🔴 en cours' if self.recording else 'en attente'} relances={restarts}")
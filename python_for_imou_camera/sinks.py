@@ -0,0 +1,232 @@
+# sinks.py
+# Sorties des images annotées : aucune, fenêtre locale, instantanés JPEG, aperçu MJPEG en HTTP.
+import os
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import cv2
+
+GREEN = (0, 255, 0)
+BLUE = (255, 0, 0)
+ORANGE = (0, 165, 255)
+
+
+# ------------------- Annotation -------------------
+def annotate_detections(frame, result=None, tracks=None):
+    """
+    Dessine un résultat de détection (voir detection.yolov8_detect) sur une copie de la frame.
+    tracks: boîtes extrapolées de PersonTracker.boxes_at(), remplacent alors les personnes du résultat
+    (plus fluide entre deux détections).
+    """
+    out = frame.copy()
+    if result:
+        for obj in result["objects"]:
+            if obj["class_name"] == "person":
+                continue
+            x1, y1, x2, y2 = obj["box"]
+            cv2.rectangle(out, (x1, y1), (x2, y2), ORANGE, 2)
+            cv2.putText(out, f"{obj['class_name']} {obj['score']:.2f}", (x1, max(15, y1 - 5)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, ORANGE, 1)
+    if tracks is not None:
+        persons = [{"box": box, "name": f"#{track_id} {name}", "face_box": None}
+                   for track_id, box, name in tracks]
+    else:
+        persons = result["persons"] if result else []
+    for person in persons:
+        x1, y1, x2, y2 = person["box"]
+        cv2.rectangle(out, (x1, y1), (x2, y2), GREEN, 2)
+        cv2.putText(out, person["name"], (x1, y2 + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, GREEN, 2)
+        if person["face_box"]:
+            fx1, fy1, fx2, fy2 = person["face_box"]
+            cv2.rectangle(out, (fx1, fy1), (fx2, fy2), BLUE, 2)
+    return out
+
+
+# ------------------- Sorties -------------------
+class NullSink:
+    """
+    Aucune sortie (serveur sans écran). Sert aussi de modèle aux autres sorties :
+    wants(result) dit si une image annotée est nécessaire pour cette frame (l'annotation n'est faite
+    que si au moins une sortie la demande), publish(image, result) retourne False pour demander l'arrêt.
+    """
+    def wants(self, result):
+        return False
+
+    def publish(self, image, result):
+        return True
+
+    def close(self):
+        pass
+
+
+class WindowSink(NullSink):
+    """Fenêtre OpenCV locale ; "q" arrête la lecture."""
+    def __init__(self, name="Camera Live"):
+        self.name = name
+
+    def wants(self, result):
+        return True
+
+    def publish(self, image, result):
+        cv2.imshow(self.name, image)
+        return cv2.waitKey(1) & 0xFF != ord('q')
+
+    def close(self):
+        cv2.destroyWindow(self.name)
+
+
+class SnapshotSink(NullSink):
+    """
+    Instantanés JPEG sur disque : au plus un toutes les interval secondes,
+    seulement quand une personne est détectée si on_detection, max_files fichiers gardés.
+    """
+    def __init__(self, output_dir="snapshots", interval=5.0, on_detection=True, quality=85,
+                 max_files=500, prefix="snapshot"):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.on_detection = on_detection
+        self.quality = quality
+        self.max_files = max_files
+        self.prefix = prefix
+        self.last = 0.0
+        self.files = []
+        os.makedirs(output_dir, exist_ok=True)
+
+    def wants(self, result):
+        if time.monotonic() - self.last < self.interval:
+            return False
+        return not self.on_detection or bool(result and result["persons"])
+
+    def publish(self, image, result):
+        self.last = time.monotonic()
+        ts = result["timestamp"] if result else time.time()
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(ts)) + f"_{int(ts * 1000) % 1000:03d}"
+        path = os.path.join(self.output_dir, f"{self.prefix}_{stamp}.jpg")
+        ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if ok:
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(jpeg.tobytes())
+            os.replace(tmp, path)
+            self.files.append(path)
+            while self.max_files and len(self.files) > self.max_files:
+                old = self.files.pop(0)
+                if os.path.exists(old):
+                    os.remove(old)
+        return True
+
+
+class MJPEGServer(NullSink):
+    """
+    Aperçu MJPEG en HTTP (http://hôte:port/ dans un navigateur, /snapshot.jpg pour une image).
+    Les frames ne sont annotées et encodées que si un client est connecté, au plus max_fps par seconde.
+    """
+    def __init__(self, host="0.0.0.0", port=8080, quality=80, max_fps=10.0):
+        self.quality = quality
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.jpeg = None
+        self.seq = 0
+        self.last = 0.0
+        self.clients = 0
+        self.cond = threading.Condition()
+        self.closed = False
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def wants(self, result):
+        return self.clients > 0 and time.monotonic() - self.last >= self.min_interval
+
+    def publish(self, image, result):
+        self.last = time.monotonic()
+        ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if ok:
+            with self.cond:
+                self.jpeg = jpeg.tobytes()
+                self.seq += 1
+                self.cond.notify_all()
+        return True
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _next(self, after_seq, timeout=5.0):
+        """Attend une image plus récente que after_seq, retourne (seq, jpeg) ou None (arrêt, délai dépassé)."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.closed or self.seq > after_seq, timeout)
+            if self.closed or self.seq <= after_seq:
+                return None
+            return self.seq, self.jpeg
+
+    def _handler(self):
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/snapshot.jpg"):
+                    return self.snapshot()
+                if self.path != "/":
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                with sink.cond:
+                    sink.clients += 1
+                try:
+                    seq = 0
+                    while not sink.closed:
+                        got = sink._next(seq)
+                        if got is None:
+                            continue
+                        seq, jpeg = got
+                        self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n"
+                                         b"Content-Length: " + str(len(jpeg)).encode() + b"\r\n\r\n")
+                        self.wfile.write(jpeg + b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with sink.cond:
+                        sink.clients -= 1
+
+            def snapshot(self):
+                with sink.cond:
+                    current = sink.seq
+                    sink.clients += 1  # demande une nouvelle image : la dernière peut dater de longtemps
+                try:
+                    got = sink._next(current)
+                finally:
+                    with sink.cond:
+                        sink.clients -= 1
+                if got is None:
+                    self.send_error(503)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(got[1])))
+                self.end_headers()
+                self.wfile.write(got[1])
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def make_sink(name, **kwargs):
+    """Sortie à partir de son nom : "none", "window", "snapshot" ou "mjpeg"."""
+    sinks = {"none": NullSink, "window": WindowSink, "snapshot": SnapshotSink, "mjpeg": MJPEGServer}
+    if name not in sinks:
+        raise ValueError(f"Sortie inconnue: {name}")
+    return sinks[name](**kwargs)
@@ -0,0 +1,348 @@
+# supervisor.py
+# Mode site : toutes les caméras en parallèle, un pool partagé de workers YOLO.
+import os
+import sys
+import time
+import queue
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from collections import deque
+import numpy as np
+from ffmpeg_stream import AVStream, ResilientStream
+
+
+# ------------------- Frame partagée entre processus -------------------
+class SharedFrameSlot:
+    """
+    Double buffer en mémoire partagée contenant la dernière frame d'une caméra.
+    Le processus de capture écrit toujours dans la case qui n'est pas la plus récente,
+    les workers copient la plus récente sous verrou.
+    """
+    def __init__(self, shape, ctx):
+        self.shape = tuple(shape)
+        self.size = int(np.prod(shape))
+        self.shm = shared_memory.SharedMemory(create=True, size=2 * self.size)
+        self.seq = ctx.Value("q", 0, lock=False)
+        self.stamp = ctx.Value("d", 0.0, lock=False)
+        # métriques de reconnexion publiées par le processus de capture
+        self.reconnects = ctx.Value("i", 0, lock=False)
+        self.downtime = ctx.Value("d", 0.0, lock=False)
+        self.lock = ctx.Lock()
+        self._frames = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_frames"] = None
+        return state
+
+    @property
+    def frames(self):
+        if self._frames is None:
+            self._frames = np.ndarray((2,) + self.shape, np.uint8, buffer=self.shm.buf)
+        return self._frames
+
+    def write_buffer(self):
+        return self.frames[(self.seq.value + 1) % 2]
+
+    def publish(self, timestamp):
+        with self.lock:
+            self.stamp.value = timestamp
+            self.seq.value += 1
+
+    def read(self, out):
+        """Copie la dernière frame dans out, retourne (seq, timestamp) ou None."""
+        with self.lock:
+            seq = self.seq.value
+            if seq == 0:
+                return None
+            np.copyto(out, self.frames[seq % 2])
+            return seq, self.stamp.value
+
+    def close(self, unlink=False):
+        self._frames = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+# ------------------- Processus de capture (un par caméra) -------------------
+def capture_process(rtmp_url, slot, stop_event, fps=None, device=None):
+    """
+    Processus léger : ffmpeg -> dernière frame en mémoire partagée. N'importe pas YOLO.
+    Le flux est relancé automatiquement ; device=(deviceId, channelId) permet de redemander
+    une URL RTMP à l'OpenAPI quand l'ancienne a expiré.
+    """
+    height, width = slot.shape[:2]
+    url_provider = None
+    if device is not None:
+        from imou_api import get_client
+        url_provider = lambda: get_client().create_rtmp(*device)
+    # ffmpeg met à l'échelle et décime : toutes les caméras ont la même géométrie en sortie
+    stream = ResilientStream(AVStream(rtmp_url, width, height, fps, audio=False),
+                             url_provider=url_provider).start()
+    try:
+        while not stop_event.is_set():
+            # lecture directe dans la mémoire partagée
+            if not stream.video.read_frame(slot.write_buffer()):
+                break
+            slot.publish(time.time())
+            slot.reconnects.value = stream.reconnects
+            slot.downtime.value = stream.downtime
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stream.stop()
+        slot.close()
+
+
+# ------------------- Workers de détection (pool partagé) -------------------
+def detection_worker(slots, tasks, results, threads, batch_size=1, batch_wait=0.01):
+    """
+    Charge YOLO une seule fois puis traite les caméras que le superviseur lui envoie.
+    Jusqu'à batch_size caméras sont regroupées dans un seul predict (micro-batching).
+    Chaque caméra reçue donne exactement un résultat, même en cas d'erreur (seq = -1) :
+    le superviseur libère ainsi sa place et lui renvoie la frame suivante.
+    """
+    import torch
+    from detection import yolov8_predict_batch, yolov8_recognize_persons, warm_up
+    from models import registry
+    torch.set_num_threads(threads)
+    warm_up()  # modèles chargés avant la première tâche, pas sur la première frame
+    print(f"[MODELS] worker {os.getpid()} : {registry.format()}")
+
+    frames = {}
+    stopping = False
+    try:
+        while not stopping:
+            cam = tasks.get()
+            if cam is None:
+                break
+            cams = [cam]
+            while len(cams) < batch_size:
+                try:
+                    cam = tasks.get(timeout=batch_wait)
+                except queue.Empty:
+                    break
+                if cam is None:
+                    stopping = True
+                    break
+                cams.append(cam)
+
+            batch = []
+            for cam in cams:
+                frame = frames.setdefault(cam, np.empty(slots[cam].shape, np.uint8))
+                got = slots[cam].read(frame)
+                if got is None:
+                    results.put((cam, 0, 0.0, 0.0, time.time(), []))
+                else:
+                    batch.append((cam, frame) + got)
+            if not batch:
+                continue
+
+            t0 = time.time()
+            try:
+                preds = yolov8_predict_batch([frame for _, frame, _, _ in batch])
+            except Exception as e:
+                print(f"[SUPERVISOR] ❌ worker {os.getpid()} predict : {type(e).__name__}: {e}")
+                preds = [None] * len(batch)
+            for (cam, frame, seq, captured_at), r in zip(batch, preds):
+                persons = None
+                if r is not None:
+                    try:
+                        persons = yolov8_recognize_persons(frame, r, conf_threshold=0.4)
+                    except Exception as e:
+                        print(f"[SUPERVISOR] ❌ worker {os.getpid()} caméra {cam} : {type(e).__name__}: {e}")
+                done = time.time()
+                if persons is None:
+                    results.put((cam, -1, captured_at, done - t0, done, []))
+                else:
+                    results.put((cam, seq, captured_at, done - t0, done,
+                                 [(p["box"], p["name"]) for p in persons]))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for slot in slots:
+            slot.close()
+
+
+# ------------------- Statistiques par caméra -------------------
+class CameraStats:
+    def __init__(self, name, window=100):
+        self.name = name
+        self.last_seq = 0
+        self.last_time = time.time()
+        self.capture_fps = 0.0
+        self.detections = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=window)   # capture -> résultat
+        self.inference = deque(maxlen=window)   # temps YOLO + reconnaissance
+
+    def update_fps(self, seq):
+        now = time.time()
+        if now > self.last_time:
+            self.capture_fps = (seq - self.last_seq) / (now - self.last_time)
+        self.last_seq, self.last_time = seq, now
+
+    def format(self, interval):
+        det_fps = self.detections / interval
+        self.detections = 0
+        if self.latencies:
+            lat = np.array(self.latencies) * 1000
+            inf = np.array(self.inference) * 1000
+            latency = (f"latence p50={np.percentile(lat, 50):.0f}ms p99={np.percentile(lat, 99):.0f}ms "
+                       f"inférence p50={np.percentile(inf, 50):.0f}ms")
+        else:
+            latency = "latence n/a"
+        errors = f" erreurs={self.errors}" if self.errors else ""
+        return f"{self.name}: capture={self.capture_fps:.1f} fps détection={det_fps:.1f} fps {latency}{errors}"
+
+
+# ------------------- Superviseur -------------------
+def run_supervisor(rtmp_urls, width=640, height=480, fps=None, workers=None, batch_size=1,
+                   report_interval=5.0, on_result=None, duration=None, devices=None, task_timeout=60.0):
+    """
+    rtmp_urls: dict {nom caméra: url RTMP}
+    devices: dict {nom caméra: (deviceId, channelId)} pour renouveler les URLs expirées
+    fps: cadence envoyée par ffmpeg (None = toutes les frames)
+    workers: nombre de workers YOLO partagés (défaut: dépend du nombre de coeurs)
+    batch_size: nombre max de caméras regroupées dans un predict par worker
+    on_result: callback(nom, seq, boxes_et_noms) appelé dans le processus superviseur
+    task_timeout: secondes sans résultat après lesquelles une caméra en cours est libérée
+    (tâche perdue avec un worker mort) ; les workers morts sont relancés à chaque rapport
+    Ordonnancement équitable : tourniquet sur les caméras, au plus une frame en cours par caméra.
+    """
+    ctx = mp.get_context("spawn")
+    names = list(rtmp_urls)
+    n_cams = len(names)
+    cpus = os.cpu_count() or 1
+    if workers is None:
+        workers = max(1, min(n_cams, cpus // 2))
+    threads = max(1, cpus // workers)
+
+    slots = [SharedFrameSlot((height, width, 3), ctx) for _ in names]
+    stop_event = ctx.Event()
+    tasks, results = ctx.Queue(), ctx.Queue()
+
+    captures = [ctx.Process(target=capture_process, args=(rtmp_urls[name], slot, stop_event, fps, (devices or {}).get(name)),
+                            name=f"capture-{name}", daemon=True)
+                for name, slot in zip(names, slots)]
+
+    def start_worker(i):
+        p = ctx.Process(target=detection_worker, args=(slots, tasks, results, threads, batch_size),
+                        name=f"yolo-{i}", daemon=True)
+        p.start()
+        return p
+
+    for p in captures:
+        p.start()
+    pool = [start_worker(i) for i in range(workers)]
+    print(f"[SUPERVISOR] 🎥 {n_cams} caméra(s), {workers} worker(s) YOLO x {threads} thread(s), "
+          f"lots de {batch_size}")
+
+    stats = [CameraStats(name) for name in names]
+    dispatched = [0] * n_cams       # seq vue lors du dernier envoi
+    in_flight = [False] * n_cams
+    sent_at = [0.0] * n_cams        # envoi de la tâche en cours
+    outstanding = 0
+    next_cam = 0
+    start = last_report = time.time()
+    try:
+        while duration is None or time.time() - start < duration:
+            # Résultats des workers
+            try:
+                while True:
+                    cam, seq, captured_at, inference, done, persons = results.get(timeout=0.005)
+                    if in_flight[cam]:  # sinon déjà libérée par task_timeout
+                        in_flight[cam] = False
+                        outstanding -= 1
+                    if seq < 0:
+                        stats[cam].errors += 1
+                    elif seq:
+                        stats[cam].detections += 1
+                        stats[cam].latencies.append(done - captured_at)
+                        stats[cam].inference.append(inference)
+                        if on_result:
+                            on_result(names[cam], seq, persons)
+            except queue.Empty:
+                pass
+
+            # Tourniquet : une tâche par caméra ayant une nouvelle frame, dans la limite des workers
+            for k in range(n_cams):
+                if outstanding >= workers * batch_size:
+                    break
+                cam = (next_cam + k) % n_cams
+                seq = slots[cam].seq.value
+                if not in_flight[cam] and seq > dispatched[cam]:
+                    tasks.put(cam)
+                    in_flight[cam] = True
+                    sent_at[cam] = time.time()
+                    dispatched[cam] = seq
+                    outstanding += 1
+                    next_cam = (cam + 1) % n_cams
+
+            if time.time() - last_report >= report_interval:
+                for i, p in enumerate(pool):
+                    if not p.is_alive():
+                        print(f"[SUPERVISOR] ⚠️ worker {p.name} arrêté (code {p.exitcode}) -> relance")
+                        pool[i] = start_worker(i)
+                for cam in range(n_cams):
+                    if in_flight[cam] and time.time() - sent_at[cam] > task_timeout:
+                        print(f"[SUPERVISOR] ⚠️ {names[cam]} : aucun résultat depuis {task_timeout:.0f}s -> libérée")
+                        in_flight[cam] = False
+                        outstanding -= 1
+                        stats[cam].errors += 1
+                interval = time.time() - last_report
+                for cam, s in enumerate(stats):
+                    s.update_fps(slots[cam].seq.value)
+                    state = "" if captures[cam].is_alive() else " [arrêtée]"
+                    reconnects = slots[cam].reconnects.value
+                    if reconnects:
+                        state += f" reconnexions={reconnects} indisponible={slots[cam].downtime.value:.0f}s"
+                    print(f"[SUPERVISOR] {s.format(interval)}{state}")
+                last_report = time.time()
+
+            if not any(p.is_alive() for p in captures):
+                print("[SUPERVISOR] ⚠️ Plus aucun flux actif.")
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        for _ in pool:
+            tasks.put(None)
+        for p in captures + pool:
+            p.join(timeout=3)
+            if p.is_alive():
+                p.terminate()
+        for slot in slots:
+            slot.close(unlink=True)
+    return stats
+
+
+# ------------------- MAIN -------------------
+if __name__ == "__main__":
+    from imou_api import get_client
+
+    client = get_client()
+    devices = client.get_live_list(query_range="1-50")
+    urls, ids = {}, {}
+    for dev in devices:
+        try:
+            urls[dev["deviceId"]] = client.device_rtmp(dev)
+            ids[dev["deviceId"]] = (dev["deviceId"], str(dev.get("channelId", "0")))
+        except Exception as e:
+            print(f"[SUPERVISOR] ❌ {dev.get('deviceId')}: {e}")
+    if not urls:
+        sys.exit("Aucun flux RTMP disponible.")
+
+    # historique des détections de tout le site (écritures groupées, ne ralentit pas la boucle)
+    from event_store import DetectionStore
+    store = DetectionStore("detections.sqlite")
+
+    def on_result(name, seq, persons):
+        store.add_records(name, time.time(), [{"class": "person", "box": box, "name": who} for box, who in persons])
+
+    try:
+        run_supervisor(urls, devices=ids, on_result=on_result)
+    finally:
+        store.close()
@@ -0,0 +1,180 @@
+# tiling.py
+# Détection sur les zones utiles (ROI) et en tuiles pour les caméras 2K/4K : petites personnes lointaines.
+import cv2
+import numpy as np
+from tracker import iou_matrix
+from onnx_backend import to_results
+
+
+def roi_mask(shape, rois):
+    """Masque uint8 (255 = zone utile) des polygones rois [(x, y), ...] en pixels, None = toute l'image."""
+    if not rois:
+        return None
+    mask = np.zeros(shape[:2], np.uint8)
+    for poly in rois:
+        cv2.fillPoly(mask, [np.asarray(poly, np.int32).reshape(-1, 1, 2)], 255)
+    return mask
+
+
+def tile_boxes(width, height, tile=640, overlap=0.2):
+    """Tuiles (x1, y1, x2, y2) de côté tile qui couvrent width x height avec un recouvrement d'overlap."""
+    def starts(size):
+        if size <= tile:
+            return [0]
+        step = int(tile * (1 - overlap))
+        n = int(np.ceil((size - tile) / step)) + 1
+        # réparties régulièrement, la dernière collée au bord
+        return [round(i * (size - tile) / (n - 1)) for i in range(n)]
+    return [(x, y, min(x + tile, width), min(y + tile, height)) for y in starts(height) for x in starts(width)]
+
+
+def cut_by_tile(dets, views, sources, area, border=4):
+    """
+    True pour les détections qui touchent (à border pixels près) un bord intérieur de leur tuile,
+    c'est-à-dire un bord qui n'est pas celui de la zone analysée : la personne y est peut-être coupée.
+    views: boîtes des vues en pixels de la frame, sources: indice de la vue de chaque détection
+    """
+    tiles = np.asarray(views, np.float32)[sources]
+    inner = np.concatenate((tiles[:, :2] > np.asarray(area[:2]), tiles[:, 2:] < np.asarray(area[2:])), axis=1)
+    touching = np.concatenate((dets[:, :2] - tiles[:, :2] <= border, tiles[:, 2:] - dets[:, 2:4] <= border), axis=1)
+    return (inner & touching).any(axis=1)
+
+
+def merge_detections(dets, iou=0.5, ios=0.8, sources=None, cut=None):
+    """
+    NMS entre tuiles, par classe : une détection est supprimée si une autre plus sûre la recouvre (IoU > iou).
+    Avec sources (vue de chaque détection) et cut (cut_by_tile) : deux boîtes de vues différentes dont
+    l'une touche un bord intérieur de sa tuile et dont l'une contient presque entièrement l'autre
+    (intersection / plus petite aire > ios) sont une personne coupée par une tuile et vue entière
+    dans la voisine : la boîte gardée est étendue à l'union des deux, quel que soit le score du morceau.
+    Ailleurs, deux personnes proches (enfant devant un adulte) restent séparées comme avec un NMS classique.
+    dets: (n, 6) x1, y1, x2, y2, score, classe
+    """
+    if len(dets) < 2:
+        return dets
+    order = np.argsort(-dets[:, 4], kind="stable")
+    dets = dets[order].copy()
+    if sources is None:
+        sources, cut = np.arange(len(dets)), np.zeros(len(dets), bool)
+    else:
+        sources, cut = np.asarray(sources)[order], np.asarray(cut)[order].copy()
+    keep = np.ones(len(dets), bool)
+    for i in range(len(dets)):
+        if not keep[i]:
+            continue
+        while True:  # une boîte étendue peut contenir à son tour d'autres morceaux
+            rest = np.flatnonzero(keep & (dets[:, 5] == dets[i, 5]))
+            rest = rest[rest > i]
+            if not len(rest):
+                break
+            others = dets[rest, :4]
+            overlap_iou = iou_matrix(dets[i:i + 1, :4], others)[0]
+            area_i = (dets[i, 2] - dets[i, 0]) * (dets[i, 3] - dets[i, 1])
+            areas = (others[:, 2] - others[:, 0]) * (others[:, 3] - others[:, 1])
+            inter = overlap_iou * (area_i + areas) / (1 + overlap_iou)
+            contained = (inter / (np.minimum(area_i, areas) + 1e-9) > ios) \
+                & (sources[rest] != sources[i]) & (cut[rest] | cut[i])
+            keep[rest[(overlap_iou > iou) & ~contained]] = False
+            if not contained.any():
+                break
+            merged = others[contained]
+            dets[i, :2] = np.minimum(dets[i, :2], merged[:, :2].min(axis=0))
+            dets[i, 2:4] = np.maximum(dets[i, 2:4], merged[:, 2:4].max(axis=0))
+            cut[i] |= cut[rest[contained]].any()  # encore coupée si un morceau l'était sur un autre bord
+            keep[rest[contained]] = False
+    return dets[keep]
+
+
+class RegionDetector:
+    """
+    Remplace le predict plein cadre de YOLO (qui réduit toute l'image à 640 px) :
+    - rois : seule la boîte englobante des polygones est analysée, le reste du masque est grisé
+      et les détections dont les pieds (bas de boîte) sont hors ROI sont écartées ;
+    - tile : la zone est découpée en tuiles de tile pixels qui se recouvrent, toutes passées en un seul
+      predict par lot, plus une vue d'ensemble réduite (global_view) pour les personnes proches,
+      plus grandes qu'une tuile ; les doublons entre tuiles sont fusionnés (merge_detections),
+      les morceaux coupés au bord d'une tuile réunis à la boîte entière vue par une autre.
+    predict(frames, conf) -> liste de Results, ex: detection.yolov8_predict_batch.
+    Retourne un Results de la frame entière, utilisable par detection.yolov8_detect(results=...).
+    """
+    def __init__(self, predict, rois=None, tile=None, overlap=0.2, global_view=True, conf=0.4, iou=0.5):
+        """
+        rois: polygones [(x, y), ...] en pixels de la frame (même format que MotionDetector), None = tout
+        tile: côté des tuiles en pixels (None = pas de tuiles, une seule inférence de la zone)
+        overlap: recouvrement des tuiles (une personne coupée par une tuile est entière dans la voisine)
+        """
+        self.predict = predict
+        self.rois = rois
+        self.tile = tile
+        self.overlap = overlap
+        self.global_view = global_view
+        self.conf = conf
+        self.iou = iou
+        self.shape = None
+        self.mask = None
+        self.area = None
+        self.tiles = []
+
+        self.frames = 0
+        self.inferences = 0
+
+    def _prepare(self, shape):
+        """Masque, zone utile et tuiles, recalculés seulement si la taille des frames change."""
+        self.shape = shape[:2]
+        h, w = self.shape
+        self.mask = roi_mask(shape, self.rois)
+        if self.mask is not None and self.mask.any():
+            x, y, bw, bh = cv2.boundingRect(self.mask)
+            self.area = (x, y, x + bw, y + bh)
+        else:
+            self.area = (0, 0, w, h)
+        ax1, ay1, ax2, ay2 = self.area
+        self.tiles = [(ax1 + x1, ay1 + y1, ax1 + x2, ay1 + y2)
+                      for x1, y1, x2, y2 in tile_boxes(ax2 - ax1, ay2 - ay1, self.tile, self.overlap)] \
+            if self.tile else []
+        if len(self.tiles) == 1:
+            self.tiles = []  # zone plus petite qu'une tuile : la vue d'ensemble suffit
+
+    def __call__(self, frame):
+        if self.shape != frame.shape[:2]:
+            self._prepare(frame.shape)
+        ax1, ay1, ax2, ay2 = self.area
+        area = frame[ay1:ay2, ax1:ax2]
+        if self.mask is not None:
+            area = area.copy()  # la frame est partagée avec l'affichage et les sorties
+            area[self.mask[ay1:ay2, ax1:ax2] == 0] = 114  # gris du letterbox de YOLO : rien à détecter hors ROI
+
+        views = [self.area] if self.global_view or not self.tiles else []
+        views += self.tiles
+        results = self.predict([area[y1 - ay1:y2 - ay1, x1 - ax1:x2 - ax1] for x1, y1, x2, y2 in views],
+                               conf=self.conf)
+
+        dets, sources = [], []
+        for v, ((x1, y1, _, _), r) in enumerate(zip(views, results)):
+            d = r.boxes.data.cpu().numpy().astype(np.float32)
+            d[:, [0, 2]] += x1
+            d[:, [1, 3]] += y1
+            dets.append(d)
+            sources.append(np.full(len(d), v))
+        dets = np.concatenate(dets) if dets else np.empty((0, 6), np.float32)
+        sources = np.concatenate(sources) if sources else np.empty(0, int)
+        if self.mask is not None and len(dets):
+            feet_x = ((dets[:, 0] + dets[:, 2]) / 2).astype(int).clip(0, frame.shape[1] - 1)
+            feet_y = (dets[:, 3] - 1).astype(int).clip(0, frame.shape[0] - 1)
+            inside = self.mask[feet_y, feet_x] > 0
+            dets, sources = dets[inside], sources[inside]
+        if len(views) > 1:
+            cut = cut_by_tile(dets, views, sources, self.area)
+            dets = merge_detections(dets, self.iou, sources=sources, cut=cut)
+
+        self.frames += 1
+        self.inferences += len(views)
+        return to_results(frame, dets, results[0].names)
+
+    def format(self):
+        if self.shape is None:
+            return "aucune frame"
+        ax1, ay1, ax2, ay2 = self.area
+        share = (ax2 - ax1) * (ay2 - ay1) / (self.shape[0] * self.shape[1])
+        return (f"zone analysée={share:.0%} de la frame tuiles={len(self.tiles)} "
+                f"inférences/frame={self.inferences / max(self.frames, 1):.1f}")
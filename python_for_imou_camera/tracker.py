@@ -0,0 +1,195 @@
+# tracker.py
+# Suivi multi-personnes entre deux détections : identifiants stables, identité mise en cache par piste.
+import time
+import threading
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """IoU entre toutes les boîtes de a (N, 4) et de b (M, 4), format x1, y1, x2, y2."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def _to_state(boxes):
+    """x1, y1, x2, y2 -> cx, cy, w, h"""
+    return np.column_stack(((boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2,
+                            boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]))
+
+
+def _to_boxes(state):
+    cx, cy, w, h = state[:, 0], state[:, 1], np.maximum(state[:, 2], 1), np.maximum(state[:, 3], 1)
+    return np.column_stack((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2))
+
+
+class PersonTracker:
+    """
+    Tracker type SORT : un filtre de Kalman à vitesse constante par piste (centre, taille et leurs vitesses),
+    toutes les pistes traitées ensemble en NumPy, association par IoU (glouton, meilleure IoU d'abord).
+    L'identité reconnue est gardée par piste : la reconnaissance n'est relancée que si elle est
+    incertaine ("Unknown" ou distance au-dessus du low_conf du recognizer actif) ou après refresh secondes.
+    Entre deux détections, boxes_at() extrapole les boîtes pour un affichage fluide.
+    Thread-safe : update() depuis le worker de détection, boxes_at() depuis l'affichage.
+    """
+    def __init__(self, iou_threshold=0.3, max_age=2.0, refresh=5.0, retry=1.0, low_conf=None,
+                 process_noise=50.0, measurement_noise=10.0):
+        """
+        iou_threshold: IoU minimale entre la boîte prédite et la détection pour continuer une piste
+        max_age: secondes sans détection avant de supprimer une piste
+        refresh: secondes avant de reconnaître à nouveau une identité sûre
+        retry: secondes avant de reconnaître à nouveau une identité incertaine
+        low_conf: distance au-dessus de laquelle l'identité est jugée incertaine ; None = seuil donné
+                  à set_identity par le recognizer (low_conf de LBPH ou SFace, unités différentes)
+        process_noise / measurement_noise: écarts-types (pixels) du modèle et de la mesure
+        """
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.refresh = refresh
+        self.retry = retry
+        self.low_conf = low_conf
+        self.q = process_noise ** 2
+        self.r = measurement_noise ** 2
+
+        self.ids = np.empty(0, np.int64)
+        self.x = np.empty((0, 8))          # cx, cy, w, h, vcx, vcy, vw, vh
+        self.p = np.empty((0, 8, 8))
+        self.t = np.empty(0)               # instant de l'état de chaque piste
+        self.last_seen = np.empty(0)       # instant de la dernière détection associée
+        self.identities = {}               # id -> (nom, distance, instant de reconnaissance, seuil incertain)
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+        self.recognitions = 0
+        self.reused = 0
+
+    # ---------- Kalman ----------
+    @staticmethod
+    def _transition(dt):
+        f = np.repeat(np.eye(8)[None], len(dt), axis=0)
+        f[:, range(4), range(4, 8)] = dt[:, None]
+        return f
+
+    def _predict(self, now):
+        dt = np.clip(now - self.t, 0, None)
+        f = self._transition(dt)
+        self.x = np.einsum("nij,nj->ni", f, self.x)
+        q = np.zeros((len(dt), 8, 8))
+        q[:, range(4), range(4)] = self.q * dt[:, None] ** 2
+        q[:, range(4, 8), range(4, 8)] = self.q * dt[:, None]
+        self.p = f @ self.p @ f.transpose(0, 2, 1) + q
+        self.t = np.full(len(dt), now)
+
+    def _correct(self, rows, measured):
+        # H = [I 0] : la mesure est directement cx, cy, w, h
+        p = self.p[rows]
+        s = p[:, :4, :4] + self.r * np.eye(4)
+        k = p[:, :, :4] @ np.linalg.inv(s)
+        self.x[rows] += np.einsum("nij,nj->ni", k, measured - self.x[rows, :4])
+        self.p[rows] = p - k @ p[:, :4, :]
+
+    # ---------- Association ----------
+    def update(self, boxes, now=None):
+        """
+        boxes: détections (x1, y1, x2, y2) de la frame courante
+        Retourne l'identifiant de piste de chaque détection, dans le même ordre.
+        """
+        now = time.monotonic() if now is None else now
+        boxes = np.asarray(boxes, np.float64).reshape(-1, 4)
+        with self.lock:
+            self._predict(now)
+            assigned = np.full(len(boxes), -1, np.int64)
+            matched_tracks = np.zeros(len(self.ids), bool)
+            if len(self.ids) and len(boxes):
+                iou = iou_matrix(_to_boxes(self.x), boxes)
+                for flat in np.argsort(iou, axis=None)[::-1]:
+                    t, d = divmod(int(flat), len(boxes))
+                    if iou[t, d] < self.iou_threshold:
+                        break
+                    if matched_tracks[t] or assigned[d] >= 0:
+                        continue
+                    matched_tracks[t] = True
+                    assigned[d] = t
+            measured = _to_state(boxes)
+            hit = assigned >= 0
+            if hit.any():
+                self._correct(assigned[hit], measured[hit])
+
+            # nouvelles pistes pour les détections non associées
+            new = np.flatnonzero(~hit)
+            new_ids = np.arange(self.next_id, self.next_id + len(new))
+            self.next_id += len(new)
+            p0 = np.diag([self.r] * 4 + [self.q] * 4)
+            x0 = np.hstack((measured[new], np.zeros((len(new), 4))))
+            out = np.empty(len(boxes), np.int64)
+            out[hit] = self.ids[assigned[hit]]
+            out[new] = new_ids
+
+            # pistes perdues depuis plus de max_age
+            seen = np.where(matched_tracks, now, self.last_seen)
+            keep = now - seen <= self.max_age
+            for track_id in self.ids[~keep]:
+                self.identities.pop(int(track_id), None)
+            self.ids = np.concatenate((self.ids[keep], new_ids))
+            self.x = np.concatenate((self.x[keep], x0))
+            self.p = np.concatenate((self.p[keep], np.repeat(p0[None], len(new), axis=0)))
+            self.t = np.concatenate((self.t[keep], np.full(len(new), now)))
+            self.last_seen = np.concatenate((seen[keep], np.full(len(new), now)))
+            return out.tolist()
+
+    # ---------- Identité ----------
+    def should_recognize(self, track_id, now=None):
+        """True si la reconnaissance doit tourner pour cette piste, sinon l'identité en cache suffit."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            cached = self.identities.get(track_id)
+            if cached is None:
+                return True
+            name, conf, at, low_conf = cached
+            uncertain = name == "Unknown" or (low_conf is not None and conf > low_conf)
+            if now - at >= (self.retry if uncertain else self.refresh):
+                return True
+            self.reused += 1
+            return False
+
+    def set_identity(self, track_id, name, conf, now=None, low_conf=None):
+        """low_conf: seuil d'incertitude du recognizer qui a donné conf (sinon celui du tracker)."""
+        with self.lock:
+            self.recognitions += 1
+            low_conf = self.low_conf if self.low_conf is not None else low_conf
+            self.identities[track_id] = (name, conf, time.monotonic() if now is None else now, low_conf)
+
+    def identity(self, track_id):
+        with self.lock:
+            cached = self.identities.get(track_id)
+        return cached[0] if cached else "Unknown"
+
+    # ---------- Affichage ----------
+    def boxes_at(self, now=None):
+        """Boîtes extrapolées à l'instant now : liste (id, (x1, y1, x2, y2), nom)."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if not len(self.ids):
+                return []
+            dt = np.clip(now - self.t, 0, self.max_age)
+            state = self.x[:, :4] + self.x[:, 4:] * dt[:, None]
+            boxes = np.round(_to_boxes(state)).astype(int)
+            # pistes sans détection depuis max_age : plus affichées (supprimées au prochain update)
+            alive = now - self.last_seen <= self.max_age
+            return [(int(i), tuple(b.tolist()), self.identities.get(int(i), ("Unknown",))[0])
+                    for i, b in zip(self.ids[alive], boxes[alive])]
+
+    @property
+    def saved_ratio(self):
+        """Proportion des personnes pour lesquelles la reconnaissance a été évitée."""
+        total = self.recognitions + self.reused
+        return self.reused / total if total else 0.0
+
+    def format(self):
+        return (f"pistes={len(self.ids)} reconnaissances={self.recognitions} "
+                f"identités réutilisées={self.reused} ({self.saved_ratio:.0%})")